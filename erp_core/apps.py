@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ErpCoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'erp_core'
+
+    def ready(self):
+        import erp_core.reference
+        import erp_core.response_cache
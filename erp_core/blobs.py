@@ -0,0 +1,332 @@
+"""
+Content-addressed storage of uploaded drawings and documents.
+
+Uploaded files are stored once per content under blobs/<sha256>, and a
+FileBlob row counts the rows pointing at each blob. The SHA-256 is computed
+by the upload handlers while the request body streams in, so a file whose
+content is already stored is never written to storage again: the row just
+points at the existing blob.
+
+Only live rows are counted. Historical (simple_history) rows may still
+point at a blob nobody references any more; prune_orphans() keeps those.
+
+A blob object is written before its row, so a failed save deletes the
+object it wrote. An object left behind by a transaction rolled back further
+out has no FileBlob row; prune_orphans() sweeps those once they are a day
+old.
+
+Files stored before blobs existed, or placed in storage directly (chunked
+drawing uploads), are folded in by dedupe_existing() through the
+dedupe_files command.
+
+All blob fields use the default storage.
+"""
+import hashlib
+import logging
+import posixpath
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import FileBlob
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs'
+READ_CHUNK = 1024 * 1024
+DEFAULT_WORKERS = 8
+# Blob objects without a FileBlob row are swept once this old, so uploads in
+# a transaction still open are left alone
+STRAY_AFTER = timedelta(days=1)
+# (model label, field name) of every field stored as blobs
+BLOB_FIELDS = (
+    ('inventory.TechnicalDrawing', 'drawing_file'),
+    ('quality_control.QualityDocument', 'file'),
+)
+
+
+class HashingUploadMixin:
+    """Computes the SHA-256 of an uploaded file as its chunks arrive."""
+
+    def new_file(self, *args, **kwargs):
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # The memory handler passes large files on to the next handler
+        if getattr(self, 'activated', True):
+            self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_sha256(file):
+    """SHA-256 of a file, as hashed on upload or else read in chunks."""
+    sha256 = getattr(file, 'sha256', None)
+    if sha256:
+        return sha256
+    digest = hashlib.sha256()
+    for chunk in file.chunks(READ_CHUNK):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_name(sha256, file_name):
+    extension = posixpath.splitext(file_name)[1].lower()
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}{extension}"
+
+
+def _acquire(sha256):
+    """Take a reference to the blob with this content; None if there is none."""
+    with transaction.atomic():
+        blob = FileBlob.objects.select_for_update().filter(sha256=sha256).first()
+        if blob is not None:
+            FileBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    return blob
+
+
+def store(field_file):
+    """
+    Store the uncommitted upload of a FieldFile as a blob, or point it at the
+    blob already holding the same content without writing it again. Takes
+    one reference to the blob.
+
+    Returns:
+        the blob, and the name of the object written for it or None
+    """
+    content = field_file.file
+    sha256 = file_sha256(content)
+    blob = _acquire(sha256)
+    written = None
+    if blob is None:
+        written = field_file.storage.save(
+            blob_name(sha256, field_file.name), content, max_length=field_file.field.max_length
+        )
+        try:
+            with transaction.atomic():
+                blob = FileBlob.objects.create(sha256=sha256, name=written, size=content.size, ref_count=1)
+        except IntegrityError:
+            # The same content was stored concurrently
+            blob = _acquire(sha256)
+            if blob.name != written:
+                field_file.storage.delete(written)
+            written = None
+    field_file.name = blob.name
+    field_file._committed = True
+    return blob, written
+
+
+def release(name):
+    """Drop one reference to the blob stored under `name`, if it is one."""
+    if name:
+        FileBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+@contextmanager
+def storing(instance, field_name):
+    """
+    Wrap save() of a model with a FieldTracker on a blob field: store a new
+    upload as a blob before the row is written and release the file it
+    replaces after. If the save fails, the object written for it is deleted
+    and the field holds the upload again.
+    """
+    if not instance.tracker.has_changed(field_name):
+        yield
+        return
+    field_file = getattr(instance, field_name)
+    name, committed = field_file.name, field_file._committed
+    previous = instance.tracker.previous(field_name)
+    written = None
+    try:
+        with transaction.atomic():
+            if field_file and not committed:
+                written = store(field_file)[1]
+            yield
+            release(previous.name if previous else None)
+    except BaseException:
+        if written:
+            field_file.storage.delete(written)
+        field_file.name, field_file._committed = name, committed
+        raise
+
+
+def _fields(with_history=True):
+    """(model, field name, is live) of every blob field, historical models included."""
+    for label, field_name in BLOB_FIELDS:
+        model = apps.get_model(label)
+        yield model, field_name, True
+        history = getattr(model, 'history', None)
+        if with_history and history is not None:
+            yield history.model, field_name, False
+
+
+def _referenced(name):
+    return any(
+        model._base_manager.filter(**{field_name: name}).exists()
+        for model, field_name, _ in _fields()
+    )
+
+
+def unaddressed_names():
+    """Stored file names referenced by rows but not yet blobs."""
+    names = set()
+    blob_names = FileBlob.objects.values('name')
+    for model, field_name, _ in _fields():
+        names.update(
+            model._base_manager.exclude(**{f'{field_name}__in': blob_names}).exclude(
+                **{f'{field_name}__isnull': True}
+            ).exclude(**{field_name: ''}).values_list(field_name, flat=True).distinct()
+        )
+    return names
+
+
+def _hash_stored(name):
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with default_storage.open(name, 'rb') as source:
+            for chunk in source.chunks(READ_CHUNK):
+                digest.update(chunk)
+                size += len(chunk)
+    except Exception:
+        logger.warning("Could not read stored file %s", name, exc_info=True)
+        return name, None, 0
+    return name, digest.hexdigest(), size
+
+
+def _fold(name, sha256, size):
+    """
+    Make the stored file `name` a blob: adopt it in place if its content is
+    new, else point its rows at the existing blob and delete the duplicate.
+    """
+    with transaction.atomic():
+        blob = FileBlob.objects.select_for_update().filter(sha256=sha256).first()
+        if blob is None:
+            live = sum(
+                model._base_manager.filter(**{field_name: name}).count()
+                for model, field_name, is_live in _fields() if is_live
+            )
+            FileBlob.objects.create(sha256=sha256, name=name, size=size, ref_count=live)
+            return False
+        live = 0
+        for model, field_name, is_live in _fields():
+            # Queryset updates: the content is unchanged, so no history entries
+            # or derivative rebuilds are wanted
+            updated = model._base_manager.filter(**{field_name: name}).update(**{field_name: blob.name})
+            live += updated if is_live else 0
+        FileBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + live)
+        transaction.on_commit(lambda: default_storage.delete(name))
+    return True
+
+
+def dedupe_existing(workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    Fold every stored file that is not yet a blob into the blobs, hashing
+    the files `workers` at a time.
+
+    Returns:
+        dict with the number of files scanned, adopted as new blobs, merged
+        into existing ones and unreadable, and the bytes freed
+    """
+    names = sorted(unaddressed_names())
+    stats = Counter(scanned=len(names), adopted=0, merged=0, missing=0, bytes_freed=0)
+    seen = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for name, sha256, size in executor.map(_hash_stored, names):
+            if sha256 is None:
+                stats['missing'] += 1
+                continue
+            if dry_run:
+                merged = sha256 in seen or FileBlob.objects.filter(sha256=sha256).exists()
+                seen.add(sha256)
+            else:
+                merged = _fold(name, sha256, size)
+            stats['merged' if merged else 'adopted'] += 1
+            stats['bytes_freed'] += size if merged else 0
+    return dict(stats)
+
+
+def recount_references():
+    """Recount the live rows pointing at each blob; returns the blobs corrected."""
+    counts = Counter()
+    blob_names = FileBlob.objects.values('name')
+    for model, field_name, is_live in _fields(with_history=False):
+        counts.update(dict(
+            model._base_manager.filter(**{f'{field_name}__in': blob_names}).values(field_name).annotate(
+                refs=Count('pk')
+            ).order_by().values_list(field_name, 'refs')
+        ))
+    blobs = []
+    for blob in FileBlob.objects.only('id', 'name', 'ref_count').iterator(chunk_size=2000):
+        if blob.ref_count != counts[blob.name]:
+            blob.ref_count = counts[blob.name]
+            blobs.append(blob)
+    FileBlob.objects.bulk_update(blobs, ['ref_count'], batch_size=1000)
+    return len(blobs)
+
+
+def stray_objects(older_than=STRAY_AFTER):
+    """Objects under BLOB_PREFIX, older than `older_than`, that no FileBlob records."""
+    try:
+        directories = default_storage.listdir(BLOB_PREFIX)[0]
+    except FileNotFoundError:
+        return []
+    names = [
+        f"{BLOB_PREFIX}/{directory}/{file_name}"
+        for directory in directories
+        for file_name in default_storage.listdir(f"{BLOB_PREFIX}/{directory}")[1]
+    ]
+    known = set()
+    for start in range(0, len(names), 1000):
+        known.update(FileBlob.objects.filter(name__in=names[start:start + 1000]).values_list('name', flat=True))
+    cutoff = timezone.now() - older_than
+    return [name for name in names if name not in known and default_storage.get_modified_time(name) < cutoff]
+
+
+def prune_orphans(dry_run=False):
+    """
+    Delete blobs no row points at any more, historical rows included, and
+    stray blob objects left by rolled back saves.
+
+    Returns:
+        dict with the number of blobs and stray objects pruned and the bytes freed
+    """
+    stray = stray_objects()
+    freed = sum(default_storage.size(name) for name in stray)
+    if not dry_run:
+        for name in stray:
+            default_storage.delete(name)
+    pruned = 0
+    for blob_id in FileBlob.objects.filter(ref_count=0).values_list('pk', flat=True):
+        with transaction.atomic():
+            # The row lock holds off a concurrent upload of the same content
+            blob = FileBlob.objects.select_for_update().filter(pk=blob_id, ref_count=0).first()
+            if blob is None or _referenced(blob.name):
+                continue
+            if not dry_run:
+                default_storage.delete(blob.name)
+                blob.delete()
+            pruned += 1
+            freed += blob.size
+    return {'pruned': pruned, 'stray': len(stray), 'bytes_freed': freed}
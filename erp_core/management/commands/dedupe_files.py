@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from erp_core.blobs import DEFAULT_WORKERS, dedupe_existing, prune_orphans, recount_references
+
+class Command(BaseCommand):
+    help = 'Store drawing and quality document files once per content, folding duplicates into shared blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                            help='Files hashed in parallel')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be merged and freed')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete blobs no drawing or document points at any more, and stray blob objects')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        stats = dedupe_existing(workers=options['workers'], dry_run=dry_run)
+        self.stdout.write(
+            f"Scanned {stats['scanned']} files: {stats['adopted']} unique, {stats['merged']} duplicates, "
+            f"{stats['missing']} unreadable"
+        )
+        if not dry_run:
+            corrected = recount_references()
+            if corrected:
+                self.stdout.write(self.style.WARNING(f"Corrected reference counts of {corrected} blobs"))
+        freed = stats['bytes_freed']
+
+        if options['prune']:
+            pruned = prune_orphans(dry_run=dry_run)
+            self.stdout.write(f"{pruned['pruned']} unreferenced blobs, {pruned['stray']} stray blob objects")
+            freed += pruned['bytes_freed']
+
+        verb = 'Would free' if dry_run else 'Freed'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {freed / (1024 * 1024):.1f} MiB"))
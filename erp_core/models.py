@@ -181,4 +181,23 @@ class RolePermission(models.Model):
         unique_together = ['role', 'permission']
         
     def __str__(self):
-        return f"{self.role} - {self.permission.codename}" 
\ No newline at end of file
+        return f"{self.role} - {self.permission.codename}" 
+
+class FileBlob(models.Model):
+    """
+    A stored file addressed by the SHA-256 of its content. Files with the same
+    content share one blob; ref_count is the number of rows pointing at it.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=500, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count'], name='fileblob_orphan_idx', condition=Q(ref_count=0)),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
@@ -0,0 +1,188 @@
+"""
+Cached reference data.
+
+Small tables that change rarely but are read on almost every request
+(inventory categories, units of measure, manufacturing processes,
+departments) are cached whole: in the shared (Redis) cache under a key
+carrying the table's version token, and in each worker's memory in front of
+it. Saves and deletes bump the version after commit, so every worker
+reloads the table on its next read. Until then, lookups in the transaction
+that made them read the table from the database and cache nothing, so a
+rollback leaves no uncommitted rows cached.
+
+Workers check the version in the shared cache at most every LOCAL_TTL
+seconds, so a lookup is usually a dict access with no query and no network
+round trip; other workers see a change within that time. Bulk queryset
+updates bypass the signals, so cached tables are also reloaded after
+MAX_AGE seconds, and a lookup that misses falls back to the database.
+
+The cache is an accelerator only: while it is unreachable, lookups read the
+table from the database and failed version bumps are logged, so validation
+and writes keep working. A change whose bump failed is seen by other
+workers after MAX_AGE at the latest.
+"""
+import copy
+import logging
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker serves its copy before checking the version again
+LOCAL_TTL = 5
+# Seconds a cached table is served before it is read from the database again
+MAX_AGE = 60 * 60
+
+
+class ReferenceTable:
+    """
+    All rows of a model, looked up by a key field or by primary key.
+    Lookups return copies, so callers may modify what they get.
+    """
+
+    def __init__(self, model_label, key_field):
+        self.model_label = model_label
+        self.key_field = key_field
+        self.version_key = f'reference:{model_label.lower()}:version'
+        self._local = None
+        self._lock = threading.Lock()
+        # Database alias of the transaction this thread changed the table in
+        self._changing = threading.local()
+        for signal in (post_save, post_delete):
+            signal.connect(self._changed, sender=model_label, weak=False,
+                           dispatch_uid=f'reference_table_{model_label}_{signal is post_save}')
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def invalidate(self):
+        """Make every worker reload the table on its next read."""
+        with self._lock:
+            self._local = None
+        try:
+            cache.set(self.version_key, uuid.uuid4().hex, None)
+        except Exception:
+            logger.warning("Could not bump the cached version of %s", self.model_label, exc_info=True)
+
+    def _changed(self, sender, instance, using, **kwargs):
+        if transaction.get_connection(using).in_atomic_block:
+            self._changing.using = using
+        transaction.on_commit(self._committed, using=using)
+
+    def _committed(self):
+        self._changing.using = None
+        self.invalidate()
+
+    def _in_changing_transaction(self):
+        using = getattr(self._changing, 'using', None)
+        if using is None:
+            return False
+        if transaction.get_connection(using).in_atomic_block:
+            return True
+        # Rolled back, so the commit callback never ran
+        self._changing.using = None
+        return False
+
+    def _load(self):
+        return {'loaded_at': time.time(), 'rows': list(self.model._base_manager.order_by('pk'))}
+
+    def _indexed(self, loaded, version=None):
+        return {
+            **loaded,
+            'version': version,
+            'by_key': {getattr(row, self.key_field): row for row in loaded['rows']},
+            'by_pk': {row.pk: row for row in loaded['rows']},
+        }
+
+    def _shared(self, local):
+        """The local copy, reloaded from the shared cache if it is out of date."""
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            # Another worker may have set it meanwhile; use whichever won
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key, version)
+        if local is None or local['version'] != version or time.time() - local['loaded_at'] >= MAX_AGE:
+            data_key = f'reference:{self.model_label.lower()}:rows:{version}'
+            loaded = cache.get(data_key)
+            if loaded is None or time.time() - loaded['loaded_at'] >= MAX_AGE:
+                loaded = self._load()
+                cache.set(data_key, loaded, MAX_AGE)
+            local = self._indexed(loaded, version)
+        return local
+
+    def _snapshot(self, recheck=False):
+        if self._in_changing_transaction():
+            return self._indexed(self._load())
+        now = time.monotonic()
+        local = self._local
+        if local is not None and now - local['checked_at'] < LOCAL_TTL and not recheck:
+            return local
+
+        try:
+            local = self._shared(local)
+        except Exception:
+            logger.warning("Could not read the cached %s table", self.model_label, exc_info=True)
+            with self._lock:
+                self._local = None
+            return self._indexed(self._load())
+        local = {**local, 'checked_at': now}
+        with self._lock:
+            self._local = local
+        return local
+
+    def _row(self, index, value):
+        row = self._snapshot()[index].get(value)
+        if row is None:
+            # Possibly added by another worker since this one last checked
+            row = self._snapshot(recheck=True)[index].get(value)
+        if row is None:
+            # or without signals (bulk_create, fixtures)
+            field = self.key_field if index == 'by_key' else 'pk'
+            row = self.model._base_manager.filter(**{field: value}).first()
+            if row is not None:
+                transaction.on_commit(self.invalidate)
+        return row
+
+    def all(self):
+        return [copy.copy(row) for row in self._snapshot()['rows']]
+
+    def get(self, key):
+        """
+        The row with this key.
+
+        Raises:
+            DoesNotExist: like Model.objects.get
+        """
+        row = self._row('by_key', key)
+        if row is None:
+            raise self.model.DoesNotExist(f"{self.model.__name__} with {self.key_field}={key!r} does not exist")
+        return copy.copy(row)
+
+    def get_by_pk(self, pk):
+        try:
+            row = self._row('by_pk', self.model._meta.pk.to_python(pk))
+        except ValidationError:
+            row = None
+        if row is None:
+            raise self.model.DoesNotExist(f"{self.model.__name__} with pk={pk!r} does not exist")
+        return copy.copy(row)
+
+    def key_for(self, pk):
+        """The key of the row with this primary key, or None."""
+        row = self._row('by_pk', pk) if pk is not None else None
+        return getattr(row, self.key_field) if row is not None else None
+
+
+inventory_categories = ReferenceTable('inventory.InventoryCategory', 'name')
+units_of_measure = ReferenceTable('inventory.UnitOfMeasure', 'unit_code')
+manufacturing_processes = ReferenceTable('manufacturing.ManufacturingProcess', 'process_code')
+departments = ReferenceTable('erp_core.Department', 'name')
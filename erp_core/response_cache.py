@@ -0,0 +1,346 @@
+"""
+Response cache for read-only API endpoints.
+
+Every model a cached response is built from has a generation counter in
+the shared (Redis) cache, bumped whenever a row of its table is inserted,
+updated or deleted; writes to other tables cost nothing. Writes are
+seen on the database connection itself (an execute wrapper matching
+INSERT/UPDATE/DELETE statements), so queryset updates, bulk operations
+and raw SQL bump the counter as well as save() and delete(). A table
+written inside a transaction is bumped on its first write and again once
+the transaction commits.
+
+The cache only ever speeds responses up. While it is unreachable, cached
+endpoints build every response themselves. A bump that fails is logged
+rather than failing a write that has already run, and the worker builds
+the responses depending on that model itself until a retried bump
+succeeds; the retry runs with the worker's next bump or cached read.
+
+A cached response is stored under a key made of the endpoint, the query
+parameters, the user scope and the current generation of every model the
+response is built from: the viewset's model, the relations it selects or
+prefetches, the models its serializer reads through nested serializers
+and dotted sources, and any listed in cache_dependencies. A write to any
+of them changes the key, so a cached page is never served after the data
+behind it changed. Concurrent misses of one key are coalesced: one request
+builds the response while the others wait for it (single-flight).
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from functools import partial
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpRequest
+from django.urls import get_resolver
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+GENERATION_PREFIX = 'response_cache:generation:'
+# Backstop: cached responses are rebuilt at least this often
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+# A request building a response holds the key for at most this many seconds
+BUILD_TIMEOUT = 30
+WAIT_INTERVAL = 0.05
+
+_WRITE_SQL = re.compile(r'\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+["`]?(\w+)', re.IGNORECASE)
+# Table name -> label of every model a cached response is built from
+_table_labels = None
+_table_labels_lock = threading.Lock()
+# Models whose generation this worker could not bump
+_failed_bumps = set()
+
+
+def _generation_key(label):
+    return f'{GENERATION_PREFIX}{label}'
+
+
+def _start():
+    # Counters start at a random value, so a counter lost from the cache
+    # does not count again through generations already used in keys
+    return random.getrandbits(48)
+
+
+def bump(*labels):
+    """Start a new generation of each model, by 'app_label.modelname'."""
+    for label in {*labels, *_failed_bumps}:
+        key = _generation_key(label)
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                if not cache.add(key, _start(), None):
+                    cache.incr(key)
+        except Exception:
+            logger.warning("Could not start a new response cache generation of %s", label, exc_info=True)
+            _failed_bumps.add(label)
+        else:
+            _failed_bumps.discard(label)
+
+
+def _bumps_failed(labels):
+    """Whether a write to one of these models could not be bumped, even when retried now."""
+    if _failed_bumps.isdisjoint(labels):
+        return False
+    bump()
+    return not _failed_bumps.isdisjoint(labels)
+
+
+def generations(labels):
+    """Current generation of each model."""
+    keys = {_generation_key(label): label for label in labels}
+    found = cache.get_many(list(keys))
+    for key in keys.keys() - found.keys():
+        cache.add(key, _start(), None)
+        found[key] = cache.get(key)
+    return {label: found[key] for key, label in keys.items()}
+
+
+def _cached_response_labels():
+    """Labels of the models the responses of every CachedResponseMixin viewset are built from."""
+    # Loading the URLconf imports every viewset
+    get_resolver().url_patterns
+    request = Request(HttpRequest())
+    labels = set()
+    view_classes = list(CachedResponseMixin.__subclasses__())
+    while view_classes:
+        view_class = view_classes.pop()
+        view_classes.extend(view_class.__subclasses__())
+        for action in view_class.cache_actions:
+            view = view_class(action=action, request=request, args=(), kwargs={}, format_kwarg=None)
+            try:
+                labels.update(view.response_cache_models())
+            except Exception:
+                # The action fails the same way on every request, before anything is cached
+                logger.warning("Could not list the models %s.%s depends on", view_class.__name__, action, exc_info=True)
+    return labels
+
+
+def _tables(labels):
+    return {
+        model._meta.db_table: model._meta.label_lower
+        for model in apps.get_models(include_auto_created=True) if model._meta.label_lower in labels
+    }
+
+
+def _track(labels):
+    if _table_labels is not None:
+        _table_labels.update(_tables(labels))
+
+
+def _label_for_table(table):
+    """Label of the model of the table, if a cached response is built from it."""
+    global _table_labels
+    if _table_labels is None:
+        with _table_labels_lock:
+            if _table_labels is None:
+                _table_labels = _tables(_cached_response_labels())
+    return _table_labels.get(table)
+
+
+class _PendingBumps:
+    """Models written in the current transaction, bumped again on commit."""
+
+    def __init__(self):
+        self.labels = set()
+
+    def __call__(self):
+        bump(*self.labels)
+
+
+def _record_write(connection, label):
+    if not connection.in_atomic_block:
+        bump(label)
+        return
+    pending = getattr(connection, '_pending_generation_bumps', None)
+    # A rolled back transaction drops its commit callbacks with it
+    if pending is None or not any(entry[1] is pending for entry in connection.run_on_commit):
+        pending = _PendingBumps()
+        connection._pending_generation_bumps = pending
+        connection.on_commit(pending)
+    if label not in pending.labels:
+        pending.labels.add(label)
+        bump(label)
+
+
+def track_writes(execute, sql, params, many, context):
+    result = execute(sql, params, many, context)
+    match = _WRITE_SQL.match(sql) if isinstance(sql, str) else None
+    if match:
+        label = _label_for_table(match.group(1))
+        if label:
+            _record_write(context['connection'], label)
+    return result
+
+
+@receiver(connection_created)
+def install_write_tracking(sender, connection, **kwargs):
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+def _write(operation, *args):
+    try:
+        operation(*args)
+    except Exception:
+        logger.warning("Could not write the response cache", exc_info=True)
+
+
+def get_or_build(key, build):
+    """
+    The cached value of `key`, or the value build() returns, cached if not
+    None. Only one caller builds a missing key; the others wait for it.
+    While the cache is unreachable every caller builds the value itself.
+    """
+    try:
+        value = cache.get(key)
+    except Exception:
+        logger.warning("Could not read the response cache", exc_info=True)
+        return build()
+    if value is not None:
+        return value
+    lock_key = f'{key}:building'
+    deadline = time.monotonic() + BUILD_TIMEOUT
+    while True:
+        try:
+            building = cache.add(lock_key, 1, BUILD_TIMEOUT)
+        except Exception:
+            logger.warning("Could not read the response cache", exc_info=True)
+            return build()
+        if building:
+            try:
+                value = build()
+                if value is not None:
+                    _write(cache.set, key, value, RESPONSE_CACHE_TIMEOUT)
+                return value
+            finally:
+                _write(cache.delete, lock_key)
+        time.sleep(WAIT_INTERVAL)
+        try:
+            value = cache.get(key)
+        except Exception:
+            logger.warning("Could not read the response cache", exc_info=True)
+            return build()
+        if value is not None:
+            return value
+        if time.monotonic() > deadline:
+            return build()
+
+
+def _path_models(model, path):
+    """Models reached following a relation path such as 'product__inventory_category'."""
+    models = []
+    for name in path:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation or field.related_model is None:
+            break
+        model = field.related_model
+        models.append(model)
+        through = getattr(getattr(field, 'remote_field', None), 'through', None)
+        if field.many_to_many and through is not None:
+            models.append(through)
+    return models
+
+
+def _select_related_paths(tree, prefix=()):
+    for name, subtree in (tree or {}).items():
+        yield prefix + (name,)
+        yield from _select_related_paths(subtree, prefix + (name,))
+
+
+def _serializer_models(serializer, model, seen):
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        nested_model = getattr(getattr(field, 'Meta', None), 'model', None)
+        if nested_model is not None:
+            seen.add(nested_model)
+            _serializer_models(field, nested_model, seen)
+            continue
+        source = getattr(field, 'source', None) or ''
+        if '.' in source:
+            seen.update(_path_models(model, source.split('.')[:-1]))
+
+
+class CachedResponseMixin:
+    """
+    Cache the responses of a viewset's read-only actions. Responses are
+    shared by all users allowed to call the endpoint unless
+    response_cache_scope() says otherwise. Models the response depends on
+    that cannot be found from the queryset and serializer go in
+    cache_dependencies, as 'app_label.ModelName'.
+    """
+    cache_actions = ('list', 'retrieve')
+    cache_dependencies = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        if getattr(self, 'action_map', {}).get(method) in self.cache_actions:
+            # Wrap the handler, which runs after authentication and permissions
+            setattr(self, method, partial(self._cached_handler, getattr(self, method)))
+        return super().dispatch(request, *args, **kwargs)
+
+    def response_cache_scope(self, request):
+        return 'authenticated'
+
+    def response_cache_models(self):
+        cls = type(self)
+        cached = cls.__dict__.get('_response_cache_models', {})
+        if self.action not in cached:
+            queryset = self.get_queryset()
+            models = {queryset.model}
+            select_related = queryset.query.select_related
+            for path in _select_related_paths(select_related if isinstance(select_related, dict) else {}):
+                models.update(_path_models(queryset.model, path))
+            for lookup in queryset._prefetch_related_lookups:
+                path = getattr(lookup, 'prefetch_through', lookup)
+                models.update(_path_models(queryset.model, path.split('__')))
+            _serializer_models(self.get_serializer(), queryset.model, models)
+            models.update(apps.get_model(label) for label in self.cache_dependencies)
+            cached = {**cached, self.action: sorted(model._meta.label_lower for model in models)}
+            cls._response_cache_models = cached
+            _track(cached[self.action])
+        return cached[self.action]
+
+    def _cached_handler(self, handler, request, *args, **kwargs):
+        labels = self.response_cache_models()
+        if _bumps_failed(labels):
+            # Pages cached before the failed bump may be stale
+            return handler(request, *args, **kwargs)
+        try:
+            current = generations(labels)
+        except Exception:
+            logger.warning("Could not read the response cache", exc_info=True)
+            return handler(request, *args, **kwargs)
+        parts = [
+            request.get_host(), request.path, self.action, self.response_cache_scope(request),
+            sorted(request.query_params.lists()), sorted(current.items()),
+        ]
+        key = f"response_cache:{type(self).__name__}:{hashlib.sha256(repr(parts).encode()).hexdigest()}"
+
+        built = {}
+
+        def build():
+            response = built['response'] = handler(request, *args, **kwargs)
+            return response.data if response.status_code == 200 else None
+
+        data = get_or_build(key, build)
+        if 'response' in built:
+            built['response']['X-Cache'] = 'MISS'
+            return built['response']
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
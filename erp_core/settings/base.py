@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'anymail',
     'manufacturing',
     'inventory',
@@ -175,6 +176,12 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are hashed as they stream in, for content-addressed storage (erp_core.blobs)
+FILE_UPLOAD_HANDLERS = [
+    'erp_core.blobs.HashingMemoryFileUploadHandler',
+    'erp_core.blobs.HashingTemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
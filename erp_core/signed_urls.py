@@ -0,0 +1,94 @@
+"""
+Signed URL cache for object storage.
+
+Signing a URL is an HMAC over the request per file, and list responses
+embed many files. Signed URLs are cached by file name until shortly before
+their signature expires: in Redis, shared by all workers, and in a small LRU
+in each worker in front of it. While Redis is unreachable, the worker signs
+the URLs its LRU does not hold.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Signed URLs are cached until this many seconds before their signature
+# expires, so a URL handed out is always valid for at least that long
+SIGNED_URL_MIN_VALIDITY = 300
+# Signed URLs kept in each worker's memory in front of the shared cache
+SIGNED_URL_LOCAL_SIZE = 4096
+
+
+class SignedURLCache:
+    """
+    Per-process LRU of signed URLs in front of the shared (Redis) cache.
+    Entries carry their own deadline, so both levels expire together.
+    """
+
+    def __init__(self, size=SIGNED_URL_LOCAL_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+        if missing:
+            try:
+                shared = cache.get_many(missing)
+            except Exception:
+                logger.warning("Could not read cached signed URLs", exc_info=True)
+                shared = {}
+            for key, entry in shared.items():
+                if entry[1] > now:
+                    found[key] = entry[0]
+                    self._remember(key, entry)
+        return found
+
+    def set_many(self, urls, deadline):
+        try:
+            cache.set_many({key: (url, deadline) for key, url in urls.items()}, int(deadline - time.time()))
+        except Exception:
+            logger.warning("Could not cache signed URLs", exc_info=True)
+        for key, url in urls.items():
+            self._remember(key, (url, deadline))
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        try:
+            cache.delete(key)
+        except Exception:
+            logger.warning("Could not drop the cached signed URL %s", key, exc_info=True)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+signed_urls = SignedURLCache()
+
+
+def prefetch_urls(files):
+    """Sign, or fetch the cached signatures of, many stored files at once."""
+    names = {}
+    for file in files:
+        if file and hasattr(file.storage, 'urls'):
+            names.setdefault(file.storage, []).append(file.name)
+    for storage, storage_names in names.items():
+        storage.urls(storage_names)
@@ -1,6 +1,10 @@
+import time
+
 from django.conf import settings
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from erp_core.signed_urls import SIGNED_URL_MIN_VALIDITY, signed_urls
+
 
 class CloudflareR2Storage(S3Boto3Storage):
     """
@@ -20,6 +24,43 @@ class CloudflareR2Storage(S3Boto3Storage):
     querystring_auth = settings.AWS_QUERYSTRING_AUTH if hasattr(settings, 'AWS_QUERYSTRING_AUTH') else True
     default_acl = settings.AWS_DEFAULT_ACL if hasattr(settings, 'AWS_DEFAULT_ACL') else None
 
+    def _signs_urls(self):
+        return self.querystring_auth and not self.custom_domain
+
+    def _url_cache_key(self, name):
+        return f"r2:signed-url:{self.bucket_name}:{self.location}:{name}"
+
+    def urls(self, names):
+        """
+        Signed URLs of many files by name. Signatures are reused from the
+        cache until shortly before they expire; only the missing ones are
+        signed, and they are stored in one round trip.
+        """
+        if not self._signs_urls():
+            return {name: super(CloudflareR2Storage, self).url(name) for name in names}
+
+        keys = {self._url_cache_key(name): name for name in names}
+        cached = signed_urls.get_many(keys)
+        urls = {keys[key]: url for key, url in cached.items()}
+        signed, signed_at = {}, time.time()
+        for key, name in keys.items():
+            if name not in urls:
+                urls[name] = signed[key] = super().url(name)
+        if signed:
+            signed_urls.set_many(signed, signed_at + self.querystring_expire - min(
+                SIGNED_URL_MIN_VALIDITY, self.querystring_expire // 2
+            ))
+        return urls
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if parameters or expire is not None or http_method:
+            return super().url(name, parameters, expire, http_method)
+        return self.urls([name])[name]
+
+    def delete(self, name):
+        super().delete(name)
+        signed_urls.delete(self._url_cache_key(name))
+
 
 class CloudflareR2StaticStorage(CloudflareR2Storage):
     """
@@ -0,0 +1,304 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITransactionTestCase
+
+from inventory.models import InventoryCategory, Product, TechnicalDrawing, UnitOfMeasure
+from .blobs import BLOB_PREFIX, prune_orphans
+from .models import FileBlob
+from .reference import MAX_AGE, inventory_categories
+from .response_cache import _WRITE_SQL, _failed_bumps, _label_for_table, bump, generations
+from .signed_urls import SignedURLCache
+
+User = get_user_model()
+
+
+class SignedURLCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.urls = SignedURLCache(size=2)
+
+    def test_entries_expire_at_their_deadline(self):
+        """Test that cached URLs are served until their deadline and missed after it"""
+        self.urls.set_many({'a': 'https://a'}, time.time() + 60)
+        self.urls.set_many({'b': 'https://b'}, time.time() - 1)
+        self.assertEqual(self.urls.get_many(['a', 'b']), {'a': 'https://a'})
+
+    def test_shared_cache_backs_the_local_lru(self):
+        """Test that entries evicted from the worker LRU still come from the shared cache"""
+        deadline = time.time() + 60
+        self.urls.set_many({'a': 'https://a', 'b': 'https://b', 'c': 'https://c'}, deadline)
+        self.assertEqual(list(self.urls._entries), ['b', 'c'])
+
+        other_worker = SignedURLCache(size=2)
+        self.assertEqual(other_worker.get_many(['a', 'c']), {'a': 'https://a', 'c': 'https://c'})
+        self.urls.delete('a')
+        self.assertEqual(self.urls.get_many(['a', 'b']), {'b': 'https://b'})
+
+
+
+    def test_unreachable_cache_is_a_miss(self):
+        """Test that the worker LRU keeps working and the shared cache is skipped while it is down"""
+        deadline = time.time() + 60
+        failing = mock.Mock(side_effect=ConnectionError('cache unreachable'))
+        with mock.patch.multiple(cache, get_many=failing, set_many=failing, delete=failing), \
+                self.assertLogs('erp_core.signed_urls', 'WARNING'):
+            self.urls.set_many({'a': 'https://a'}, deadline)
+            self.assertEqual(self.urls.get_many(['a', 'b']), {'a': 'https://a'})
+            self.urls.delete('a')
+            self.assertEqual(self.urls.get_many(['a']), {})
+
+class FileBlobTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.product = Product.objects.create(
+            product_code='P-001', product_name='Product 1', product_type='SINGLE', inventory_category=category
+        )
+
+    def create_drawing(self, version, content, **fields):
+        return TechnicalDrawing.objects.create(
+            product=self.product, version=version, drawing_code=f'D-{version}',
+            effective_date=date(2025, 1, 1), created_by=self.user,
+            drawing_file=ContentFile(content, name='drawing.pdf'), **fields
+        )
+
+    def stored_objects(self):
+        directories = default_storage.listdir(BLOB_PREFIX)[0]
+        return sorted(
+            f'{BLOB_PREFIX}/{directory}/{name}'
+            for directory in directories for name in default_storage.listdir(f'{BLOB_PREFIX}/{directory}')[1]
+        )
+
+    def test_same_content_is_stored_once_and_counted(self):
+        """Test that drawings with the same content share one blob and count their references"""
+        first = self.create_drawing('1', b'%PDF-1.4 same')
+        second = self.create_drawing('2', b'%PDF-1.4 same')
+
+        self.assertEqual(first.drawing_file.name, second.drawing_file.name)
+        blob = FileBlob.objects.get()
+        self.assertEqual((blob.name, blob.ref_count), (first.drawing_file.name, 2))
+        self.assertEqual(self.stored_objects(), [blob.name])
+
+    def test_replace_and_delete_release_the_blob(self):
+        """Test that replacing a drawing's file or deleting the drawing releases its blob"""
+        first = self.create_drawing('1', b'%PDF-1.4 old')
+        second = self.create_drawing('2', b'%PDF-1.4 old')
+        old_name = first.drawing_file.name
+
+        first.drawing_file = ContentFile(b'%PDF-1.4 new', name='drawing.pdf')
+        first.save()
+        self.assertEqual(dict(FileBlob.objects.values_list('name', 'ref_count')), {
+            old_name: 1, first.drawing_file.name: 1,
+        })
+
+        second.delete()
+        self.assertEqual(FileBlob.objects.get(name=old_name).ref_count, 0)
+        # The drawings' history still points at the released blob
+        self.assertEqual(prune_orphans(), {'pruned': 0, 'stray': 0, 'bytes_freed': 0})
+        self.assertEqual(self.stored_objects(), sorted([old_name, first.drawing_file.name]))
+
+    def test_failed_save_deletes_the_object_it_wrote(self):
+        """Test that a save failing after its blob was written leaves no object or blob behind"""
+        self.create_drawing('1', b'%PDF-1.4 first')
+        drawing = TechnicalDrawing(
+            product=self.product, version='1', drawing_code='D-1b',
+            effective_date=date(2025, 1, 1), created_by=self.user,
+            drawing_file=ContentFile(b'%PDF-1.4 second', name='drawing.pdf'),
+        )
+
+        with self.assertRaises(IntegrityError):
+            drawing.save()
+        self.assertEqual(FileBlob.objects.count(), 1)
+        self.assertEqual(len(self.stored_objects()), 1)
+
+        # The upload is kept, so saving again once the row is valid stores it
+        drawing.version = '2'
+        drawing.save()
+        self.assertEqual(FileBlob.objects.get(name=drawing.drawing_file.name).ref_count, 1)
+        self.assertEqual(len(self.stored_objects()), 2)
+
+    def test_prune_sweeps_old_stray_objects(self):
+        """Test that old objects no blob records are pruned and recent ones are kept"""
+        drawing = self.create_drawing('1', b'%PDF-1.4 kept')
+        old = default_storage.save(f'{BLOB_PREFIX}/ab/old.pdf', ContentFile(b'old'))
+        recent = default_storage.save(f'{BLOB_PREFIX}/cd/recent.pdf', ContentFile(b'recent'))
+        two_days_ago = time.time() - 2 * 24 * 3600
+        os.utime(default_storage.path(old), (two_days_ago, two_days_ago))
+
+        self.assertEqual(prune_orphans(dry_run=True), {'pruned': 0, 'stray': 1, 'bytes_freed': 3})
+        self.assertEqual(prune_orphans(), {'pruned': 0, 'stray': 1, 'bytes_freed': 3})
+        self.assertEqual(self.stored_objects(), sorted([drawing.drawing_file.name, recent]))
+
+
+class ReferenceTableTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        for name in ['HAMMADDE', 'KARANTINA', 'MAMUL']:
+            InventoryCategory.objects.create(name=name)
+        self.quarantine = inventory_categories.get('KARANTINA')
+
+    def test_lookups_are_served_from_memory(self):
+        """Test that lookups by key and primary key run no query once the table is cached"""
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.assertEqual(inventory_categories.get('KARANTINA').pk, self.quarantine.pk)
+                self.assertEqual(inventory_categories.key_for(self.quarantine.pk), 'KARANTINA')
+                self.assertEqual(inventory_categories.get_by_pk(str(self.quarantine.pk)).name, 'KARANTINA')
+            self.assertEqual([category.name for category in inventory_categories.all()], ['HAMMADDE', 'KARANTINA', 'MAMUL'])
+
+        copy = inventory_categories.get('MAMUL')
+        copy.name = 'CHANGED'
+        self.assertEqual(inventory_categories.get('MAMUL').name, 'MAMUL')
+
+    def test_saves_and_deletes_are_seen_once_committed(self):
+        """Test that a committed save or delete is seen by the next lookup"""
+        self.quarantine.description = 'On hold'
+        self.quarantine.save()
+        self.assertEqual(inventory_categories.get('KARANTINA').description, 'On hold')
+
+        InventoryCategory.objects.get(name='MAMUL').delete()
+        with self.assertRaises(InventoryCategory.DoesNotExist):
+            inventory_categories.get('MAMUL')
+
+    def test_rolled_back_rows_are_not_cached(self):
+        """Test that rows read inside a transaction that is rolled back stay out of the cache"""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                InventoryCategory.objects.create(name='HURDA')
+                self.assertEqual(inventory_categories.get('HURDA').name, 'HURDA')
+                raise RuntimeError('rolled back')
+
+        self.assertEqual([category.name for category in inventory_categories.all()], ['HAMMADDE', 'KARANTINA', 'MAMUL'])
+        with self.assertRaises(InventoryCategory.DoesNotExist):
+            inventory_categories.get('HURDA')
+
+    def test_bulk_updates_are_seen_after_max_age(self):
+        """Test that a change made without signals is read again once the cached copy is MAX_AGE old"""
+        InventoryCategory.objects.filter(pk=self.quarantine.pk).update(description='On hold')
+        self.assertIsNone(inventory_categories.get('KARANTINA').description)
+
+        later = time.time() + MAX_AGE + 1
+        monotonic_later = time.monotonic() + MAX_AGE + 1
+        with mock.patch('time.time', return_value=later), mock.patch('time.monotonic', return_value=monotonic_later):
+            self.assertEqual(inventory_categories.get('KARANTINA').description, 'On hold')
+
+
+    def test_unreachable_cache_falls_back_to_the_database(self):
+        """Test that lookups and saves keep working, with the errors logged, while the cache is down"""
+        failing = mock.Mock(side_effect=ConnectionError('cache unreachable'))
+        with mock.patch.multiple(cache, get=failing, add=failing, set=failing), \
+                self.assertLogs('erp_core.reference', 'WARNING'):
+            self.quarantine.description = 'On hold'
+            self.quarantine.save()
+            self.assertEqual(inventory_categories.get('KARANTINA').description, 'On hold')
+            self.assertEqual(inventory_categories.key_for(self.quarantine.pk), 'KARANTINA')
+
+class ResponseCacheTest(APITransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        _failed_bumps.clear()
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        UnitOfMeasure.objects.create(unit_code='KG', unit_name='Kilogram')
+        self.url = reverse('inventory:unitofmeasure-list')
+
+    def test_write_statements_map_to_models(self):
+        """Test that INSERT, UPDATE and DELETE statements are matched to the model of their table"""
+        tables = [
+            _WRITE_SQL.match(sql).group(1) for sql in [
+                'INSERT INTO "inventory_unitofmeasure" ("unit_code") VALUES (%s)',
+                '  update inventory_unitofmeasure SET unit_name = %s',
+                'DELETE FROM `inventory_unitofmeasure` WHERE id = %s',
+            ]
+        ]
+        self.assertEqual(tables, ['inventory_unitofmeasure'] * 3)
+        self.assertIsNone(_WRITE_SQL.match('SELECT * FROM "inventory_unitofmeasure"'))
+        self.assertEqual(_label_for_table('inventory_unitofmeasure'), 'inventory.unitofmeasure')
+        self.assertIsNone(_label_for_table('no_such_table'))
+        # No cached response is built from sessions or stock movements
+        self.assertIsNone(_label_for_table('django_session'))
+        self.assertIsNone(_label_for_table('inventory_inventorytransaction'))
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        """Test that the first read builds the response and the next is a cache hit"""
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.data, second.data)
+
+    def test_queryset_update_invalidates_cached_responses(self):
+        """Test that a queryset update, which sends no signals, still starts a new generation"""
+        self.client.get(self.url)
+        before = generations(['inventory.unitofmeasure'])
+
+        UnitOfMeasure.objects.filter(unit_code='KG').update(unit_name='Kilo')
+        self.assertNotEqual(generations(['inventory.unitofmeasure']), before)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data[0]['unit_name'], 'Kilo')
+
+    def test_cache_errors_do_not_fail_writes(self):
+        """Test that a write whose bump fails is kept and the failure logged"""
+        with mock.patch.object(cache, 'incr', side_effect=ConnectionError('cache unreachable')), \
+                self.assertLogs('erp_core.response_cache', 'WARNING'):
+            updated = UnitOfMeasure.objects.filter(unit_code='KG').update(unit_name='Kilo')
+            bump('inventory.unitofmeasure')
+
+        self.assertEqual(updated, 1)
+        self.assertEqual(UnitOfMeasure.objects.get().unit_name, 'Kilo')
+
+    def test_unreachable_cache_builds_responses(self):
+        """Test that reads are answered from the database while the cache cannot be read"""
+        failing = mock.Mock(side_effect=ConnectionError('cache unreachable'))
+        with mock.patch.multiple(cache, get=failing, get_many=failing, add=failing), \
+                self.assertLogs('erp_core.response_cache', 'WARNING'):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['unit_name'], 'Kilogram')
+        self.assertNotIn('X-Cache', response)
+
+    def test_failed_bump_bypasses_cached_pages_until_retried(self):
+        """Test that after a failed bump the model's pages are built again until a bump succeeds"""
+        self.client.get(self.url)
+        with mock.patch.object(cache, 'incr', side_effect=ConnectionError('cache unreachable')), \
+                self.assertLogs('erp_core.response_cache', 'WARNING'):
+            UnitOfMeasure.objects.filter(unit_code='KG').update(unit_name='Kilo')
+            response = self.client.get(self.url)
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(response.data[0]['unit_name'], 'Kilo')
+
+        responses = [self.client.get(self.url) for _ in range(2)]
+        self.assertEqual([response['X-Cache'] for response in responses], ['MISS', 'HIT'])
+        self.assertEqual(responses[1].data[0]['unit_name'], 'Kilo')
+
+    def test_writes_to_untracked_tables_are_not_bumped(self):
+        """Test that writes to tables no cached response is built from send nothing to the cache"""
+        with mock.patch.object(cache, 'incr') as incr:
+            User.objects.filter(pk=self.user.pk).update(first_name='Test')
+            UnitOfMeasure.objects.filter(unit_code='KG').update(unit_name='Kilo')
+
+        incr.assert_called_once_with('response_cache:generation:inventory.unitofmeasure')
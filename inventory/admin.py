@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Product, RawMaterial, InventoryTransaction, InventoryCategory, 
-    UnitOfMeasure, TechnicalDrawing, Tool, Holder, Fixture, ControlGauge
+    UnitOfMeasure, TechnicalDrawing, Tool, Holder, Fixture, ControlGauge,
+    StockCheckpoint, StockReservation
 )
 
 @admin.register(Product)
@@ -10,6 +11,7 @@ class ProductAdmin(admin.ModelAdmin):
         'product_code', 
         'product_name', 
         'current_stock', 
+        'reserved_stock',
         'inventory_category'
     ]
     list_filter = [
@@ -32,6 +34,21 @@ class InventoryTransactionAdmin(admin.ModelAdmin):
     search_fields = ('notes',)
     ordering = ('-transaction_date',)
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'material', 'quantity', 'status', 'sales_order_item', 'work_order', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('product__product_code', 'material__material_code', 'notes')
+    readonly_fields = ('quantity', 'status')
+    ordering = ('-created_at',)
+
+@admin.register(StockCheckpoint)
+class StockCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('month', 'product', 'material', 'inventory_category', 'balance', 'month_change', 'transaction_count')
+    list_filter = ('month', 'inventory_category')
+    search_fields = ('product__product_code', 'material__material_code')
+    ordering = ('-month',)
+
 @admin.register(InventoryCategory)
 class InventoryCategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'description')
@@ -57,7 +74,7 @@ class ToolAdmin(admin.ModelAdmin):
     list_filter = ('tool_type', 'status', 'tool_material')
     search_fields = ('stock_code', 'product_code', 'description')
     ordering = ('stock_code',)
-    readonly_fields = ('modified_at', 'created_at',)
+    readonly_fields = ('modified_at', 'created_at', 'parts_produced', 'cutting_minutes', 'life_started_at', 'last_used_at')
     fieldsets = (
         ('Basic Information', {
             'fields': ('stock_code', 'product_code', 'supplier_name', 'tool_type', 'status', 'description')
@@ -75,6 +92,10 @@ class ToolAdmin(admin.ModelAdmin):
         ('Stock Information', {
             'fields': ('quantity',)
         }),
+        ('Tool Life', {
+            'fields': ('life_limit_parts', 'life_limit_minutes', 'parts_produced', 'cutting_minutes',
+                      'life_started_at', 'last_used_at')
+        }),
         ('System Fields', {
             'fields': ('created_at', 'modified_at', 'created_by', 'modified_by'),
             'classes': ('collapse',)
@@ -0,0 +1,49 @@
+"""
+Browsing the product catalog by dotted product code.
+
+Product.code_segments holds the code split on '.', so the children of a
+prefix are the distinct values of the segment right after it. One grouped
+query over products under the prefix returns every child with its product
+count. Products are matched on their segments, not the raw code, so codes
+with stray spaces or empty segments ('03. 1', '03..1') are filed under the
+same prefix they are grouped by; the GIN index on code_segments narrows the
+scan to products containing every prefix segment.
+"""
+from django.db.models import Count, F, Max, Q
+
+from .models import Product, split_product_code
+
+
+def code_children(prefix=''):
+    """
+    Child segments directly below a code prefix.
+
+    Returns:
+        dict with the normalized prefix, its depth and the child rows:
+        segment, full path, number of products under it, number of distinct
+        segments below it and the id of the product whose code ends at that
+        segment (or None)
+    """
+    segments = split_product_code(prefix)
+    depth = len(segments)
+    path = '.'.join(segments)
+
+    products = Product.objects.filter(code_depth__gt=depth)
+    if segments:
+        products = products.filter(code_segments__contains=segments, **{f'code_segments__0_{depth}': segments})
+
+    # ArrayField indexes are 0-based in Django and translated to 1-based SQL
+    rows = products.values(segment=F(f'code_segments__{depth}')).annotate(
+        product_count=Count('id'),
+        child_count=Count(f'code_segments__{depth + 1}', distinct=True),
+        product_id=Max('id', filter=Q(code_depth=depth + 1)),
+    ).order_by('segment')
+
+    children = [{
+        'segment': row['segment'],
+        'path': f'{path}.{row["segment"]}' if path else row['segment'],
+        'product_count': row['product_count'],
+        'child_count': row['child_count'],
+        'product_id': row['product_id'],
+    } for row in rows]
+    return {'prefix': path, 'depth': depth, 'children': children}
@@ -0,0 +1,138 @@
+"""
+Tool crib layout: where tools and holders sit on each crib table.
+
+A table's grid comes from one statement: the tools and the holders of the
+table grouped by (row, column) with their stock codes and statuses
+aggregated, combined with UNION ALL and served by the (table_id, row,
+column) indexes. Layouts and locate lookups are cached under a version
+token that Tool and Holder saves and deletes replace, so a change anywhere
+in the crib invalidates every cached entry at once.
+"""
+import uuid
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.cache import cache
+from django.db.models import CharField, Count, Max, Min, Value
+
+from .models import Tool, Holder, ToolHolderStatus
+
+VERSION_KEY = 'inventory:crib_version'
+CACHE_TIMEOUT = 60 * 60
+CRIB_MODELS = (('tool', Tool), ('holder', Holder))
+
+
+def invalidate_crib():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _cache_key(*parts):
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return ':'.join(['inventory:crib', version, *map(str, parts)])
+
+
+def _cells(table_id):
+    grouped = [
+        model.objects.filter(table_id=table_id).values('row', 'column').annotate(
+            kind=Value(kind, output_field=CharField()),
+            stock_codes=ArrayAgg('stock_code', ordering='stock_code'),
+            statuses=ArrayAgg('status', ordering='stock_code'),
+        ).order_by()
+        for kind, model in CRIB_MODELS
+    ]
+    return grouped[0].union(*grouped[1:], all=True)
+
+
+def build_crib_layout(table_id):
+    """
+    Dense grid of a crib table covering every row and column between the
+    smallest and largest occupied position, empty positions included.
+    """
+    cells = {}
+    for row in _cells(table_id):
+        cell = cells.setdefault((row['row'], row['column']), {
+            'row': row['row'], 'column': row['column'], 'items': [],
+        })
+        cell['items'].extend(
+            {'kind': row['kind'], 'stock_code': stock_code, 'status': status}
+            for stock_code, status in zip(row['stock_codes'], row['statuses'])
+        )
+    if not cells:
+        return None
+
+    rows = [position[0] for position in cells]
+    columns = [position[1] for position in cells]
+    grid = []
+    for row in range(min(rows), max(rows) + 1):
+        grid.append([])
+        for column in range(min(columns), max(columns) + 1):
+            cell = cells.get((row, column), {'row': row, 'column': column, 'items': []})
+            cell['occupied'] = bool(cell['items'])
+            cell['available'] = sum(item['status'] == ToolHolderStatus.AVAILABLE for item in cell['items'])
+            grid[-1].append(cell)
+
+    status_counts = {}
+    for cell in cells.values():
+        for item in cell['items']:
+            status_counts[item['status']] = status_counts.get(item['status'], 0) + 1
+    return {
+        'table_id': str(table_id),
+        'first_row': min(rows),
+        'first_column': min(columns),
+        'row_count': len(grid),
+        'column_count': len(grid[0]),
+        'occupied_cells': len(cells),
+        'status_counts': status_counts,
+        'grid': grid,
+    }
+
+
+def crib_layout(table_id):
+    """Cached layout of a crib table, or None for a table with nothing on it."""
+    key = _cache_key('layout', table_id)
+    layout = cache.get(key)
+    if layout is None:
+        layout = build_crib_layout(table_id)
+        if layout is not None:
+            cache.set(key, layout, CACHE_TIMEOUT)
+    return layout
+
+
+def crib_tables():
+    """Every crib table with its tool and holder counts and grid extent."""
+    tables = {}
+    for kind, model in CRIB_MODELS:
+        rows = model.objects.values('table_id').annotate(
+            count=Count('id'), max_row=Max('row'), max_column=Max('column'),
+            min_row=Min('row'), min_column=Min('column'),
+        ).order_by()
+        for row in rows:
+            table = tables.setdefault(row['table_id'], {
+                'table_id': str(row['table_id']), 'tools': 0, 'holders': 0,
+                'min_row': row['min_row'], 'max_row': row['max_row'],
+                'min_column': row['min_column'], 'max_column': row['max_column'],
+            })
+            table[f'{kind}s'] = row['count']
+            table['min_row'] = min(table['min_row'], row['min_row'])
+            table['max_row'] = max(table['max_row'], row['max_row'])
+            table['min_column'] = min(table['min_column'], row['min_column'])
+            table['max_column'] = max(table['max_column'], row['max_column'])
+    return sorted(tables.values(), key=lambda table: table['table_id'])
+
+
+def locate(stock_code):
+    """Crib position of a tool or holder by stock code, or None."""
+    key = _cache_key('locate', stock_code)
+    position = cache.get(key)
+    if position is None:
+        for kind, model in CRIB_MODELS:
+            position = model.objects.filter(stock_code=stock_code).values(
+                'stock_code', 'table_id', 'row', 'column', 'status'
+            ).first()
+            if position:
+                position = {'kind': kind, **position, 'table_id': str(position['table_id'])}
+                cache.set(key, position, CACHE_TIMEOUT)
+                break
+    return position
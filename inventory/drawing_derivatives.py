@@ -0,0 +1,147 @@
+"""
+Thumbnails and previews of technical drawings.
+
+Saving a drawing with a new file marks its derivatives PENDING, and the
+build_drawing_derivatives worker renders them outside the request cycle.
+Several workers can run side by side: each claims a batch of pending
+drawings in a short transaction (SELECT ... FOR UPDATE SKIP LOCKED, then
+flipped to PROCESSING), renders them with no transaction or row lock held,
+and writes each result back only if the drawing is still its claim. A claim
+left behind by a worker that died is taken over after CLAIM_TIMEOUT.
+
+Derivatives are stored next to the originals under keys derived from the
+SHA-256 of the source file, so re-uploads of the same file reuse what was
+already rendered and a derivative URL never serves stale content. Pillow
+renders raster drawings (PNG, JPEG, TIFF, BMP, ...); PDFs and CAD formats
+it cannot open are marked UNSUPPORTED.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import DerivativeStatus, TechnicalDrawing
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_PREFIX = 'technical_drawings/derivatives'
+# Longest side in pixels
+THUMBNAIL_SIZE = 256
+PREVIEW_SIZE = 1280
+WEBP_QUALITY = 80
+BATCH_SIZE = 20
+READ_CHUNK = 1024 * 1024
+# Larger sources are not rendered; Pillow needs the whole file in memory
+MAX_SOURCE_SIZE = 100 * 1024 * 1024
+# Drawings PROCESSING for longer than this are claimed again
+CLAIM_TIMEOUT = timedelta(minutes=30)
+
+
+def derivative_names(content_hash):
+    base = f"{DERIVATIVE_PREFIX}/{content_hash[:2]}/{content_hash}"
+    return f"{base}/thumbnail.webp", f"{base}/preview.webp"
+
+
+def _read(drawing_file):
+    """The file's bytes and their SHA-256, read in chunks from storage."""
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    with drawing_file.open('rb') as source:
+        for chunk in source.chunks(READ_CHUNK):
+            digest.update(chunk)
+            buffer.write(chunk)
+    buffer.seek(0)
+    return buffer, digest.hexdigest()
+
+
+def _render(image, size):
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    copy.save(output, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return ContentFile(output.getvalue())
+
+
+def build_derivatives(drawing):
+    """
+    Render and store the thumbnail and preview of one drawing.
+
+    Returns:
+        the derivative status the drawing ends up with
+    """
+    storage = drawing.drawing_file.storage
+    extension = posixpath.splitext(drawing.drawing_file.name)[1].lower()
+    if extension not in Image.registered_extensions() or drawing.drawing_file.size > MAX_SOURCE_SIZE:
+        return DerivativeStatus.UNSUPPORTED
+    content, content_hash = _read(drawing.drawing_file)
+    thumbnail_name, preview_name = derivative_names(content_hash)
+
+    if not (storage.exists(thumbnail_name) and storage.exists(preview_name)):
+        try:
+            with Image.open(content) as image:
+                # Decode JPEGs at the smallest scale that still covers the preview
+                image.draft('RGB', (PREVIEW_SIZE, PREVIEW_SIZE))
+                image = ImageOps.exif_transpose(image)
+                image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                for name, size in ((thumbnail_name, THUMBNAIL_SIZE), (preview_name, PREVIEW_SIZE)):
+                    if not storage.exists(name):
+                        storage.save(name, _render(image, size))
+        except UnidentifiedImageError:
+            return DerivativeStatus.UNSUPPORTED
+
+    drawing.thumbnail.name = thumbnail_name
+    drawing.preview.name = preview_name
+    return DerivativeStatus.READY
+
+
+def claim_pending(batch_size=BATCH_SIZE):
+    """
+    Flip up to `batch_size` pending drawings, or drawings whose claim went
+    stale, to PROCESSING and return them with the claim time.
+    """
+    claimed_at = timezone.now()
+    with transaction.atomic():
+        ids = list(TechnicalDrawing.objects.filter(
+            Q(derivatives_status=DerivativeStatus.PENDING) |
+            Q(derivatives_status=DerivativeStatus.PROCESSING, derivatives_claimed_at__lt=claimed_at - CLAIM_TIMEOUT)
+        ).select_for_update(skip_locked=True).order_by('modified_at').values_list('pk', flat=True)[:batch_size])
+        TechnicalDrawing.objects.filter(pk__in=ids).update(
+            derivatives_status=DerivativeStatus.PROCESSING, derivatives_claimed_at=claimed_at
+        )
+    return list(TechnicalDrawing.objects.filter(pk__in=ids).order_by('modified_at')), claimed_at
+
+
+def process_pending(batch_size=BATCH_SIZE):
+    """
+    Claim up to `batch_size` pending drawings and build their derivatives.
+
+    Returns:
+        dict with the number of drawings per resulting status
+    """
+    drawings, claimed_at = claim_pending(batch_size)
+    counts = {}
+    for drawing in drawings:
+        try:
+            status = build_derivatives(drawing)
+        except Exception:
+            logger.exception("Could not build derivatives of drawing %s", drawing.pk)
+            status = DerivativeStatus.FAILED
+        if status != DerivativeStatus.READY:
+            drawing.thumbnail = drawing.preview = None
+        # Queryset update: a save() would record a history entry per drawing. A
+        # drawing given a new file meanwhile is PENDING again and stays queued.
+        TechnicalDrawing.objects.filter(
+            pk=drawing.pk, derivatives_status=DerivativeStatus.PROCESSING, derivatives_claimed_at=claimed_at
+        ).update(
+            derivatives_status=status, thumbnail=drawing.thumbnail.name or None,
+            preview=drawing.preview.name or None,
+        )
+        counts[status] = counts.get(status, 0) + 1
+    return counts
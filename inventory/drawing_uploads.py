@@ -0,0 +1,208 @@
+"""
+Resumable multipart uploads of technical drawings.
+
+Large drawing files never pass through the application: starting an upload
+opens a multipart upload in object storage, and the client PUTs each part
+of the file to a presigned URL of its own. The parts already stored are
+listed from storage, so an interrupted upload resumes with the missing
+ones. Completing the upload assembles the parts in storage and creates the
+TechnicalDrawing pointing at the object, under a row lock so a repeated
+completion cannot create the drawing twice.
+
+Only storages backed by S3-compatible object storage (Cloudflare R2)
+support this; with local file storage drawings are uploaded through
+TechnicalDrawingViewSet.create as before.
+"""
+import posixpath
+import uuid
+from datetime import timedelta
+
+from botocore.exceptions import ClientError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import DrawingUpload, DrawingUploadStatus, TechnicalDrawing
+
+# Every part but the last must be at least 5 MiB in S3 and R2, and R2 wants
+# them all the same size
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+MAX_PARTS = 10000
+# Presigned part URLs handed out per request
+PART_URL_BATCH = 100
+PART_URL_EXPIRY = 60 * 60
+# Uploads left unfinished this long are aborted by abort_stale_uploads()
+STALE_AFTER = timedelta(days=2)
+
+
+class UploadError(Exception):
+    pass
+
+
+def drawing_storage():
+    return TechnicalDrawing._meta.get_field('drawing_file').storage
+
+
+def _client_and_key(storage, name):
+    if not hasattr(storage, 'bucket_name') or not hasattr(storage, 'connection'):
+        raise UploadError('Chunked uploads need the drawings to be kept in object storage')
+    return storage.connection.meta.client, storage._normalize_name(name)
+
+
+def _drawing_name(file_name):
+    storage = drawing_storage()
+    directory = timezone.now().strftime('technical_drawings/%Y/%m/%d')
+    return posixpath.join(directory, uuid.uuid4().hex, storage.get_valid_name(posixpath.basename(file_name)))
+
+
+def part_size_for(file_size, part_size=None):
+    """The requested part size, raised as needed to fit the file in MAX_PARTS parts."""
+    return max(part_size or DEFAULT_PART_SIZE, MIN_PART_SIZE, -(-file_size // MAX_PARTS))
+
+
+def start_upload(user, product, version, drawing_code, effective_date, file_name, file_size,
+                 content_type=None, revision_notes=None, part_size=None):
+    """Open a multipart upload in storage and record it."""
+    if TechnicalDrawing.objects.filter(product=product, version=version).exists():
+        raise UploadError(f'Version {version} of this product already has a drawing')
+    name = _drawing_name(file_name)
+    client, key = _client_and_key(drawing_storage(), name)
+    params = {'Bucket': drawing_storage().bucket_name, 'Key': key}
+    if content_type:
+        params['ContentType'] = content_type
+    response = client.create_multipart_upload(**params)
+    return DrawingUpload.objects.create(
+        product=product, version=version, drawing_code=drawing_code, effective_date=effective_date,
+        revision_notes=revision_notes, file_name=name, file_size=file_size,
+        part_size=part_size_for(file_size, part_size), content_type=content_type,
+        upload_id=response['UploadId'], created_by=user, modified_by=user,
+    )
+
+
+def uploaded_parts(upload):
+    """Parts already stored for the upload: {part_number: (etag, size)}."""
+    storage = drawing_storage()
+    client, key = _client_and_key(storage, upload.file_name)
+    parts, marker = {}, 0
+    while True:
+        response = client.list_parts(
+            Bucket=storage.bucket_name, Key=key, UploadId=upload.upload_id, PartNumberMarker=marker
+        )
+        for part in response.get('Parts', []):
+            parts[part['PartNumber']] = (part['ETag'], part['Size'])
+        if not response.get('IsTruncated'):
+            return parts
+        marker = response['NextPartNumberMarker']
+
+
+def part_urls(upload, part_numbers):
+    """Presigned PUT URLs for the given part numbers."""
+    storage = drawing_storage()
+    client, key = _client_and_key(storage, upload.file_name)
+    return [{
+        'part_number': number,
+        'url': client.generate_presigned_url('upload_part', Params={
+            'Bucket': storage.bucket_name, 'Key': key,
+            'UploadId': upload.upload_id, 'PartNumber': number,
+        }, ExpiresIn=PART_URL_EXPIRY),
+    } for number in part_numbers]
+
+
+def upload_state(upload, with_urls=True):
+    """
+    Progress of an upload, with presigned URLs for the next batch of parts
+    still missing. Clients resume an upload by sending exactly those parts.
+    """
+    state = {
+        'id': str(upload.id), 'status': upload.status, 'file_name': upload.file_name,
+        'file_size': upload.file_size, 'part_size': upload.part_size, 'part_count': upload.part_count,
+        'drawing': upload.drawing_id,
+    }
+    if upload.status != DrawingUploadStatus.UPLOADING:
+        return state
+    stored = uploaded_parts(upload)
+    missing = [number for number in range(1, upload.part_count + 1) if number not in stored]
+    state.update(
+        uploaded_parts=sorted(stored),
+        uploaded_bytes=sum(size for _, size in stored.values()),
+        missing_parts=len(missing),
+        parts=part_urls(upload, missing[:PART_URL_BATCH]) if with_urls else [],
+    )
+    return state
+
+
+def complete_upload(upload_id, user):
+    """
+    Assemble the parts in storage and create the TechnicalDrawing, once.
+
+    Raises:
+        UploadError: if parts are missing or the drawing cannot be created
+    """
+    storage = drawing_storage()
+    with transaction.atomic():
+        upload = DrawingUpload.objects.select_for_update().get(pk=upload_id)
+        if upload.status == DrawingUploadStatus.COMPLETED:
+            return upload
+        if upload.status != DrawingUploadStatus.UPLOADING:
+            raise UploadError('This upload was aborted')
+
+        stored = {number: part for number, part in uploaded_parts(upload).items() if number <= upload.part_count}
+        missing = [number for number in range(1, upload.part_count + 1) if number not in stored]
+        if missing:
+            raise UploadError(f'{len(missing)} parts are still missing, first missing part is {missing[0]}')
+        if sum(size for _, size in stored.values()) != upload.file_size:
+            raise UploadError('The uploaded parts do not add up to the file size')
+
+        try:
+            with transaction.atomic():
+                drawing = TechnicalDrawing(
+                    product=upload.product, version=upload.version, drawing_code=upload.drawing_code,
+                    effective_date=upload.effective_date, revision_notes=upload.revision_notes,
+                    created_by=user, modified_by=user,
+                )
+                drawing.drawing_file.name = upload.file_name
+                drawing.save()
+        except IntegrityError:
+            raise UploadError(f'Version {upload.version} of this product already has a drawing')
+
+        client, key = _client_and_key(storage, upload.file_name)
+        # Last step before commit: if assembling fails, the drawing row is rolled back
+        try:
+            client.complete_multipart_upload(
+                Bucket=storage.bucket_name, Key=key, UploadId=upload.upload_id,
+                MultipartUpload={'Parts': [
+                    {'PartNumber': number, 'ETag': stored[number][0]} for number in sorted(stored)
+                ]},
+            )
+        except ClientError as e:
+            raise UploadError(f'Storage could not assemble the upload: {e}')
+        upload.status = DrawingUploadStatus.COMPLETED
+        upload.drawing = drawing
+        upload.completed_at = timezone.now()
+        upload.modified_by = user
+        upload.save()
+    return upload
+
+
+def abort_upload(upload):
+    """Drop the stored parts and mark the upload aborted."""
+    if upload.status != DrawingUploadStatus.UPLOADING:
+        return upload
+    storage = drawing_storage()
+    client, key = _client_and_key(storage, upload.file_name)
+    client.abort_multipart_upload(Bucket=storage.bucket_name, Key=key, UploadId=upload.upload_id)
+    upload.status = DrawingUploadStatus.ABORTED
+    upload.save()
+    return upload
+
+
+def abort_stale_uploads(older_than=STALE_AFTER):
+    """Abort uploads left unfinished for longer than `older_than`."""
+    stale = DrawingUpload.objects.filter(
+        status=DrawingUploadStatus.UPLOADING, created_at__lt=timezone.now() - older_than
+    )
+    count = 0
+    for upload in stale.iterator():
+        abort_upload(upload)
+        count += 1
+    return count
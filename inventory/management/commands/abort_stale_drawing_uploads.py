@@ -0,0 +1,15 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from inventory.drawing_uploads import STALE_AFTER, abort_stale_uploads
+
+class Command(BaseCommand):
+    help = 'Abort chunked drawing uploads left unfinished and drop their stored parts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=int(STALE_AFTER.total_seconds() // 3600),
+                            help='Abort uploads started more than this many hours ago')
+
+    def handle(self, *args, **options):
+        count = abort_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Aborted {count} stale drawing uploads"))
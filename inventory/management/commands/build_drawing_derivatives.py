@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from inventory.drawing_derivatives import BATCH_SIZE, process_pending
+
+class Command(BaseCommand):
+    help = 'Build thumbnails and previews of technical drawings waiting for them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Drawings claimed per transaction')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running as a worker, polling for new drawings')
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help='Seconds to wait between polls when idle (with --loop)')
+
+    def handle(self, *args, **options):
+        total = {}
+        while True:
+            counts = process_pending(options['batch_size'])
+            for status, count in counts.items():
+                total[status] = total.get(status, 0) + count
+            if counts:
+                self.stdout.write(', '.join(f"{status}: {count}" for status, count in counts.items()))
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        summary = ', '.join(f"{status}: {count}" for status, count in total.items()) or 'nothing pending'
+        self.stdout.write(self.style.SUCCESS(f"Drawing derivatives built ({summary})"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from inventory.stock_history import compact_stock_ledger
+
+class Command(BaseCommand):
+    help = 'Write monthly stock checkpoints for complete months (run monthly, e.g. on the 1st)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', type=str, default=None,
+                            help='Last month to checkpoint (YYYY-MM), defaults to the previous month')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Drop all checkpoints and rebuild from the first transaction')
+
+    def handle(self, *args, **options):
+        through_month = None
+        if options['through']:
+            try:
+                through_month = parse_date(f"{options['through']}-01")
+            except ValueError:
+                through_month = None
+            if through_month is None:
+                raise CommandError(f"Invalid month: {options['through']}")
+
+        result = compact_stock_ledger(through_month=through_month, rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Checkpointed {result['months']} months, {result['checkpoints']} checkpoint rows"
+        ))
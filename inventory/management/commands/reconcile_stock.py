@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from inventory.reconciliation import reconcile_stock, ITEM_MODELS
+from inventory.reservations import recompute_reserved_stock
+
+class Command(BaseCommand):
+    help = 'Compare current_stock with the inventory transaction ledger and optionally repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Write ledger balances back to current_stock')
+        parser.add_argument('--item-type', choices=list(ITEM_MODELS), default=None,
+                            help='Limit to products or raw materials')
+        parser.add_argument('--reservations', action='store_true',
+                            help='Also rebuild reserved_stock from active reservations')
+
+    def handle(self, *args, **options):
+        result = reconcile_stock(repair=options['repair'], item_type=options['item_type'])
+
+        for row in result['discrepancies']:
+            self.stdout.write(
+                f"{row['item_type']:<8} {row['code']:<30} current={row['current_stock']} "
+                f"ledger={row['ledger_stock']} diff={row['difference']}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {result['checked']} items, {result['discrepancy_count']} discrepancies"
+        ))
+        if options['repair']:
+            repaired = ', '.join(f"{kind}: {count}" for kind, count in result['repaired'].items())
+            self.stdout.write(self.style.SUCCESS(f"Repaired {repaired}"))
+
+        if options['reservations']:
+            updated = recompute_reserved_stock()
+            rebuilt = ', '.join(f"{kind}: {count}" for kind, count in updated.items())
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt reserved stock for {rebuilt}"))
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_historicaltechnicaldrawing_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['transaction_date', 'id'], name='inv_txn_date_id_idx'),
+        ),
+    ]
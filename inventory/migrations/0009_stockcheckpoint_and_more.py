@@ -0,0 +1,69 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_inventorytransaction_inv_txn_date_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text="First day of the month; the balance includes every transaction up to the month's end")),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('month_change', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('transaction_count', models.IntegerField(help_text='Transactions within the month')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['product', 'transaction_date'], name='inv_txn_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['material', 'transaction_date'], name='inv_txn_material_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpoint',
+            name='inventory_category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='inventory.inventorycategory'),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpoint',
+            name='material',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='inventory.rawmaterial'),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpoint',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='inventory.product'),
+        ),
+        migrations.AddIndex(
+            model_name='stockcheckpoint',
+            index=models.Index(fields=['inventory_category', 'month'], name='inventory_s_invento_bf362f_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('material__isnull', True), ('product__isnull', False)), models.Q(('material__isnull', False), ('product__isnull', True)), _connector='OR'), name='stock_checkpoint_single_item'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(fields=('product', 'month'), name='stock_checkpoint_product_month'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(fields=('material', 'month'), name='stock_checkpoint_material_month'),
+        ),
+    ]
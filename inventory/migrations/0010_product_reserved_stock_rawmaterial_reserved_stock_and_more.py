@@ -0,0 +1,69 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:21
+
+import django.core.validators
+import django.db.models.deletion
+import django.db.models.expressions
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_stockcheckpoint_and_more'),
+        ('manufacturing', '0018_remove_processconfig_stock_code_historicalbom_and_more'),
+        ('sales', '0017_customerbacklogsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved_stock',
+            field=models.IntegerField(default=0, help_text='Quantity held by active stock reservations'),
+        ),
+        migrations.AddField(
+            model_name='rawmaterial',
+            name='reserved_stock',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Quantity held by active stock reservations', max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='inventorytransaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('IN', 'Stock In'), ('OUT', 'Stock Out'), ('ADJUST', 'Adjustment'), ('RETURN', 'Return'), ('TRANSFER', 'Category Transfer'), ('RESERVATION', 'Reservation')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='available_stock',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('current_stock'), '-', models.F('reserved_stock')), output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='rawmaterial',
+            name='available_stock',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('current_stock'), '-', models.F('reserved_stock')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('RELEASED', 'Released'), ('CONSUMED', 'Consumed')], default='ACTIVE', max_length=20)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_created', to=settings.AUTH_USER_MODEL)),
+                ('material', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='inventory.rawmaterial')),
+                ('modified_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_modified', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='inventory.product')),
+                ('sales_order_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='sales.salesorderitem')),
+                ('work_order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='manufacturing.workorder')),
+            ],
+            options={
+                'verbose_name': 'Stock Reservation',
+                'verbose_name_plural': 'Stock Reservations',
+                'indexes': [models.Index(fields=['product', 'status'], name='inventory_s_product_c68e4e_idx'), models.Index(fields=['material', 'status'], name='inventory_s_materia_a5f53d_idx'), models.Index(fields=['sales_order_item', 'status'], name='inventory_s_sales_o_58a066_idx'), models.Index(fields=['work_order', 'status'], name='inventory_s_work_or_7f5a70_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('material__isnull', True), ('product__isnull', False)), models.Q(('material__isnull', False), ('product__isnull', True)), _connector='OR'), name='stock_reservation_single_item')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:23
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp_core', '0004_alter_userprofile_options'),
+        ('inventory', '0010_product_reserved_stock_rawmaterial_reserved_stock_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower(models.Func(models.F('product_code'), models.Value('ÇĞİÖŞÜçğıöşüØøÂâÎîÛû'), models.Value('CGIOSUcgiosuOoAaIiUu'), function='TRANSLATE', output_field=models.CharField())), name='gin_trgm_ops'), name='product_code_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower(models.Func(models.F('product_name'), models.Value('ÇĞİÖŞÜçğıöşüØøÂâÎîÛû'), models.Value('CGIOSUcgiosuOoAaIiUu'), function='TRANSLATE', output_field=models.CharField())), name='gin_trgm_ops'), name='product_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rawmaterial',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower(models.Func(models.F('material_code'), models.Value('ÇĞİÖŞÜçğıöşüØøÂâÎîÛû'), models.Value('CGIOSUcgiosuOoAaIiUu'), function='TRANSLATE', output_field=models.CharField())), name='gin_trgm_ops'), name='material_code_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rawmaterial',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower(models.Func(models.F('material_name'), models.Value('ÇĞİÖŞÜçğıöşüØøÂâÎîÛû'), models.Value('CGIOSUcgiosuOoAaIiUu'), function='TRANSLATE', output_field=models.CharField())), name='gin_trgm_ops'), name='material_name_trgm_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:25
+
+import django.contrib.postgres.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_code_segments(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    batch = []
+    for product in Product.objects.only('id', 'product_code').iterator(chunk_size=2000):
+        product.code_segments = [s.strip() for s in product.product_code.split('.') if s.strip()]
+        product.code_depth = len(product.code_segments)
+        batch.append(product)
+        if len(batch) >= 2000:
+            Product.objects.bulk_update(batch, ['code_segments', 'code_depth'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['code_segments', 'code_depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp_core', '0004_alter_userprofile_options'),
+        ('inventory', '0011_trigram_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='code_depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='code_segments',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), blank=True, default=list, editable=False, help_text='Dotted product code split into segments, maintained on save', size=None),
+        ),
+        migrations.RunPython(fill_code_segments, reverse_code=migrations.RunPython.noop),
+    ]
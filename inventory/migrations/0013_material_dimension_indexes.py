@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_product_code_segments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rawmaterial',
+            index=models.Index(condition=models.Q(('diameter_mm__isnull', False)), fields=['material_type', 'diameter_mm'], name='material_type_diameter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rawmaterial',
+            index=models.Index(condition=models.Q(('thickness__isnull', False)), fields=['material_type', 'thickness'], name='material_type_thickness_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:31
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_material_dimension_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='blank_length_mm',
+            field=models.FloatField(blank=True, help_text='Length of one blank cut from the bar, in mm', null=True, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='blank_material',
+            field=models.ForeignKey(blank=True, help_text='Bar stock the part blank is sawn from', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='blank_products', to='inventory.rawmaterial'),
+        ),
+        migrations.AddField(
+            model_name='rawmaterial',
+            name='bar_length_mm',
+            field=models.FloatField(blank=True, help_text='Length of one stock bar, in mm, for bar materials stocked per bar', null=True, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+    ]
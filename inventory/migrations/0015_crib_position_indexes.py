@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_bar_blanks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='holder',
+            index=models.Index(fields=['table_id', 'row', 'column'], name='holder_crib_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tool',
+            index=models.Index(fields=['table_id', 'row', 'column'], name='tool_crib_position_idx'),
+        ),
+    ]
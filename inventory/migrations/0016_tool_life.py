@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_crib_position_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tool',
+            name='cutting_minutes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tool',
+            name='last_used_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tool',
+            name='life_limit_minutes',
+            field=models.PositiveIntegerField(blank=True, help_text='Cutting minutes per cutting edge before replacement', null=True),
+        ),
+        migrations.AddField(
+            model_name='tool',
+            name='life_limit_parts',
+            field=models.PositiveIntegerField(blank=True, help_text='Parts per cutting edge before replacement', null=True),
+        ),
+        migrations.AddField(
+            model_name='tool',
+            name='life_started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tool',
+            name='parts_produced',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:46
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_tool_life'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DrawingUpload',
+            fields=[
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('version', models.CharField(max_length=20)),
+                ('drawing_code', models.CharField(max_length=50)),
+                ('effective_date', models.DateField()),
+                ('revision_notes', models.CharField(blank=True, max_length=500, null=True)),
+                ('file_name', models.CharField(help_text='Storage name the drawing file will have', max_length=500)),
+                ('file_size', models.PositiveBigIntegerField()),
+                ('part_size', models.PositiveIntegerField()),
+                ('content_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('upload_id', models.CharField(help_text='Multipart upload id in object storage', max_length=1024)),
+                ('status', models.CharField(choices=[('UPLOADING', 'Uploading'), ('COMPLETED', 'Completed'), ('ABORTED', 'Aborted')], default='UPLOADING', max_length=20)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_created', to=settings.AUTH_USER_MODEL)),
+                ('drawing', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='inventory.technicaldrawing')),
+                ('modified_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_modified', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drawing_uploads', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Drawing Upload',
+                'verbose_name_plural': 'Drawing Uploads',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='inventory_d_status_efb41d_idx')],
+            },
+        ),
+    ]
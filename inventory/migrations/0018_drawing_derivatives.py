@@ -0,0 +1,55 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def queue_existing_drawings(apps, schema_editor):
+    TechnicalDrawing = apps.get_model('inventory', 'TechnicalDrawing')
+    TechnicalDrawing.objects.exclude(drawing_file='').exclude(drawing_file__isnull=True).update(derivatives_status='PENDING')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_drawing_uploads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltechnicaldrawing',
+            name='derivatives_status',
+            field=models.CharField(blank=True, choices=[('PENDING', 'Pending'), ('READY', 'Ready'), ('UNSUPPORTED', 'Unsupported'), ('FAILED', 'Failed')], editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicaltechnicaldrawing',
+            name='preview',
+            field=models.TextField(blank=True, editable=False, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicaltechnicaldrawing',
+            name='thumbnail',
+            field=models.TextField(blank=True, editable=False, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='technicaldrawing',
+            name='derivatives_status',
+            field=models.CharField(blank=True, choices=[('PENDING', 'Pending'), ('READY', 'Ready'), ('UNSUPPORTED', 'Unsupported'), ('FAILED', 'Failed')], editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='technicaldrawing',
+            name='preview',
+            field=models.FileField(blank=True, editable=False, max_length=500, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='technicaldrawing',
+            name='thumbnail',
+            field=models.FileField(blank=True, editable=False, max_length=500, null=True, upload_to=''),
+        ),
+        migrations.AddIndex(
+            model_name='technicaldrawing',
+            index=models.Index(condition=models.Q(('derivatives_status', 'PENDING')), fields=['derivatives_status'], name='drawing_derivatives_queue_idx'),
+        ),
+        migrations.RunPython(queue_existing_drawings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:16
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp_core', '0005_file_blobs'),
+        ('inventory', '0018_drawing_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['code_segments'], name='product_code_segments_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_product_code_segments_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='technicaldrawing',
+            name='drawing_derivatives_queue_idx',
+        ),
+        migrations.AddField(
+            model_name='historicaltechnicaldrawing',
+            name='derivatives_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When a build_drawing_derivatives worker took the drawing for rendering', null=True),
+        ),
+        migrations.AddField(
+            model_name='technicaldrawing',
+            name='derivatives_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When a build_drawing_derivatives worker took the drawing for rendering', null=True),
+        ),
+        migrations.AlterField(
+            model_name='historicaltechnicaldrawing',
+            name='derivatives_status',
+            field=models.CharField(blank=True, choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('READY', 'Ready'), ('UNSUPPORTED', 'Unsupported'), ('FAILED', 'Failed')], editable=False, max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='technicaldrawing',
+            name='derivatives_status',
+            field=models.CharField(blank=True, choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('READY', 'Ready'), ('UNSUPPORTED', 'Unsupported'), ('FAILED', 'Failed')], editable=False, max_length=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='technicaldrawing',
+            index=models.Index(condition=models.Q(('derivatives_status__in', ['PENDING', 'PROCESSING'])), fields=['derivatives_status'], name='drawing_derivatives_queue_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from erp_core.models import BaseModel, User, Customer, ProductType, MaterialType
+from erp_core.blobs import storing
+from erp_core.reference import inventory_categories
 from django.core.validators import MinValueValidator, MaxValueValidator
 import pathlib 
 from django.db.models import Sum
@@ -8,6 +10,10 @@ from django.apps import apps
 from django.conf import settings
 import uuid
 from simple_history.models import HistoricalRecords
+from model_utils import FieldTracker
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from .search import search_key
 
 class Status(models.TextChoices):
     ACTIVE = 'AKTIF', 'Aktif'
@@ -44,8 +50,33 @@ class UnitOfMeasure(models.Model):
     def __str__(self):
         return f"{self.unit_code} - {self.unit_name}"
 
+def split_product_code(code):
+    """Segments of a dotted product code, e.g. '02.7075-T651.Ø18.00' -> ['02', '7075-T651', 'Ø18', '00']."""
+    return [segment.strip() for segment in (code or '').split('.') if segment.strip()]
+
+def _keep_reserved_stock(instance, kwargs):
+    """
+    reserved_stock is only changed by in-database increments (see
+    inventory.reservations), so saving a loaded instance must not write back
+    the value it read: updates list their fields without it.
+    """
+    if instance._state.adding or kwargs.get('force_insert'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None:
+        update_fields = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and not field.generated
+        ]
+    kwargs['update_fields'] = [name for name in update_fields if name != 'reserved_stock']
+
 class Product(BaseModel):
     product_code = models.CharField(max_length=50, unique=True)
+    code_segments = ArrayField(
+        models.CharField(max_length=50), default=list, blank=True, editable=False,
+        help_text="Dotted product code split into segments, maintained on save"
+    )
+    code_depth = models.PositiveSmallIntegerField(default=0, editable=False)
     product_name = models.CharField(max_length=100)
     project_name = models.CharField(max_length=100, null=True, blank=True)
     product_type = models.CharField(max_length=20, choices=ProductType.choices)
@@ -59,26 +90,56 @@ class Product(BaseModel):
     )
     description = models.TextField(blank=True, null=True)
     current_stock = models.IntegerField(default=0)
+    reserved_stock = models.IntegerField(default=0, help_text="Quantity held by active stock reservations")
+    available_stock = models.GeneratedField(
+        expression=models.F('current_stock') - models.F('reserved_stock'),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT, null=True, blank=True)
     inventory_category = models.ForeignKey(InventoryCategory, on_delete=models.PROTECT, null=True, blank=True)
+    blank_material = models.ForeignKey(
+        'RawMaterial', on_delete=models.PROTECT, null=True, blank=True, related_name='blank_products',
+        help_text="Bar stock the part blank is sawn from"
+    )
+    blank_length_mm = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(0.0)],
+        help_text="Length of one blank cut from the bar, in mm"
+    )
 
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
         ordering = ['product_code']
+        indexes = [
+            GinIndex(OpClass(search_key('product_code'), name='gin_trgm_ops'), name='product_code_trgm_idx'),
+            GinIndex(OpClass(search_key('product_name'), name='gin_trgm_ops'), name='product_name_trgm_idx'),
+            # Code tree browsing narrows products under a prefix with code_segments @> prefix
+            GinIndex(fields=['code_segments'], name='product_code_segments_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.code_segments = split_product_code(self.product_code)
+        self.code_depth = len(self.code_segments)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'product_code' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'code_segments', 'code_depth'}
+        _keep_reserved_stock(self, kwargs)
+        super().save(*args, **kwargs)
 
     def clean(self):
         if self.product_type == ProductType.SINGLE and self.customer:
             raise ValidationError("Single parts shouldn't be customer-specific")
         
         # Validate inventory category based on product type
-        if self.product_type == ProductType.SINGLE and self.inventory_category.name not in ['HAMMADDE', 'HURDA', 'KARANTINA']:
+        category = inventory_categories.key_for(self.inventory_category_id)
+        if self.product_type == ProductType.SINGLE and category not in ['HAMMADDE', 'HURDA', 'KARANTINA']:
             raise ValidationError("Single parts can only be in Hammadde, Hurda, or Karantina categories")
-        elif self.product_type == ProductType.SEMI and self.inventory_category.name not in ['PROSES', 'MAMUL', 'KARANTINA', 'HURDA']:
+        elif self.product_type == ProductType.SEMI and category not in ['PROSES', 'MAMUL', 'KARANTINA', 'HURDA']:
             raise ValidationError("Semi-finished products can only be in Proses, Mamul, Karantina, or Hurda categories")
-        elif self.product_type == ProductType.MONTAGED and self.inventory_category.name not in ['MAMUL', 'KARANTINA', 'HURDA']:
+        elif self.product_type == ProductType.MONTAGED and category not in ['MAMUL', 'KARANTINA', 'HURDA']:
             raise ValidationError("Montaged products can only be in Mamul, Karantina, or Hurda categories")
-        elif self.product_type == ProductType.STANDARD_PART and self.inventory_category.name not in ['HAMMADDE', 'HURDA', 'KARANTINA']:
+        elif self.product_type == ProductType.STANDARD_PART and category not in ['HAMMADDE', 'HURDA', 'KARANTINA']:
             raise ValidationError("Standard parts can only be in Hammadde, Hurda, or Karantina categories")
     
     def __str__(self):
@@ -132,6 +193,13 @@ class Product(BaseModel):
 
         return result
 
+class DerivativeStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pending'
+    PROCESSING = 'PROCESSING', 'Processing'
+    READY = 'READY', 'Ready'
+    UNSUPPORTED = 'UNSUPPORTED', 'Unsupported'
+    FAILED = 'FAILED', 'Failed'
+
 class TechnicalDrawing(BaseModel):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     version = models.CharField(max_length=20)
@@ -147,7 +215,24 @@ class TechnicalDrawing(BaseModel):
     is_current = models.BooleanField(default=True)
     revision_notes = models.CharField(max_length=500, blank=True, null=True)
     approved_by = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name='approved_drawings')
+    # Built from drawing_file by the build_drawing_derivatives worker
+    thumbnail = models.FileField(
+        max_length=500, blank=True, null=True, editable=False,
+        storage=settings.DEFAULT_FILE_STORAGE if hasattr(settings, 'USE_CLOUDFLARE_R2') and settings.USE_CLOUDFLARE_R2 else None
+    )
+    preview = models.FileField(
+        max_length=500, blank=True, null=True, editable=False,
+        storage=settings.DEFAULT_FILE_STORAGE if hasattr(settings, 'USE_CLOUDFLARE_R2') and settings.USE_CLOUDFLARE_R2 else None
+    )
+    derivatives_status = models.CharField(
+        max_length=20, choices=DerivativeStatus.choices, null=True, blank=True, editable=False
+    )
+    derivatives_claimed_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="When a build_drawing_derivatives worker took the drawing for rendering"
+    )
     history = HistoricalRecords()
+    tracker = FieldTracker(fields=['drawing_file'])
 
     class Meta:
         verbose_name = "Technical Drawing"
@@ -155,6 +240,10 @@ class TechnicalDrawing(BaseModel):
         unique_together = ['product', 'version']
         indexes = [
             models.Index(fields=['product', 'is_current']),
+            models.Index(
+                fields=['derivatives_status'], name='drawing_derivatives_queue_idx',
+                condition=models.Q(derivatives_status__in=['PENDING', 'PROCESSING']),
+            ),
         ]
 
     def clean(self):
@@ -170,7 +259,14 @@ class TechnicalDrawing(BaseModel):
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        if self.tracker.has_changed('drawing_file'):
+            # Queue the thumbnail and preview of the new file
+            self.derivatives_status = DerivativeStatus.PENDING if self.drawing_file else None
+            self.thumbnail = self.preview = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'derivatives_status', 'thumbnail', 'preview'}
+        with storing(self, 'drawing_file'):
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.drawing_code} v{self.version}"
@@ -184,10 +280,59 @@ class TechnicalDrawing(BaseModel):
             return self.drawing_file.url
         return None
 
+class DrawingUploadStatus(models.TextChoices):
+    UPLOADING = 'UPLOADING', 'Uploading'
+    COMPLETED = 'COMPLETED', 'Completed'
+    ABORTED = 'ABORTED', 'Aborted'
+
+class DrawingUpload(BaseModel):
+    """
+    A technical drawing being uploaded in parts straight to object storage
+    (a multipart upload). The drawing is created when the upload completes;
+    until then the upload can be resumed from the parts already stored.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='drawing_uploads')
+    version = models.CharField(max_length=20)
+    drawing_code = models.CharField(max_length=50)
+    effective_date = models.DateField()
+    revision_notes = models.CharField(max_length=500, blank=True, null=True)
+    file_name = models.CharField(max_length=500, help_text="Storage name the drawing file will have")
+    file_size = models.PositiveBigIntegerField()
+    part_size = models.PositiveIntegerField()
+    content_type = models.CharField(max_length=100, blank=True, null=True)
+    upload_id = models.CharField(max_length=1024, help_text="Multipart upload id in object storage")
+    status = models.CharField(max_length=20, choices=DrawingUploadStatus.choices, default=DrawingUploadStatus.UPLOADING)
+    drawing = models.OneToOneField(TechnicalDrawing, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Drawing Upload"
+        verbose_name_plural = "Drawing Uploads"
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    @property
+    def part_count(self):
+        return max(-(-self.file_size // self.part_size), 1)
+
+    def __str__(self):
+        return f"{self.drawing_code} v{self.version} ({self.get_status_display()})"
+
 class RawMaterial(BaseModel):
     material_code = models.CharField(max_length=50, unique=True)
     material_name = models.CharField(max_length=100)
     current_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    reserved_stock = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0,
+        help_text="Quantity held by active stock reservations"
+    )
+    available_stock = models.GeneratedField(
+        expression=models.F('current_stock') - models.F('reserved_stock'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
     unit = models.ForeignKey(UnitOfMeasure, on_delete=models.PROTECT)
     inventory_category = models.ForeignKey(InventoryCategory, on_delete=models.PROTECT, null=True, blank=True)
     
@@ -199,13 +344,30 @@ class RawMaterial(BaseModel):
     height = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0.0)])
     thickness = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0.0)])
     diameter_mm = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0.0)])
+    bar_length_mm = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(0.0)],
+        help_text="Length of one stock bar, in mm, for bar materials stocked per bar"
+    )
 
     class Meta:
         verbose_name = "Raw Material"
         verbose_name_plural = "Raw Materials"
+        indexes = [
+            GinIndex(OpClass(search_key('material_code'), name='gin_trgm_ops'), name='material_code_trgm_idx'),
+            GinIndex(OpClass(search_key('material_name'), name='gin_trgm_ops'), name='material_name_trgm_idx'),
+            # Best-fit stock selection scans bars and plates of one type in ascending size
+            models.Index(fields=['material_type', 'diameter_mm'], name='material_type_diameter_idx',
+                         condition=models.Q(diameter_mm__isnull=False)),
+            models.Index(fields=['material_type', 'thickness'], name='material_type_thickness_idx',
+                         condition=models.Q(thickness__isnull=False)),
+        ]
+
+    def save(self, *args, **kwargs):
+        _keep_reserved_stock(self, kwargs)
+        super().save(*args, **kwargs)
 
     def clean(self):
-        if self.inventory_category and self.inventory_category.name not in ['HAMMADDE', 'HURDA', 'KARANTINA']:
+        if self.inventory_category_id and inventory_categories.key_for(self.inventory_category_id) not in ['HAMMADDE', 'HURDA', 'KARANTINA']:
             raise ValidationError("Raw materials can only be in Hammadde, Hurda, or Karantina categories")
         # Optional: Additional validations for the new fields can be added here.
 
@@ -227,6 +389,7 @@ class InventoryTransaction(BaseModel):
         ('ADJUST', 'Adjustment'),
         ('RETURN', 'Return'),
         ('TRANSFER', 'Category Transfer'),
+        ('RESERVATION', 'Reservation'),
     ]
 
     product = models.ForeignKey(Product, on_delete=models.PROTECT, null=True, blank=True)
@@ -249,10 +412,11 @@ class InventoryTransaction(BaseModel):
             if not self.from_category or not self.to_category:
                 raise ValidationError("Category transfer requires both from and to categories")
             
-            if self.product and self.to_category.name not in self._get_allowed_categories(self.product.product_type):
+            to_category = inventory_categories.key_for(self.to_category_id)
+            if self.product and to_category not in self._get_allowed_categories(self.product.product_type):
                 raise ValidationError(f"Invalid category transfer for product type {self.product.product_type}")
             
-            if self.material and self.to_category.name not in ['HAMMADDE', 'HURDA', 'KARANTINA']:
+            if self.material and to_category not in ['HAMMADDE', 'HURDA', 'KARANTINA']:
                 raise ValidationError("Invalid category transfer for raw material")
 
     def _get_allowed_categories(self, product_type):
@@ -267,18 +431,16 @@ class InventoryTransaction(BaseModel):
         self.clean()
         super().save(*args, **kwargs)
         
-        # Update stock levels and categories
+        # Update stock levels and categories. The stock is incremented in the
+        # database so concurrent movements and reservations are not overwritten.
         if self.transaction_type != 'RESERVATION':
-            if self.product:
-                if self.transaction_type == 'TRANSFER':
-                    self.product.inventory_category = self.to_category
-                self.product.current_stock += self.quantity_change
-                self.product.save()
-            elif self.material:
-                if self.transaction_type == 'TRANSFER':
-                    self.material.inventory_category = self.to_category
-                self.material.current_stock += self.quantity_change
-                self.material.save()
+            item = self.product or self.material
+            changes = {'current_stock': models.F('current_stock') + self.quantity_change}
+            if self.transaction_type == 'TRANSFER':
+                changes['inventory_category'] = self.to_category
+                item.inventory_category = self.to_category
+            type(item).objects.filter(pk=item.pk).update(**changes)
+            item.current_stock += self.quantity_change
 
     def __str__(self):
         item = self.product or self.material
@@ -289,8 +451,93 @@ class InventoryTransaction(BaseModel):
         verbose_name_plural = "Inventory Transactions"
         indexes = [
             models.Index(fields=['reference_id', 'transaction_type']),
+            models.Index(fields=['transaction_date', 'id'], name='inv_txn_date_id_idx'),
+            models.Index(fields=['product', 'transaction_date'], name='inv_txn_product_date_idx'),
+            models.Index(fields=['material', 'transaction_date'], name='inv_txn_material_date_idx'),
+        ]
+
+class ReservationStatus(models.TextChoices):
+    ACTIVE = 'ACTIVE', 'Active'
+    RELEASED = 'RELEASED', 'Released'
+    CONSUMED = 'CONSUMED', 'Consumed'
+
+class StockReservation(BaseModel):
+    """
+    Soft allocation of product or raw material stock.
+
+    Active reservations are summed into the item's reserved_stock, which is
+    only ever changed with in-database increments (see inventory.reservations).
+    Reservations are created for open sales order items, for the BOM
+    components of released work orders, or manually.
+    """
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, null=True, blank=True, related_name='reservations')
+    material = models.ForeignKey(RawMaterial, on_delete=models.PROTECT, null=True, blank=True, related_name='reservations')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    status = models.CharField(max_length=20, choices=ReservationStatus.choices, default=ReservationStatus.ACTIVE)
+    sales_order_item = models.ForeignKey(
+        'sales.SalesOrderItem', on_delete=models.CASCADE, null=True, blank=True, related_name='reservations'
+    )
+    work_order = models.ForeignKey(
+        'manufacturing.WorkOrder', on_delete=models.CASCADE, null=True, blank=True, related_name='reservations'
+    )
+    notes = models.TextField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Stock Reservation"
+        verbose_name_plural = "Stock Reservations"
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(product__isnull=False, material__isnull=True) |
+                          models.Q(product__isnull=True, material__isnull=False),
+                name='stock_reservation_single_item'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'status']),
+            models.Index(fields=['material', 'status']),
+            models.Index(fields=['sales_order_item', 'status']),
+            models.Index(fields=['work_order', 'status']),
         ]
 
+    def __str__(self):
+        return f"{self.product or self.material} x{self.quantity} ({self.status})"
+
+class StockCheckpoint(models.Model):
+    """
+    Ledger balance of a product or raw material at the end of a month.
+
+    Written by the compact_stock_ledger command for every item that had
+    transactions in the month. The balance of an item at any moment is its
+    latest earlier checkpoint plus the transactions after it
+    (see inventory.stock_history).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_checkpoints')
+    material = models.ForeignKey(RawMaterial, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_checkpoints')
+    inventory_category = models.ForeignKey(InventoryCategory, on_delete=models.PROTECT, null=True, blank=True)
+    month = models.DateField(help_text="First day of the month; the balance includes every transaction up to the month's end")
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    month_change = models.DecimalField(max_digits=12, decimal_places=2)
+    transaction_count = models.IntegerField(help_text="Transactions within the month")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['month']
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(product__isnull=False, material__isnull=True) |
+                          models.Q(product__isnull=True, material__isnull=False),
+                name='stock_checkpoint_single_item'
+            ),
+            models.UniqueConstraint(fields=['product', 'month'], name='stock_checkpoint_product_month'),
+            models.UniqueConstraint(fields=['material', 'month'], name='stock_checkpoint_material_month'),
+        ]
+        indexes = [
+            models.Index(fields=['inventory_category', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.product or self.material} @ {self.month:%Y-%m}: {self.balance}"
+
 class ToolHolderStatus(models.TextChoices):
     AVAILABLE = 'AVAILABLE', 'Available'
     IN_USE = 'IN_USE', 'In Use'
@@ -322,6 +569,13 @@ class Tool(BaseModel):
     table_id = models.UUIDField()
     description = models.TextField(null=True, blank=True)
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    # Usage since the cutting edge was last replaced, counted from production
+    parts_produced = models.PositiveIntegerField(default=0, editable=False)
+    cutting_minutes = models.PositiveIntegerField(default=0, editable=False)
+    life_started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_used_at = models.DateTimeField(null=True, blank=True, editable=False)
+    life_limit_parts = models.PositiveIntegerField(null=True, blank=True, help_text="Parts per cutting edge before replacement")
+    life_limit_minutes = models.PositiveIntegerField(null=True, blank=True, help_text="Cutting minutes per cutting edge before replacement")
 
     class Meta:
         verbose_name = "Tool"
@@ -329,6 +583,7 @@ class Tool(BaseModel):
         indexes = [
             models.Index(fields=['tool_type']),
             models.Index(fields=['status']),
+            models.Index(fields=['table_id', 'row', 'column'], name='tool_crib_position_idx'),
         ]
 
     def __str__(self):
@@ -360,6 +615,7 @@ class Holder(BaseModel):
         indexes = [
             models.Index(fields=['holder_type']),
             models.Index(fields=['status']),
+            models.Index(fields=['table_id', 'row', 'column'], name='holder_crib_position_idx'),
         ]
 
     def __str__(self):
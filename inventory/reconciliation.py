@@ -0,0 +1,114 @@
+"""
+Reconciliation of denormalized current_stock against the InventoryTransaction ledger.
+
+Ledger balances for every product and raw material come from one grouped SUM
+and are compared with current_stock in memory. Repairs write the ledger
+balance back with one UPDATE per model, recomputed inside the statement so
+transactions recorded after the report are not lost.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+
+from .models import Product, RawMaterial
+from .stock_history import stock_transactions
+
+ITEM_MODELS = {
+    'product': (Product, 'product_code', 'product_name'),
+    'material': (RawMaterial, 'material_code', 'material_name'),
+}
+
+
+def ledger_balances():
+    """Ledger balance per item in one grouped query, keyed by (item_type, id)."""
+    balances = {}
+    rows = stock_transactions().values('product_id', 'material_id').annotate(
+        balance=Sum('quantity_change')
+    ).order_by()
+    for row in rows:
+        if row['product_id']:
+            balances[('product', row['product_id'])] = row['balance']
+        else:
+            balances[('material', row['material_id'])] = row['balance']
+    return balances
+
+
+def find_discrepancies(item_type=None):
+    """
+    Items whose current_stock differs from their ledger balance.
+
+    Items without transactions have a ledger balance of zero.
+
+    Returns:
+        (number of items checked, list of discrepancy dicts)
+    """
+    balances = ledger_balances()
+    checked = 0
+    discrepancies = []
+    for kind, (model, code_field, name_field) in ITEM_MODELS.items():
+        if item_type and kind != item_type:
+            continue
+        rows = model.objects.values_list('id', code_field, name_field, 'current_stock').order_by(code_field)
+        for item_id, code, name, current_stock in rows.iterator(chunk_size=5000):
+            checked += 1
+            ledger_stock = balances.get((kind, item_id), Decimal('0'))
+            if Decimal(current_stock) != ledger_stock:
+                discrepancies.append({
+                    'item_type': kind,
+                    'id': item_id,
+                    'code': code,
+                    'name': name,
+                    'current_stock': current_stock,
+                    'ledger_stock': ledger_stock,
+                    'difference': ledger_stock - Decimal(current_stock),
+                })
+    return checked, discrepancies
+
+
+def _ledger_subquery(item_type):
+    balance = stock_transactions().filter(**{item_type: OuterRef('pk')}).order_by().values(
+        item_type
+    ).annotate(balance=Sum('quantity_change')).values('balance')
+    return Coalesce(
+        Subquery(balance),
+        Value(Decimal('0')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def repair_discrepancies(discrepancies):
+    """
+    Set current_stock to the ledger balance for the reported items.
+
+    Returns:
+        dict of rows updated per item type
+    """
+    updated = {}
+    with transaction.atomic():
+        for kind, (model, _, _) in ITEM_MODELS.items():
+            ids = [row['id'] for row in discrepancies if row['item_type'] == kind]
+            updated[kind] = model.objects.filter(id__in=ids).update(
+                current_stock=_ledger_subquery(kind)
+            ) if ids else 0
+    return updated
+
+
+def reconcile_stock(repair=False, item_type=None):
+    """
+    Compare current_stock with the ledger and optionally repair the drift.
+
+    Returns:
+        dict with the checked item count, the discrepancies and, when
+        repairing, the rows updated per item type
+    """
+    checked, discrepancies = find_discrepancies(item_type)
+    result = {
+        'checked': checked,
+        'discrepancy_count': len(discrepancies),
+        'discrepancies': discrepancies,
+    }
+    if repair:
+        result['repaired'] = repair_discrepancies(discrepancies)
+    return result
@@ -0,0 +1,164 @@
+"""
+Stock reservations and available-to-use quantities.
+
+reserved_stock on Product and RawMaterial is the sum of the item's ACTIVE
+StockReservation rows. It is only changed with UPDATE ... SET reserved_stock =
+reserved_stock + delta inside the transaction that changes the reservation,
+so concurrent reservations never overwrite each other, and available_stock
+(current_stock - reserved_stock) is a generated column that always follows.
+"""
+import math
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+
+from .models import Product, RawMaterial, StockReservation, ReservationStatus
+
+# Work order statuses that hold component stock
+RESERVING_WORK_ORDER_STATUSES = ['IN_PROGRESS', 'DELAYED']
+
+
+def _adjust_reserved(product_id=None, material_id=None, delta=0):
+    if not delta:
+        return
+    if product_id:
+        Product.objects.filter(pk=product_id).update(reserved_stock=F('reserved_stock') + delta)
+    else:
+        RawMaterial.objects.filter(pk=material_id).update(reserved_stock=F('reserved_stock') + delta)
+
+
+def _normalize_quantity(quantity, product_id):
+    """Product stock is counted in whole units, so product reservations round up."""
+    quantity = Decimal(max(quantity, 0))
+    if product_id:
+        quantity = Decimal(math.ceil(quantity))
+    return quantity
+
+
+def create_reservation(product=None, material=None, quantity=0, user=None, notes=None, **source):
+    """Create a new active reservation and add it to the item's reserved_stock."""
+    product_id = getattr(product, 'pk', product)
+    material_id = getattr(material, 'pk', material)
+    quantity = _normalize_quantity(quantity, product_id)
+    with transaction.atomic():
+        reservation = StockReservation.objects.create(
+            product_id=product_id, material_id=material_id, quantity=quantity,
+            notes=notes, created_by=user, modified_by=user, **source
+        )
+        _adjust_reserved(product_id, material_id, quantity)
+    return reservation
+
+
+def set_reservation(product=None, material=None, quantity=0, user=None, **source):
+    """
+    Make the active reservation for an item and source hold `quantity`.
+
+    The source is given as sales_order_item=... or work_order=...; a quantity
+    of zero releases the reservation.
+
+    Returns:
+        The reservation, or None if there is nothing reserved
+    """
+    product_id = getattr(product, 'pk', product)
+    material_id = getattr(material, 'pk', material)
+    quantity = _normalize_quantity(quantity, product_id)
+
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().filter(
+            product_id=product_id, material_id=material_id,
+            status=ReservationStatus.ACTIVE, **source
+        ).first()
+
+        if reservation is None:
+            if not quantity:
+                return None
+            return create_reservation(product_id, material_id, quantity, user, **source)
+
+        delta = quantity - reservation.quantity
+        if not quantity:
+            reservation.status = ReservationStatus.RELEASED
+        reservation.quantity = quantity or reservation.quantity
+        reservation.modified_by = user or reservation.modified_by
+        reservation.save()
+        _adjust_reserved(product_id, material_id, delta)
+        return reservation if quantity else None
+
+
+def close_reservations(reservations, status=ReservationStatus.RELEASED):
+    """
+    Release or consume active reservations in bulk: one grouped query for the
+    quantities, one UPDATE per affected item and one for the reservations.
+    """
+    with transaction.atomic():
+        ids = list(reservations.select_for_update().filter(
+            status=ReservationStatus.ACTIVE
+        ).values_list('id', flat=True))
+        if not ids:
+            return 0
+        active = StockReservation.objects.filter(id__in=ids)
+        totals = list(active.values('product_id', 'material_id').annotate(total=Sum('quantity')).order_by())
+        count = active.update(status=status)
+        for row in totals:
+            _adjust_reserved(row['product_id'], row['material_id'], -row['total'])
+    return count
+
+
+def sync_sales_item_reservation(item, user=None):
+    """Reserve the open (ordered - fulfilled) quantity of a sales order item."""
+    open_quantity = item.ordered_quantity - item.fulfilled_quantity
+    if open_quantity <= 0 and item.fulfilled_quantity:
+        return close_reservations(
+            StockReservation.objects.filter(sales_order_item=item), ReservationStatus.CONSUMED
+        )
+    return set_reservation(product=item.product_id, quantity=open_quantity, user=user, sales_order_item=item)
+
+
+def sync_work_order_reservations(work_order, user=None):
+    """
+    Reserve BOM component products for released work orders; completed work
+    orders consume their reservations and planned ones hold nothing.
+    """
+    reservations = StockReservation.objects.filter(work_order=work_order)
+    if work_order.status == 'COMPLETED':
+        return close_reservations(reservations, ReservationStatus.CONSUMED)
+    if work_order.status not in RESERVING_WORK_ORDER_STATUSES:
+        return close_reservations(reservations)
+
+    required = {}
+    for product_id, quantity in work_order.bom.components.values_list('product_id', 'quantity'):
+        required[product_id] = required.get(product_id, 0) + work_order.quantity * (quantity or 1)
+    for product_id, quantity in required.items():
+        set_reservation(product=product_id, quantity=quantity, user=user, work_order=work_order)
+    close_reservations(reservations.exclude(product_id__in=list(required)))
+
+
+def availability(product_ids=(), material_ids=()):
+    """
+    On-hand, reserved and available quantities for many items in one query per item type.
+
+    Returns:
+        dict with 'products' and 'materials' lists
+    """
+    columns = ('id', 'current_stock', 'reserved_stock', 'available_stock')
+    products = Product.objects.filter(id__in=product_ids).values('product_code', *columns) if product_ids else []
+    materials = RawMaterial.objects.filter(id__in=material_ids).values('material_code', *columns) if material_ids else []
+    return {'products': list(products), 'materials': list(materials)}
+
+
+def recompute_reserved_stock():
+    """
+    Rebuild reserved_stock from active reservations with one UPDATE per item
+    type, for repairing drift after manual database edits.
+    """
+    updated = {}
+    for model, item_type in ((Product, 'product'), (RawMaterial, 'material')):
+        reserved = StockReservation.objects.filter(
+            status=ReservationStatus.ACTIVE, **{item_type: OuterRef('pk')}
+        ).order_by().values(item_type).annotate(total=Sum('quantity')).values('total')
+        updated[item_type] = model.objects.update(reserved_stock=Coalesce(
+            Subquery(reserved), Value(Decimal('0')),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+    return updated
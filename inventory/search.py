@@ -0,0 +1,74 @@
+"""
+Trigram search over product and raw material codes and names.
+
+Codes and names are folded with search_key() (Turkish letters and Ø mapped to
+ASCII, then lower-cased) and indexed with pg_trgm GIN expression indexes on
+that same expression. Folding before lower() keeps İ/I/ı matching independent
+of the database locale, and using one expression for both the index and the
+query lets LIKE '%term%' and similarity (%) lookups use the index instead of
+scanning the table.
+"""
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import CharField, F, Func, Q, Value, Case, When, IntegerField
+from django.db.models.functions import Greatest, Lower
+
+FOLD_FROM = 'ÇĞİÖŞÜçğıöşüØøÂâÎîÛû'
+FOLD_TO = 'CGIOSUcgiosuOoAaIiUu'
+_FOLD_TABLE = str.maketrans(FOLD_FROM, FOLD_TO)
+
+# Terms shorter than this only match as substrings; longer ones also match by similarity
+MIN_FUZZY_LENGTH = 3
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def fold(text):
+    """Python counterpart of search_key() for search terms."""
+    return text.translate(_FOLD_TABLE).lower().strip()
+
+
+def search_key(field_name):
+    """Folded, lower-cased expression for a text column; matches the GIN indexes."""
+    return Lower(Func(
+        F(field_name), Value(FOLD_FROM), Value(FOLD_TO),
+        function='TRANSLATE', output_field=CharField()
+    ))
+
+
+def search_filter(queryset, field_name, term):
+    """Case- and Turkish-insensitive substring filter on one indexed column."""
+    return queryset.alias(**{f'{field_name}_key': search_key(field_name)}).filter(
+        **{f'{field_name}_key__contains': fold(term)}
+    )
+
+
+def ranked_search(queryset, code_field, name_field, term, limit=DEFAULT_LIMIT):
+    """
+    Search codes and names, best matches first.
+
+    Exact code matches rank first, then code prefixes, then name prefixes,
+    then everything else by trigram similarity.
+    """
+    term = fold(term)
+    queryset = queryset.alias(
+        code_key=search_key(code_field),
+        name_key=search_key(name_field),
+    )
+
+    condition = Q(code_key__contains=term) | Q(name_key__contains=term)
+    if len(term) >= MIN_FUZZY_LENGTH:
+        condition |= Q(code_key__trigram_similar=term) | Q(name_key__trigram_similar=term)
+
+    return queryset.filter(condition).annotate(
+        match_rank=Case(
+            When(code_key=term, then=Value(3)),
+            When(code_key__startswith=term, then=Value(2)),
+            When(name_key__startswith=term, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        similarity=Greatest(
+            TrigramSimilarity('code_key', term),
+            TrigramSimilarity('name_key', term),
+        ),
+    ).order_by('-match_rank', '-similarity', code_field)[:limit]
@@ -2,10 +2,12 @@ from rest_framework import serializers
 from .models import (
     InventoryCategory, UnitOfMeasure, Product,
     TechnicalDrawing, RawMaterial, InventoryTransaction,
-    Tool, Holder, Fixture, ControlGauge
+    Tool, Holder, Fixture, ControlGauge, StockReservation
 )
 from erp_core.serializers import UserSerializer, CustomerSerializer
+from erp_core.signed_urls import prefetch_urls
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
 
 class InventoryCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,34 +19,70 @@ class UnitOfMeasureSerializer(serializers.ModelSerializer):
         model = UnitOfMeasure
         fields = ['id', 'unit_code', 'unit_name']
 
+class DrawingURLBatchListSerializer(serializers.ListSerializer):
+    """
+    Gets the URLs of every drawing in the list in one batch before the items
+    are rendered, so they come from the signed URL cache instead of being
+    signed or fetched one by one.
+    """
+    def drawings(self, items):
+        return items
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        prefetch_urls(
+            file for drawing in self.drawings(items)
+            for file in (drawing.drawing_file, drawing.thumbnail, drawing.preview)
+        )
+        return super().to_representation(items)
+
+class ProductDrawingURLBatchListSerializer(DrawingURLBatchListSerializer):
+    def drawings(self, items):
+        return [drawing for product in items for drawing in product.technicaldrawing_set.all()]
+
 class TechnicalDrawingListSerializer(serializers.ModelSerializer):
     drawing_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
     
     class Meta:
         model = TechnicalDrawing
         fields = [
             'id', 'version', 'drawing_code', 'drawing_file',
-            'drawing_url', 'effective_date', 'is_current', 'revision_notes',
+            'drawing_url', 'thumbnail_url', 'preview_url', 'derivatives_status',
+            'effective_date', 'is_current', 'revision_notes',
             'created_at', 'modified_at'
         ]
-        read_only_fields = ['drawing_url']
+        read_only_fields = ['drawing_url', 'thumbnail_url', 'preview_url', 'derivatives_status']
+        list_serializer_class = DrawingURLBatchListSerializer
 
     def get_drawing_url(self, obj):
         return obj.drawing_url
 
+    def get_thumbnail_url(self, obj):
+        return obj.thumbnail.url if obj.thumbnail else None
+
+    def get_preview_url(self, obj):
+        return obj.preview.url if obj.preview else None
+
 class ProductSerializer(serializers.ModelSerializer):
     technical_drawings = TechnicalDrawingListSerializer(source='technicaldrawing_set', many=True, read_only=True)
     inventory_category_display = serializers.CharField(source='inventory_category.get_name_display', read_only=True)
     in_process_quantity_by_process = serializers.SerializerMethodField()
+    available_stock = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
         fields = [
             'id', 'product_code', 'product_name', 'product_type',
-            'description', 'current_stock', 'multicode', 'project_name',
+            'description', 'current_stock', 'reserved_stock', 'available_stock',
+            'multicode', 'project_name',
             'inventory_category', 'inventory_category_display',
+            'blank_material', 'blank_length_mm',
             'technical_drawings', 'created_at', 'modified_at', 'in_process_quantity_by_process'
         ]
+        read_only_fields = ['reserved_stock']
+        list_serializer_class = ProductDrawingURLBatchListSerializer
 
     def get_in_process_quantity_by_process(self, obj):
         return obj.in_process_quantity_by_process
@@ -62,11 +100,25 @@ class TechnicalDrawingDetailSerializer(serializers.ModelSerializer):
             'is_current', 'revision_notes', 'approved_by', 'created_at', 'modified_at'
         ]
         read_only_fields = ['drawing_url', 'product_code', 'product_name']
+        list_serializer_class = DrawingURLBatchListSerializer
 
     def get_drawing_url(self, obj):
         return obj.drawing_url
 
+class DrawingUploadStartSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    version = serializers.CharField(max_length=20)
+    drawing_code = serializers.CharField(max_length=50)
+    effective_date = serializers.DateField()
+    revision_notes = serializers.CharField(max_length=500, required=False, allow_blank=True, allow_null=True)
+    file_name = serializers.CharField(max_length=255)
+    file_size = serializers.IntegerField(min_value=1)
+    content_type = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    part_size = serializers.IntegerField(required=False, min_value=1)
+
 class RawMaterialSerializer(serializers.ModelSerializer):
+    available_stock = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
     class Meta:
         model = RawMaterial
         fields = [
@@ -74,6 +126,8 @@ class RawMaterialSerializer(serializers.ModelSerializer):
             'material_code',
             'material_name',
             'current_stock',
+            'reserved_stock',
+            'available_stock',
             'unit',
             'inventory_category',
             'material_type',
@@ -81,9 +135,11 @@ class RawMaterialSerializer(serializers.ModelSerializer):
             'height',
             'thickness',
             'diameter_mm',
+            'bar_length_mm',
             'created_at',
             'modified_at'
         ]
+        read_only_fields = ['reserved_stock']
 
 class InventoryTransactionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -145,3 +201,25 @@ class ControlGaugeSerializer(serializers.ModelSerializer):
         model = ControlGauge
         fields = '__all__'
         read_only_fields = ('updated_at',) 
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    item_code = serializers.SerializerMethodField()
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = StockReservation
+        fields = [
+            'id', 'product', 'material', 'item_code', 'quantity', 'status', 'status_display',
+            'sales_order_item', 'work_order', 'notes', 'created_by', 'created_at', 'modified_at'
+        ]
+        read_only_fields = ['status', 'sales_order_item', 'work_order', 'created_by']
+
+    def get_item_code(self, obj):
+        return obj.product.product_code if obj.product_id else obj.material.material_code
+
+    def validate(self, data):
+        if bool(data.get('product')) == bool(data.get('material')):
+            raise serializers.ValidationError("Either product or material must be set, but not both.")
+        if data.get('quantity') is not None and data['quantity'] <= 0:
+            raise serializers.ValidationError({'quantity': 'Quantity must be positive.'})
+        return data
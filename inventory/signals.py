@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from erp_core.blobs import release
+from .models import StockReservation, ReservationStatus, Tool, Holder, TechnicalDrawing, InventoryTransaction
+from .reservations import _adjust_reserved
+from .stock_history import NON_STOCK_TRANSACTION_TYPES, invalidate_checkpoints
+from .tool_matching import invalidate_tool_index
+from .crib import invalidate_crib
+
+@receiver(post_delete, sender=StockReservation)
+def release_deleted_reservation(sender, instance, **kwargs):
+    """Give back the reserved quantity when an active reservation row is deleted"""
+    if instance.status == ReservationStatus.ACTIVE:
+        _adjust_reserved(instance.product_id, instance.material_id, -instance.quantity)
+
+@receiver(post_save, sender=Tool)
+@receiver(post_delete, sender=Tool)
+def invalidate_tool_substitutes(sender, instance, **kwargs):
+    """Tool geometry or availability changed: rebuild the substitute indexes once committed"""
+    transaction.on_commit(invalidate_tool_index)
+
+@receiver(post_save, sender=Tool)
+@receiver(post_delete, sender=Tool)
+@receiver(post_save, sender=Holder)
+@receiver(post_delete, sender=Holder)
+def invalidate_crib_layout(sender, instance, **kwargs):
+    """A tool or holder moved, changed status or left the crib: drop the cached layouts once committed"""
+    transaction.on_commit(invalidate_crib)
+
+@receiver(post_delete, sender=TechnicalDrawing)
+def release_drawing_file(sender, instance, **kwargs):
+    """The drawing no longer points at its file's blob"""
+    release(instance.drawing_file.name)
+
+@receiver(post_save, sender=InventoryTransaction)
+def invalidate_checkpoints_on_edit(sender, instance, created, **kwargs):
+    """An edited transaction may lie in a checkpointed month; new ones are dated now"""
+    if not created:
+        invalidate_checkpoints(instance.transaction_date)
+
+@receiver(post_delete, sender=InventoryTransaction)
+def invalidate_checkpoints_on_delete(sender, instance, **kwargs):
+    """A deleted stock movement changes the balance of its month and every later one"""
+    if instance.transaction_type not in NON_STOCK_TRANSACTION_TYPES:
+        invalidate_checkpoints(instance.transaction_date)
@@ -0,0 +1,200 @@
+"""
+Point-in-time stock from monthly ledger checkpoints.
+
+compact_stock_ledger() folds each complete month of InventoryTransaction rows
+into StockCheckpoint balances, one grouped query per month. stock_at() then
+answers "stock of X at time T" with one indexed lookup for the latest
+checkpoint before T and one indexed range sum over the transactions since.
+
+Changing or deleting a transaction in a month already checkpointed drops the
+checkpoints of that month and every later one (invalidate_checkpoints), so
+stock_at falls back to the transactions and the next compaction rebuilds
+them. Queryset update() calls on the ledger bypass this.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum, Count, Max, Min
+from django.utils import timezone
+
+from .models import InventoryTransaction, StockCheckpoint, Product, RawMaterial
+
+# Reservations are recorded in the ledger but never move stock
+NON_STOCK_TRANSACTION_TYPES = ['RESERVATION']
+
+
+def month_start(value):
+    """First day of the month of a date or datetime (in the current timezone)."""
+    if isinstance(value, datetime):
+        value = timezone.localtime(value) if timezone.is_aware(value) else value
+        value = value.date()
+    return value.replace(day=1)
+
+
+def next_month(month):
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def previous_month(month):
+    if month.month == 1:
+        return date(month.year - 1, 12, 1)
+    return date(month.year, month.month - 1, 1)
+
+
+def month_boundary(month):
+    """Aware datetime at which the given month starts."""
+    return timezone.make_aware(datetime.combine(month, time.min))
+
+
+def stock_transactions():
+    return InventoryTransaction.objects.exclude(transaction_type__in=NON_STOCK_TRANSACTION_TYPES)
+
+
+def _item_key(product_id, material_id):
+    return ('product', product_id) if product_id else ('material', material_id)
+
+
+def _latest_checkpoints():
+    """Latest balance and category per item, keyed by _item_key."""
+    latest = {}
+    rows = StockCheckpoint.objects.order_by('month').values_list(
+        'product_id', 'material_id', 'balance', 'inventory_category_id'
+    )
+    for product_id, material_id, balance, category_id in rows.iterator(chunk_size=5000):
+        latest[_item_key(product_id, material_id)] = (balance, category_id)
+    return latest
+
+
+def _initial_categories(keys, since):
+    """
+    Category of items that have no checkpoint yet: the source category of
+    their first transfer after `since`, or their current category.
+    """
+    product_ids = [item_id for kind, item_id in keys if kind == 'product']
+    material_ids = [item_id for kind, item_id in keys if kind == 'material']
+    categories = {}
+    for item_id, category_id in Product.objects.filter(id__in=product_ids).values_list('id', 'inventory_category_id'):
+        categories[('product', item_id)] = category_id
+    for item_id, category_id in RawMaterial.objects.filter(id__in=material_ids).values_list('id', 'inventory_category_id'):
+        categories[('material', item_id)] = category_id
+
+    later_transfers = stock_transactions().filter(
+        Q(product_id__in=product_ids) | Q(material_id__in=material_ids),
+        transaction_type='TRANSFER',
+        transaction_date__gte=since,
+    ).order_by('-transaction_date', '-id').values_list('product_id', 'material_id', 'from_category_id')
+    for product_id, material_id, category_id in later_transfers:
+        categories[_item_key(product_id, material_id)] = category_id
+    return categories
+
+
+def invalidate_checkpoints(moment):
+    """
+    Drop the checkpoints of every item from the month of `moment` on.
+    Checkpoints carry running balances, so all later months go too, and
+    compaction resumes at that month.
+
+    Returns:
+        Number of checkpoints deleted
+    """
+    return StockCheckpoint.objects.filter(month__gte=month_start(moment)).delete()[0]
+
+
+def compact_stock_ledger(through_month=None, rebuild=False):
+    """
+    Write checkpoints for every complete month not checkpointed yet.
+
+    Args:
+        through_month: Last month to checkpoint (default: the previous month)
+        rebuild: Drop all checkpoints and rebuild from the first transaction
+
+    Returns:
+        dict with the months processed and checkpoint rows written
+    """
+    last_complete = previous_month(month_start(timezone.now()))
+    through_month = min(month_start(through_month), last_complete) if through_month else last_complete
+
+    with transaction.atomic():
+        if rebuild:
+            StockCheckpoint.objects.all().delete()
+
+        last_month = StockCheckpoint.objects.aggregate(last=Max('month'))['last']
+        if last_month:
+            month = next_month(last_month)
+        else:
+            first = stock_transactions().aggregate(first=Min('transaction_date'))['first']
+            if first is None:
+                return {'months': 0, 'checkpoints': 0}
+            month = month_start(first)
+
+        latest = _latest_checkpoints()
+        months = written = 0
+        while month <= through_month:
+            start, end = month_boundary(month), month_boundary(next_month(month))
+            in_month = stock_transactions().filter(transaction_date__gte=start, transaction_date__lt=end)
+            movements = list(in_month.values('product_id', 'material_id').annotate(
+                change=Sum('quantity_change'), count=Count('id')
+            ).order_by())
+
+            transfers = {}
+            for product_id, material_id, category_id in in_month.filter(
+                transaction_type='TRANSFER'
+            ).order_by('transaction_date', 'id').values_list('product_id', 'material_id', 'to_category_id'):
+                transfers[_item_key(product_id, material_id)] = category_id
+
+            keys = [_item_key(row['product_id'], row['material_id']) for row in movements]
+            initial = _initial_categories([key for key in keys if key not in latest], end)
+
+            checkpoints = []
+            for key, row in zip(keys, movements):
+                balance, category_id = latest.get(key, (Decimal('0'), initial.get(key)))
+                balance += row['change']
+                category_id = transfers.get(key, category_id)
+                latest[key] = (balance, category_id)
+                checkpoints.append(StockCheckpoint(
+                    product_id=row['product_id'],
+                    material_id=row['material_id'],
+                    inventory_category_id=category_id,
+                    month=month,
+                    balance=balance,
+                    month_change=row['change'],
+                    transaction_count=row['count'],
+                ))
+
+            StockCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+            written += len(checkpoints)
+            months += 1
+            month = next_month(month)
+
+    return {'months': months, 'checkpoints': written}
+
+
+def stock_at(at, product=None, material=None):
+    """
+    Ledger stock of a product or raw material at a moment.
+
+    Returns:
+        dict with the stock, the checkpoint month used (or None) and the
+        number of tail transactions summed on top of it
+    """
+    item = {'product': product} if product is not None else {'material': material}
+
+    checkpoint = StockCheckpoint.objects.filter(
+        month__lt=month_start(at), **item
+    ).order_by('-month').values('month', 'balance').first()
+
+    tail = stock_transactions().filter(transaction_date__lt=at, **item)
+    if checkpoint:
+        tail = tail.filter(transaction_date__gte=month_boundary(next_month(checkpoint['month'])))
+    totals = tail.aggregate(change=Sum('quantity_change'), count=Count('id'))
+
+    base = checkpoint['balance'] if checkpoint else Decimal('0')
+    return {
+        'at': at,
+        'stock': base + (totals['change'] or 0),
+        'checkpoint_month': checkpoint['month'] if checkpoint else None,
+        'tail_transactions': totals['count'],
+    }
@@ -0,0 +1,104 @@
+"""
+Best-fit raw material selection for a part envelope.
+
+Round bars (diameter_mm set) and plates (thickness set) are looked up per
+material type through the (material_type, diameter_mm) and
+(material_type, thickness) indexes: rows are read in ascending size from the
+smallest one that can hold the part, so the tightest fits come first and
+only a bounded number of candidates is ranked in memory.
+
+Waste is the volume (mm³) removed when the part blank is cut from the stock:
+for bars the cross-section oversize times the part length, for plates the
+thickness oversize times the part footprint. Widths, heights and bar
+lengths (bar_length_mm) left empty on a material are treated as unlimited.
+"""
+import math
+from itertools import permutations
+
+from .models import RawMaterial
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Rows read per lookup, smallest first, before ranking by waste
+CANDIDATE_SCAN = 500
+
+RESULT_FIELDS = (
+    'id', 'material_code', 'material_name', 'material_type', 'diameter_mm',
+    'thickness', 'width', 'height', 'bar_length_mm', 'current_stock', 'available_stock',
+)
+
+
+def _in_stock(material_type):
+    return RawMaterial.objects.filter(material_type=material_type, available_stock__gt=0)
+
+
+def _fits(limit, size):
+    return limit is None or limit >= size
+
+
+def round_bar_candidates(material_type, diameter, length=None, allowance=0, limit=DEFAULT_LIMIT):
+    """
+    In-stock round bars that can hold a turned part, least waste first.
+
+    Without a part length, waste is given per mm of length.
+    """
+    diameter += allowance
+    part_length = length + allowance if length else None
+    rows = _in_stock(material_type).filter(diameter_mm__gte=diameter).order_by(
+        'diameter_mm', 'id'
+    ).values(*RESULT_FIELDS)[:CANDIDATE_SCAN]
+
+    candidates = []
+    for row in rows:
+        if part_length and not _fits(row['bar_length_mm'], part_length):
+            continue
+        waste = math.pi / 4 * (row['diameter_mm'] ** 2 - diameter ** 2) * (part_length or 1)
+        candidates.append({**row, 'shape': 'bar', 'waste_mm3': round(waste, 2)})
+    candidates.sort(key=lambda row: (row['waste_mm3'], row['diameter_mm']))
+    return candidates[:limit]
+
+
+def _plate_waste(row, dimensions):
+    """Least waste over the part orientations that fit the plate, or None."""
+    best = None
+    for thickness, width, height in permutations(dimensions):
+        if row['thickness'] < thickness:
+            continue
+        if not (_fits(row['width'], width) and _fits(row['height'], height)) and \
+                not (_fits(row['width'], height) and _fits(row['height'], width)):
+            continue
+        waste = (row['thickness'] - thickness) * width * height
+        best = waste if best is None else min(best, waste)
+    return best
+
+
+def plate_candidates(material_type, thickness, width, height, allowance=0, limit=DEFAULT_LIMIT):
+    """In-stock plates that can hold a prismatic part in any orientation, least waste first."""
+    dimensions = [size + allowance for size in (thickness, width, height)]
+    rows = _in_stock(material_type).filter(thickness__gte=min(dimensions)).order_by(
+        'thickness', 'id'
+    ).values(*RESULT_FIELDS)[:CANDIDATE_SCAN]
+
+    candidates = []
+    for row in rows:
+        waste = _plate_waste(row, dimensions)
+        if waste is not None:
+            candidates.append({**row, 'shape': 'plate', 'waste_mm3': round(waste, 2)})
+    candidates.sort(key=lambda row: (row['waste_mm3'], row['thickness']))
+    return candidates[:limit]
+
+
+def best_fit(material_type, diameter=None, length=None, thickness=None, width=None, height=None,
+             allowance=0, limit=DEFAULT_LIMIT):
+    """
+    Ranked stock candidates for a part envelope: a diameter (and optional
+    length) selects round bars, thickness/width/height select plates, and
+    giving both ranks bars and plates together.
+    """
+    candidates = []
+    if diameter:
+        candidates += round_bar_candidates(material_type, diameter, length, allowance, limit)
+    if thickness and width and height:
+        candidates += plate_candidates(material_type, thickness, width, height, allowance, limit)
+    candidates.sort(key=lambda row: row['waste_mm3'])
+    return candidates[:limit]
@@ -1,3 +1,640 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import json
+import io
+import math
+import shutil
+import tempfile
+import uuid
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    Product, InventoryCategory, InventoryTransaction, StockCheckpoint, RawMaterial, UnitOfMeasure, Tool, Holder,
+    TechnicalDrawing,
+)
+from .stock_history import compact_stock_ledger, stock_at
+from .reconciliation import reconcile_stock
+from .reservations import create_reservation
+from .search import fold, search_filter
+from .code_tree import code_children
+from .stock_selection import best_fit
+from .tool_matching import invalidate_tool_index
+from .crib import build_crib_layout, crib_layout
+from .drawing_derivatives import CLAIM_TIMEOUT, build_derivatives, claim_pending, process_pending
+from .drawing_uploads import DEFAULT_PART_SIZE, MAX_PARTS, MIN_PART_SIZE, part_size_for
+
+User = get_user_model()
+
+
+class InventoryTransactionKeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category
+        )
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        self.transactions = []
+        for day in range(5):
+            txn = InventoryTransaction.objects.create(
+                product=self.product, quantity_change=1, transaction_type='IN', performed_by=self.user
+            )
+            # Two rows share a timestamp so the id breaks the tie
+            moment = start + timedelta(days=min(day, 3))
+            InventoryTransaction.objects.filter(pk=txn.pk).update(transaction_date=moment)
+            self.transactions.append(txn)
+        self.url = reverse('inventory:inventorytransaction-list')
+
+    def test_pages_follow_cursor_newest_first(self):
+        """Test that following next links visits every row once, newest first"""
+        seen = []
+        url = self.url + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, [txn.pk for txn in reversed(self.transactions)])
+
+    def test_invalid_cursor_is_not_found(self):
+        """Test that a malformed cursor is rejected instead of ignored"""
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_ndjson_stream_returns_every_row(self):
+        """Test that the NDJSON stream is unpaginated and keeps the same order"""
+        response = self.client.get(self.url, {'stream': 'ndjson', 'product': self.product.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['id'], self.transactions[4].pk)
+
+
+class StockCheckpointTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category
+        )
+        self.movements = {}
+        for moment, change, kind in [
+            (datetime(2024, 1, 10, 12), 10, 'IN'),
+            (datetime(2024, 2, 5, 12), -3, 'OUT'),
+            (datetime(2024, 2, 6, 12), 4, 'RESERVATION'),
+            (datetime(2024, 3, 20, 12), 5, 'IN'),
+        ]:
+            txn = InventoryTransaction.objects.create(
+                product=self.product, quantity_change=change, transaction_type=kind, performed_by=self.user
+            )
+            InventoryTransaction.objects.filter(pk=txn.pk).update(transaction_date=timezone.make_aware(moment))
+            txn.refresh_from_db()
+            self.movements[moment.month, kind] = txn
+
+    def at(self, *args):
+        return stock_at(timezone.make_aware(datetime(*args)), product=self.product.id)
+
+    def test_compaction_writes_running_balances(self):
+        """Test that each month's checkpoint carries the balance to its end, without reservations"""
+        result = compact_stock_ledger(through_month=date(2024, 3, 1))
+        self.assertEqual(result, {'months': 3, 'checkpoints': 3})
+        self.assertEqual(
+            list(StockCheckpoint.objects.values_list('month', 'balance', 'transaction_count')),
+            [(date(2024, 1, 1), Decimal('10'), 1), (date(2024, 2, 1), Decimal('7'), 1), (date(2024, 3, 1), Decimal('12'), 1)]
+        )
+        self.assertEqual(compact_stock_ledger(through_month=date(2024, 3, 1)), {'months': 0, 'checkpoints': 0})
+
+    def test_stock_at_adds_tail_to_checkpoint(self):
+        """Test that stock_at gives the same answer with and without checkpoints"""
+        before = [self.at(2024, 2, 15)['stock'], self.at(2024, 4, 1)['stock'], self.at(2023, 12, 1)['stock']]
+        compact_stock_ledger(through_month=date(2024, 3, 1))
+
+        mid = self.at(2024, 2, 15)
+        self.assertEqual((mid['stock'], mid['checkpoint_month'], mid['tail_transactions']), (7, date(2024, 1, 1), 1))
+        after = self.at(2024, 4, 1)
+        self.assertEqual((after['stock'], after['checkpoint_month'], after['tail_transactions']), (12, date(2024, 3, 1), 0))
+        self.assertEqual(before, [7, 12, 0])
+
+    def test_editing_compacted_month_drops_later_checkpoints(self):
+        """Test that changing an old transaction invalidates its month and later ones"""
+        compact_stock_ledger(through_month=date(2024, 3, 1))
+        txn = self.movements[2, 'OUT']
+        txn.quantity_change = -5
+        txn.save()
+
+        self.assertEqual(list(StockCheckpoint.objects.values_list('month', flat=True)), [date(2024, 1, 1)])
+        self.assertEqual(self.at(2024, 4, 1)['stock'], 10)
+        self.assertEqual(compact_stock_ledger(through_month=date(2024, 3, 1)), {'months': 2, 'checkpoints': 2})
+        self.assertEqual(StockCheckpoint.objects.get(month=date(2024, 3, 1)).balance, 10)
+
+    def test_deleting_transaction_drops_checkpoints(self):
+        """Test that deleting a movement in a compacted month invalidates from that month"""
+        compact_stock_ledger(through_month=date(2024, 3, 1))
+        self.movements[3, 'IN'].delete()
+        self.assertEqual(StockCheckpoint.objects.count(), 2)
+        self.movements[2, 'RESERVATION'].delete()
+        self.assertEqual(StockCheckpoint.objects.count(), 2)
+        self.assertEqual(self.at(2024, 4, 1)['stock'], 7)
+
+
+class StockReconciliationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='admin', email='admin@example.com', password='testpass123', is_superuser=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category
+        )
+        self.material = RawMaterial.objects.create(
+            material_code='M-001', material_name='Material 1',
+            unit=UnitOfMeasure.objects.create(unit_code='KG', unit_name='Kilogram')
+        )
+        for change, kind in [(10, 'IN'), (-4, 'OUT'), (5, 'RESERVATION')]:
+            InventoryTransaction.objects.create(
+                product=self.product, quantity_change=change, transaction_type=kind, performed_by=self.user
+            )
+        # Drift: stock changed without a ledger entry
+        Product.objects.filter(pk=self.product.pk).update(current_stock=11)
+        RawMaterial.objects.filter(pk=self.material.pk).update(current_stock=Decimal('2.5'))
+
+    def test_report_lists_drifted_items(self):
+        """Test that items are compared with their ledger balance, reservations excluded"""
+        result = reconcile_stock()
+        self.assertEqual(result['checked'], 2)
+        by_type = {row['item_type']: row for row in result['discrepancies']}
+        self.assertEqual((by_type['product']['ledger_stock'], by_type['product']['difference']), (6, -5))
+        self.assertEqual((by_type['material']['ledger_stock'], by_type['material']['difference']), (0, Decimal('-2.5')))
+        self.assertEqual(reconcile_stock(item_type='material')['discrepancy_count'], 1)
+
+    def test_repair_writes_ledger_balance(self):
+        """Test that a repair sets current_stock to the ledger balance"""
+        response = self.client.post(reverse('inventory:stock-reconciliation'), {'repair': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['repaired'], {'product': 1, 'material': 1})
+
+        self.product.refresh_from_db()
+        self.material.refresh_from_db()
+        self.assertEqual((self.product.current_stock, self.material.current_stock), (6, 0))
+        self.assertEqual(reconcile_stock()['discrepancy_count'], 0)
+
+    def test_bad_item_type_is_rejected(self):
+        """Test that an unknown item type is a 400"""
+        response = self.client.get(reverse('inventory:stock-reconciliation'), {'item_type': 'tool'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReservedStockTest(TestCase):
+    def setUp(self):
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category,
+            current_stock=20
+        )
+        self.material = RawMaterial.objects.create(
+            material_code='M-001', material_name='Material 1', current_stock=Decimal('50'),
+            unit=UnitOfMeasure.objects.create(unit_code='KG', unit_name='Kilogram')
+        )
+
+    def test_reservations_adjust_available_stock(self):
+        """Test that product reservations round up and reduce available stock"""
+        create_reservation(product=self.product, quantity=Decimal('2.4'))
+        create_reservation(material=self.material, quantity=Decimal('12.5'))
+        self.product.refresh_from_db()
+        self.material.refresh_from_db()
+        self.assertEqual((self.product.reserved_stock, self.product.available_stock), (3, 17))
+        self.assertEqual((self.material.reserved_stock, self.material.available_stock), (Decimal('12.5'), Decimal('37.5')))
+
+    def test_save_keeps_concurrent_reservation(self):
+        """Test that saving a stale instance does not overwrite reserved_stock"""
+        product = Product.objects.get(pk=self.product.pk)
+        material = RawMaterial.objects.get(pk=self.material.pk)
+        create_reservation(product=self.product, quantity=5)
+        create_reservation(material=self.material, quantity=5)
+
+        product.product_name = 'Renamed'
+        product.save()
+        material.material_name = 'Renamed'
+        material.save(update_fields=['material_name', 'reserved_stock'])
+
+        product.refresh_from_db()
+        material.refresh_from_db()
+        self.assertEqual((product.product_name, product.reserved_stock), ('Renamed', 5))
+        self.assertEqual((material.material_name, material.reserved_stock), ('Renamed', 5))
+
+
+class ProductSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = InventoryCategory.objects.create(name='MAMUL')
+        for code, name in [
+            ('ŞAFT-01', 'Şaft mili'),
+            ('SAFT-01X', 'Adaptör'),
+            ('P-100', 'Saft flanşı'),
+            ('Z-999', 'Kapak'),
+        ]:
+            Product.objects.create(
+                product_code=code, product_name=name,
+                product_type='MONTAGED', inventory_category=category
+            )
+        self.url = reverse('inventory:product-search')
+
+    def test_fold_maps_turkish_letters(self):
+        """Test that search terms fold the same way as the indexed expression"""
+        self.assertEqual(fold(' İĞNE Işık Ø18 '), 'igne isik o18')
+
+    def test_substring_filter_is_turkish_insensitive(self):
+        """Test that dotted and undotted I and Turkish letters match their ASCII forms"""
+        codes = search_filter(Product.objects.all(), 'product_name', 'FLANSI').values_list('product_code', flat=True)
+        self.assertEqual(list(codes), ['P-100'])
+
+    def test_exact_code_then_prefixes_then_names(self):
+        """Test that results rank exact codes, code prefixes and name prefixes in that order"""
+        response = self.client.get(self.url, {'q': 'şaft-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['product_code'] for row in response.data[:2]], ['ŞAFT-01', 'SAFT-01X'])
+        self.assertEqual([row['match_rank'] for row in response.data[:2]], [3, 2])
+
+        response = self.client.get(self.url, {'q': 'saft'})
+        ranked = [(row['product_code'], row['match_rank']) for row in response.data]
+        self.assertEqual(sorted(ranked[:2]), [('SAFT-01X', 2), ('ŞAFT-01', 2)])
+        self.assertEqual(ranked[2], ('P-100', 1))
+        self.assertNotIn('Z-999', [code for code, _ in ranked])
+
+    def test_limit_and_missing_term(self):
+        """Test that the limit is applied and an empty term is a 400"""
+        response = self.client.get(self.url, {'q': 'saft', 'limit': 1})
+        self.assertEqual(len(response.data), 1)
+        response = self.client.get(self.url, {'q': ' '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductCodeTreeTest(TestCase):
+    def setUp(self):
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.products = {
+            code: Product.objects.create(
+                product_code=code, product_name=code, product_type='MONTAGED', inventory_category=category
+            )
+            for code in ['03.1', '03.1.13', '03.1.14', '03. 1.15', '03..1.16', '03.2', '04.5']
+        }
+
+    def children(self, prefix):
+        return {
+            row['segment']: (row['product_count'], row['child_count'], row['product_id'])
+            for row in code_children(prefix)['children']
+        }
+
+    def test_top_level(self):
+        """Test that the top level lists first segments with their subtree sizes"""
+        self.assertEqual(self.children(''), {'03': (6, 2, None), '04': (1, 1, None)})
+
+    def test_children_count_irregular_codes_consistently(self):
+        """Test that codes with spaces or empty segments fall under the same prefix they group by"""
+        self.assertEqual(self.children('03'), {
+            '1': (5, 4, self.products['03.1'].id),
+            '2': (1, 0, self.products['03.2'].id),
+        })
+        self.assertEqual(self.children(' 03 . 1 '), {
+            '13': (1, 0, self.products['03.1.13'].id),
+            '14': (1, 0, self.products['03.1.14'].id),
+            '15': (1, 0, self.products['03. 1.15'].id),
+            '16': (1, 0, self.products['03..1.16'].id),
+        })
+
+    def test_prefix_is_normalized(self):
+        """Test that the returned prefix and paths use the normalized segments"""
+        tree = code_children('03..1')
+        self.assertEqual((tree['prefix'], tree['depth']), ('03.1', 2))
+        self.assertEqual(tree['children'][0]['path'], '03.1.13')
+        self.assertEqual(code_children('99')['children'], [])
+
+
+class BestFitStockTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        unit = UnitOfMeasure.objects.create(unit_code='ADET', unit_name='Adet')
+        for code, stock, dimensions in [
+            ('BAR-18', 5, {'diameter_mm': 18, 'bar_length_mm': 3000}),
+            ('BAR-20', 5, {'diameter_mm': 20, 'bar_length_mm': 3000}),
+            ('BAR-22', 0, {'diameter_mm': 22, 'bar_length_mm': 3000}),
+            ('BAR-25', 5, {'diameter_mm': 25}),
+            ('BAR-30', 5, {'diameter_mm': 30, 'bar_length_mm': 100}),
+            ('PLT-8', 5, {'thickness': 8, 'width': 500, 'height': 500}),
+            ('PLT-10', 5, {'thickness': 10, 'width': 100, 'height': 200}),
+            ('PLT-12', 5, {'thickness': 12, 'width': 300, 'height': 300}),
+        ]:
+            RawMaterial.objects.create(
+                material_code=code, material_name=code, unit=unit,
+                current_stock=stock, material_type='STEEL', **dimensions
+            )
+        RawMaterial.objects.create(
+            material_code='AL-20', material_name='AL-20', unit=unit,
+            current_stock=5, material_type='ALUMINUM', diameter_mm=20
+        )
+
+    def test_bars_skip_small_empty_and_short_stock(self):
+        """Test that bars below the size, out of stock or too short are left out"""
+        rows = best_fit('STEEL', diameter=19, length=150, allowance=1)
+        self.assertEqual([row['material_code'] for row in rows], ['BAR-20', 'BAR-25'])
+        self.assertEqual(rows[0]['waste_mm3'], 0)
+        self.assertAlmostEqual(rows[1]['waste_mm3'], round(math.pi / 4 * (25 ** 2 - 20 ** 2) * 151, 2))
+
+    def test_plates_try_every_orientation(self):
+        """Test that a part fits a plate turned either way and ranks by thickness oversize"""
+        rows = best_fit('STEEL', thickness=9, width=150, height=90)
+        self.assertEqual([(row['material_code'], row['waste_mm3']) for row in rows], [
+            ('PLT-10', 1 * 90 * 150), ('PLT-12', 3 * 90 * 150),
+        ])
+
+    def test_bars_and_plates_rank_together(self):
+        """Test that giving both envelopes mixes bars and plates by waste"""
+        rows = best_fit('STEEL', diameter=20, length=100, thickness=9, width=150, height=90, limit=3)
+        self.assertEqual([row['shape'] for row in rows], ['bar', 'plate', 'bar'])
+
+    def test_parameters_are_validated(self):
+        """Test that the endpoint needs a material type and a complete envelope"""
+        url = reverse('inventory:rawmaterial-best-fit')
+        response = self.client.get(url, {'material_type': 'STEEL', 'diameter': 19})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['material_code'], 'BAR-20')
+        for params in [{'diameter': 19}, {'material_type': 'STEEL', 'thickness': 9}, {'material_type': 'STEEL', 'diameter': -1}]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class ToolSubstituteTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        table_id = uuid.uuid4()
+        for position, (code, diameter) in enumerate([('T-10', 10), ('T-11', 11), ('T-12', 12), ('T-20', 20)]):
+            Tool.objects.create(
+                stock_code=code, supplier_name='Supplier', product_code=code,
+                unit_price_tl=1, unit_price_euro=1, unit_price_usd=1,
+                tool_insert_code='-', tool_material='CARBIDE', tool_diameter=diameter, tool_length=50,
+                tool_width=0, tool_height=0, tool_angle=0, tool_radius=0, tool_connection_diameter=10,
+                tool_type='MILL', row=1, column=position, table_id=table_id, quantity=1,
+            )
+        invalidate_tool_index()
+
+    def test_substitutes_nearest_first(self):
+        """Test that substitutes of the same type come nearest first without the tool itself"""
+        response = self.client.get(reverse('inventory:tool-substitutes', args=['T-10']), {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['stock_code'] for row in response.data], ['T-11', 'T-12'])
+
+    def test_substitutes_skip_tools_no_longer_available(self):
+        """Test that tools taken since the index was built are left out and the limit still filled"""
+        self.client.get(reverse('inventory:tool-substitutes', args=['T-10']))
+        Tool.objects.filter(stock_code='T-11').update(status='IN_USE')
+
+        response = self.client.get(reverse('inventory:tool-substitutes', args=['T-10']), {'limit': 2})
+        self.assertEqual([row['stock_code'] for row in response.data], ['T-12', 'T-20'])
+
+
+class CribLayoutTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.table_id = uuid.uuid4()
+        for code, row, column, tool_status in [('T-1', 1, 1, 'AVAILABLE'), ('T-2', 1, 1, 'IN_USE'), ('T-3', 2, 3, 'AVAILABLE')]:
+            Tool.objects.create(
+                stock_code=code, supplier_name='Supplier', product_code=code,
+                unit_price_tl=1, unit_price_euro=1, unit_price_usd=1,
+                tool_insert_code='-', tool_material='CARBIDE', tool_diameter=10, tool_length=50,
+                tool_width=0, tool_height=0, tool_angle=0, tool_radius=0, tool_connection_diameter=10,
+                tool_type='MILL', row=row, column=column, table_id=self.table_id, quantity=1, status=tool_status,
+            )
+        Holder.objects.create(
+            stock_code='H-1', supplier_name='Supplier', product_code='H-1',
+            unit_price_tl=1, unit_price_euro=1, unit_price_usd=1, holder_type='HSK', pulley_type='-',
+            holder_type_enum='HSK', tool_connection_diameter=10, row=2, column=1, table_id=self.table_id,
+        )
+
+    def test_layout_is_a_dense_grid(self):
+        """Test that the grid spans the occupied extent with empty positions filled in"""
+        layout = build_crib_layout(self.table_id)
+        self.assertEqual((layout['first_row'], layout['first_column']), (1, 1))
+        self.assertEqual((layout['row_count'], layout['column_count']), (2, 3))
+        self.assertEqual(layout['occupied_cells'], 3)
+        self.assertEqual(layout['status_counts'], {'AVAILABLE': 3, 'IN_USE': 1})
+
+        shared = layout['grid'][0][0]
+        self.assertEqual([item['stock_code'] for item in shared['items']], ['T-1', 'T-2'])
+        self.assertEqual(shared['available'], 1)
+        self.assertFalse(layout['grid'][0][1]['occupied'])
+        self.assertEqual(layout['grid'][1][0]['items'], [{'kind': 'holder', 'stock_code': 'H-1', 'status': 'AVAILABLE'}])
+
+    def test_tool_changes_invalidate_the_cached_layout(self):
+        """Test that a committed tool move replaces the cached layout"""
+        self.assertEqual(crib_layout(self.table_id)['occupied_cells'], 3)
+        tool = Tool.objects.get(stock_code='T-3')
+        tool.row = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            tool.save()
+        self.assertEqual(crib_layout(self.table_id)['row_count'], 5)
+
+    def test_locate_and_missing_table(self):
+        """Test that locate finds tools and holders and an empty table returns 404"""
+        response = self.client.get(reverse('inventory:crib-locate'), {'stock_code': 'H-1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['kind'], response.data['row'], response.data['column']), ('holder', 2, 1))
+
+        response = self.client.get(reverse('inventory:crib-detail', args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FakeMultipartClient:
+    """Multipart upload calls of an S3 client, keeping the parts in memory."""
+    def __init__(self):
+        self.parts = {}
+        self.completed = None
+
+    def create_multipart_upload(self, **params):
+        return {'UploadId': 'upload-1'}
+
+    def list_parts(self, **params):
+        return {'Parts': [
+            {'PartNumber': number, 'ETag': f'etag-{number}', 'Size': size} for number, size in sorted(self.parts.items())
+        ], 'IsTruncated': False}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://storage.example.com/{Params['Key']}?partNumber={Params['PartNumber']}"
+
+    def complete_multipart_upload(self, **params):
+        self.completed = params
+
+
+class DrawingUploadTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.product = Product.objects.create(
+            product_code='P-001', product_name='Product 1', product_type='MONTAGED', inventory_category=category
+        )
+        self.storage_client = FakeMultipartClient()
+        storage = SimpleNamespace(
+            bucket_name='drawings', connection=SimpleNamespace(meta=SimpleNamespace(client=self.storage_client)),
+            _normalize_name=lambda name: f'media/{name}', get_valid_name=lambda name: name.replace(' ', '_'),
+        )
+        patcher = mock.patch('inventory.drawing_uploads.drawing_storage', return_value=storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.body = {
+            'product': self.product.id, 'version': '1', 'drawing_code': 'D-001', 'effective_date': '2025-01-01',
+            'file_name': 'big part.pdf', 'file_size': 40 * 1024 * 1024, 'part_size': 16 * 1024 * 1024,
+        }
+
+    def test_part_size_fits_the_part_limit(self):
+        """Test that parts are at least the storage minimum and never more than MAX_PARTS"""
+        self.assertEqual(part_size_for(1024, 1024), MIN_PART_SIZE)
+        self.assertEqual(part_size_for(MAX_PARTS * DEFAULT_PART_SIZE), DEFAULT_PART_SIZE)
+        self.assertEqual(part_size_for(MAX_PARTS * DEFAULT_PART_SIZE + 1), DEFAULT_PART_SIZE + 1)
+
+    def test_upload_resumes_and_completes_once(self):
+        """Test that missing parts are handed out again and completing twice creates one drawing"""
+        response = self.client.post(reverse('inventory:drawingupload-list'), self.body, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['part_count'], 3)
+        self.assertEqual([part['part_number'] for part in response.data['parts']], [1, 2, 3])
+        complete_url = reverse('inventory:drawingupload-complete', args=[response.data['id']])
+
+        self.storage_client.parts = {1: 16 * 1024 * 1024}
+        response = self.client.get(reverse('inventory:drawingupload-detail', args=[response.data['id']]))
+        self.assertEqual([part['part_number'] for part in response.data['parts']], [2, 3])
+        self.assertEqual(self.client.post(complete_url).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.storage_client.parts.update({2: 16 * 1024 * 1024, 3: 8 * 1024 * 1024})
+        for _ in range(2):
+            response = self.client.post(complete_url)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(TechnicalDrawing.objects.filter(product=self.product, version='1').count(), 1)
+        self.assertEqual(len(self.storage_client.completed['MultipartUpload']['Parts']), 3)
+
+        response = self.client.post(reverse('inventory:drawingupload-list'), self.body, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DrawingDerivativeTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.product = Product.objects.create(
+            product_code='P-001', product_name='Product 1', product_type='MONTAGED', inventory_category=category
+        )
+        self.image = self.create_drawing('1', 'part.png', self.png('red'))
+        self.pdf = self.create_drawing('2', 'part.pdf', b'%PDF-1.4')
+
+    def png(self, color):
+        content = io.BytesIO()
+        Image.new('RGB', (2000, 1000), color).save(content, 'PNG')
+        return content.getvalue()
+
+    def create_drawing(self, version, file_name, content):
+        drawing = TechnicalDrawing(
+            product=self.product, version=version, drawing_code=f'D-{version}',
+            effective_date=date(2025, 1, 1), created_by=self.user,
+        )
+        drawing.drawing_file.save(file_name, ContentFile(content), save=False)
+        drawing.save()
+        return drawing
+
+    def test_pending_drawings_are_rendered(self):
+        """Test that raster drawings get a thumbnail and preview and other files are unsupported"""
+        self.assertEqual(process_pending(), {'READY': 1, 'UNSUPPORTED': 1})
+
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.derivatives_status, 'READY')
+        with Image.open(self.image.thumbnail) as thumbnail:
+            self.assertEqual(thumbnail.size, (256, 128))
+        self.pdf.refresh_from_db()
+        self.assertEqual((self.pdf.derivatives_status, self.pdf.thumbnail.name), ('UNSUPPORTED', None))
+
+    def test_claims_are_not_taken_twice_until_stale(self):
+        """Test that claimed drawings are PROCESSING, skipped by other workers and reclaimed after the timeout"""
+        drawings, claimed_at = claim_pending(batch_size=1)
+        self.assertEqual([drawing.pk for drawing in drawings], [self.image.pk])
+        self.assertEqual(drawings[0].derivatives_status, 'PROCESSING')
+        self.assertEqual([drawing.pk for drawing in claim_pending()[0]], [self.pdf.pk])
+        self.assertEqual(claim_pending()[0], [])
+
+        TechnicalDrawing.objects.filter(pk=self.image.pk).update(derivatives_claimed_at=claimed_at - CLAIM_TIMEOUT)
+        self.assertEqual([drawing.pk for drawing in claim_pending()[0]], [self.image.pk])
+
+    def test_file_replaced_while_rendering_stays_queued(self):
+        """Test that a result rendered from a replaced file is dropped and the new file queued"""
+        def replace_then_build(drawing):
+            current = TechnicalDrawing.objects.get(pk=drawing.pk)
+            current.drawing_file.save('new.png', ContentFile(self.png('blue')), save=False)
+            current.save()
+            return build_derivatives(drawing)
+
+        with mock.patch('inventory.drawing_derivatives.build_derivatives', side_effect=replace_then_build):
+            process_pending(batch_size=1)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.derivatives_status, 'PENDING')
+        self.assertFalse(self.image.thumbnail)
+
+        process_pending()
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.derivatives_status, 'READY')
@@ -0,0 +1,100 @@
+"""
+Nearest-neighbour substitutes for cutting tools.
+
+Every worker process keeps an in-memory index of the AVAILABLE tools,
+grouped by (tool_type, tool_connection_diameter): a NumPy matrix of the
+geometry (diameter, length, radius, angle) per group, scaled by the group's
+spread in each dimension so a millimetre of diameter and a degree of angle
+weigh comparably. A query is a brute-force distance over one group, which is
+only as large as the tools sharing a type and connection.
+
+Tool saves and deletes bump a version token in the shared cache (after
+commit), and workers rebuild their index when the token changes. Bulk
+queryset updates bypass the signals, so the index is also rebuilt after
+INDEX_MAX_AGE seconds regardless.
+"""
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from django.core.cache import cache
+
+from .models import Tool, ToolHolderStatus
+
+GEOMETRY_FIELDS = ('tool_diameter', 'tool_length', 'tool_radius', 'tool_angle')
+# Relative weight of each geometry field in the distance
+GEOMETRY_WEIGHTS = np.array([3.0, 1.0, 1.0, 1.0])
+VERSION_KEY = 'inventory:tool_index_version'
+INDEX_MAX_AGE = 300
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+
+_lock = threading.Lock()
+_index = {'version': None, 'built_at': 0.0, 'groups': {}}
+
+
+def invalidate_tool_index():
+    """Make every worker rebuild its tool index on its next query."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _group_key(tool_type, connection_diameter):
+    return tool_type, float(connection_diameter)
+
+
+def _build_groups():
+    rows = defaultdict(list)
+    tools = Tool.objects.filter(status=ToolHolderStatus.AVAILABLE).values_list(
+        'stock_code', 'tool_type', 'tool_connection_diameter', *GEOMETRY_FIELDS
+    )
+    for stock_code, tool_type, connection_diameter, *geometry in tools.iterator(chunk_size=2000):
+        rows[_group_key(tool_type, connection_diameter)].append((stock_code, geometry))
+
+    groups = {}
+    for key, members in rows.items():
+        vectors = np.array([geometry for _, geometry in members], dtype=float)
+        spread = vectors.std(axis=0)
+        spread[spread == 0] = 1.0
+        groups[key] = {
+            'stock_codes': np.array([stock_code for stock_code, _ in members]),
+            'vectors': vectors,
+            'scale': GEOMETRY_WEIGHTS / spread,
+        }
+    return groups
+
+
+def tool_index():
+    """This worker's index, rebuilt when the shared version or its age says so."""
+    version = cache.get(VERSION_KEY)
+    with _lock:
+        if _index['version'] != version or time.monotonic() - _index['built_at'] > INDEX_MAX_AGE \
+                or not _index['built_at']:
+            _index.update(groups=_build_groups(), version=version, built_at=time.monotonic())
+        return _index['groups']
+
+
+def find_substitutes(tool, limit=DEFAULT_LIMIT):
+    """
+    The AVAILABLE tools of the same type and connection diameter closest to
+    `tool` in geometry, nearest first.
+
+    Returns:
+        list of (stock_code, distance) pairs, excluding the tool itself
+    """
+    group = tool_index().get(_group_key(tool.tool_type, tool.tool_connection_diameter))
+    if group is None:
+        return []
+    target = np.array([float(getattr(tool, field)) for field in GEOMETRY_FIELDS])
+    distances = np.sqrt((((group['vectors'] - target) * group['scale']) ** 2).sum(axis=1))
+    order = np.argsort(distances, kind='stable')
+    matches = []
+    for position in order:
+        stock_code = str(group['stock_codes'][position])
+        if stock_code == tool.stock_code:
+            continue
+        matches.append((stock_code, round(float(distances[position]), 4)))
+        if len(matches) == limit:
+            break
+    return matches
@@ -8,15 +8,20 @@ router = DefaultRouter()
 router.register(r'categories', views.InventoryCategoryViewSet)
 router.register(r'products', views.ProductViewSet)
 router.register(r'technical-drawings', views.TechnicalDrawingViewSet)
+router.register(r'drawing-uploads', views.DrawingUploadViewSet)
 router.register(r'transactions', views.InventoryTransactionViewSet)
 router.register(r'raw-materials', views.RawMaterialViewSet)
 router.register(r'units', views.UnitOfMeasureViewSet)
 router.register(r'tools', views.ToolViewSet)
 router.register(r'holders', views.HolderViewSet)
+router.register(r'crib', views.CribLayoutViewSet, basename='crib')
 router.register(r'fixtures', views.FixtureViewSet)
 router.register(r'control-gauges', views.ControlGaugeViewSet)
+router.register(r'reservations', views.StockReservationViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('material-types/', views.MaterialTypeChoicesAPIView.as_view(), name='material-type-choices'),
+    path('stock-reconciliation/', views.StockReconciliationAPIView.as_view(), name='stock-reconciliation'),
+    path('availability/', views.AvailabilityAPIView.as_view(), name='availability'),
 ] 
\ No newline at end of file
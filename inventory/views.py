@@ -1,4 +1,11 @@
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import viewsets, status, parsers
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -6,7 +13,7 @@ from rest_framework.permissions import IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.db.models import Q
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
@@ -14,22 +21,135 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from .models import (
     InventoryCategory, UnitOfMeasure, Product,
     TechnicalDrawing, RawMaterial, InventoryTransaction, UnitOfMeasure,
-    Tool, Holder, Fixture, ControlGauge
+    Tool, Holder, Fixture, ControlGauge, StockReservation, ReservationStatus, DrawingUpload, ToolHolderStatus
 )
 from .serializers import (
     InventoryCategorySerializer, UnitOfMeasureSerializer,
     ProductSerializer, TechnicalDrawingDetailSerializer,
     TechnicalDrawingListSerializer, RawMaterialSerializer, 
     InventoryTransactionSerializer, UnitOfMeasureSerializer,
-    ToolSerializer, HolderSerializer, FixtureSerializer, ControlGaugeSerializer
+    ToolSerializer, HolderSerializer, FixtureSerializer, ControlGaugeSerializer,
+    StockReservationSerializer, DrawingUploadStartSerializer
+)
+from .pagination import InventoryTransactionPagination
+from .stock_history import stock_at
+from .reconciliation import reconcile_stock, ITEM_MODELS
+from .reservations import create_reservation, close_reservations, availability
+from .search import search_filter, ranked_search, DEFAULT_LIMIT, MAX_LIMIT
+from .code_tree import code_children
+from .tool_matching import find_substitutes, DEFAULT_LIMIT as TOOL_SUBSTITUTE_DEFAULT_LIMIT, MAX_LIMIT as TOOL_SUBSTITUTE_MAX_LIMIT
+from .crib import crib_layout, crib_tables, locate
+from .drawing_uploads import UploadError, start_upload, upload_state, complete_upload, abort_upload
+from .stock_selection import best_fit, DEFAULT_LIMIT as BEST_FIT_DEFAULT_LIMIT, MAX_LIMIT as BEST_FIT_MAX_LIMIT
+from erp_core.models import MaterialType
+from erp_core.reference import inventory_categories
+from erp_core.response_cache import CachedResponseMixin
+from erp_core.permissions import IsAdminUser
+
+def parse_stock_moment(request):
+    """
+    Read the 'at' query parameter: an ISO datetime, or a date meaning the end
+    of that day. Defaults to now.
+    """
+    value = request.query_params.get('at')
+    if not value:
+        return timezone.now()
+    try:
+        if len(value) == 10:
+            day = parse_date(value)
+            moment = datetime.combine(day + timedelta(days=1), time.min) if day else None
+        else:
+            moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValidationError({'at': 'Use an ISO date (YYYY-MM-DD) or datetime.'})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+STOCK_AT_PARAMETERS = [
+    openapi.Parameter(
+        'at',
+        openapi.IN_QUERY,
+        description="ISO datetime, or a date for the end of that day (default now)",
+        type=openapi.TYPE_STRING,
+        required=False
+    )
+]
+
+STOCK_AT_RESPONSE = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        'stock': openapi.Schema(type=openapi.TYPE_NUMBER),
+        'checkpoint_month': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+        'tail_transactions': openapi.Schema(type=openapi.TYPE_INTEGER),
+    }
 )
 
-class UnitOfMeasureViewSet(viewsets.ReadOnlyModelViewSet):
+SEARCH_PARAMETERS = [
+    openapi.Parameter('q', openapi.IN_QUERY, description="Search term matched against codes and names", type=openapi.TYPE_STRING, required=True),
+    openapi.Parameter('limit', openapi.IN_QUERY, description=f"Maximum results (default {DEFAULT_LIMIT}, max {MAX_LIMIT})", type=openapi.TYPE_INTEGER, required=False),
+]
+
+def parse_search_params(request):
+    term = request.query_params.get('q', '').strip()
+    if not term:
+        raise ValidationError({'q': 'A search term is required.'})
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValidationError({'limit': 'Must be an integer.'})
+    return term, min(max(limit, 1), MAX_LIMIT)
+
+DIMENSION_FILTERS = [
+    ('width', 'width'),
+    ('height', 'height'),
+    ('thickness', 'thickness'),
+    ('diameter_mm', 'diameter'),
+]
+
+BEST_FIT_PARAMETERS = [
+    openapi.Parameter('material_type', openapi.IN_QUERY, description="Material type", type=openapi.TYPE_STRING, required=True),
+    openapi.Parameter('diameter', openapi.IN_QUERY, description="Part diameter in mm (round bars)", type=openapi.TYPE_NUMBER, required=False),
+    openapi.Parameter('length', openapi.IN_QUERY, description="Part length in mm (round bars)", type=openapi.TYPE_NUMBER, required=False),
+    openapi.Parameter('thickness', openapi.IN_QUERY, description="Part thickness in mm (plates)", type=openapi.TYPE_NUMBER, required=False),
+    openapi.Parameter('width', openapi.IN_QUERY, description="Part width in mm (plates)", type=openapi.TYPE_NUMBER, required=False),
+    openapi.Parameter('height', openapi.IN_QUERY, description="Part height in mm (plates)", type=openapi.TYPE_NUMBER, required=False),
+    openapi.Parameter('allowance', openapi.IN_QUERY, description="Machining allowance added to every part dimension in mm", type=openapi.TYPE_NUMBER, required=False),
+    openapi.Parameter('limit', openapi.IN_QUERY, description=f"Maximum candidates (default {BEST_FIT_DEFAULT_LIMIT}, max {BEST_FIT_MAX_LIMIT})", type=openapi.TYPE_INTEGER, required=False),
+]
+
+def parse_best_fit_params(request):
+    params = {}
+    material_type = request.query_params.get('material_type')
+    if material_type not in MaterialType.values:
+        raise ValidationError({'material_type': f'Must be one of {", ".join(MaterialType.values)}.'})
+    for name in ('diameter', 'length', 'thickness', 'width', 'height', 'allowance'):
+        value = request.query_params.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            params[name] = float(value)
+        except ValueError:
+            raise ValidationError({name: 'Must be a number.'})
+        if params[name] < 0:
+            raise ValidationError({name: 'Must not be negative.'})
+    if not params.get('diameter') and not all(params.get(name) for name in ('thickness', 'width', 'height')):
+        raise ValidationError('Give a diameter for round bars or thickness, width and height for plates.')
+    try:
+        limit = int(request.query_params.get('limit', BEST_FIT_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValidationError({'limit': 'Must be an integer.'})
+    return {'material_type': material_type, 'limit': min(max(limit, 1), BEST_FIT_MAX_LIMIT), **params}
+
+class UnitOfMeasureViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = UnitOfMeasure.objects.all()
     serializer_class = UnitOfMeasureSerializer
     permission_classes = [IsAuthenticated]
 
-class InventoryCategoryViewSet(viewsets.ModelViewSet):
+class InventoryCategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = InventoryCategory.objects.all()
     serializer_class = InventoryCategorySerializer
     permission_classes = [IsAuthenticated]
@@ -65,49 +185,16 @@ class ProductViewSet(viewsets.ModelViewSet):
         product_code = self.request.query_params.get('product_code', None)
         product_name = self.request.query_params.get('product_name', None)
 
-        # Dimension range filters
-        width_min = self.request.query_params.get('width_min', None)
-        width_max = self.request.query_params.get('width_max', None)
-        height_min = self.request.query_params.get('height_min', None)
-        height_max = self.request.query_params.get('height_max', None)
-        thickness_min = self.request.query_params.get('thickness_min', None)
-        thickness_max = self.request.query_params.get('thickness_max', None)
-        diameter_min = self.request.query_params.get('diameter_min', None)
-        diameter_max = self.request.query_params.get('diameter_max', None)
-
         try:
             if category:
                 queryset = queryset.filter(inventory_category__name=category)
             if product_type:
                 queryset = queryset.filter(product_type=product_type)
             if product_code:
-                queryset = queryset.filter(product_code__icontains=product_code)
+                queryset = search_filter(queryset, 'product_code', product_code)
             if product_name:
-                queryset = queryset.filter(product_name__icontains=product_name)
-            
-            # Apply dimension range filters
-            if width_min is not None:
-                queryset = queryset.filter(width__gte=float(width_min))
-            if width_max is not None:
-                queryset = queryset.filter(width__lte=float(width_max))
-            
-            if height_min is not None:
-                queryset = queryset.filter(height__gte=float(height_min))
-            if height_max is not None:
-                queryset = queryset.filter(height__lte=float(height_max))
-            
-            if thickness_min is not None:
-                queryset = queryset.filter(thickness__gte=float(thickness_min))
-            if thickness_max is not None:
-                queryset = queryset.filter(thickness__lte=float(thickness_max))
-            
-            if diameter_min is not None:
-                queryset = queryset.filter(diameter_mm__gte=float(diameter_min))
-            if diameter_max is not None:
-                queryset = queryset.filter(diameter_mm__lte=float(diameter_max))
+                queryset = search_filter(queryset, 'product_name', product_name)
 
-        except ValueError as e:
-            raise ValidationError(f"Invalid numeric value in dimension filters: {str(e)}")
         except Exception as e:
             raise ValidationError(f"Invalid filter parameters: {str(e)}")
 
@@ -133,7 +220,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             openapi.Parameter(
                 'product_code',
                 openapi.IN_QUERY,
-                description="Filter by product code (exact match)",
+                description="Filter by product code (case-insensitive partial match)",
                 type=openapi.TYPE_STRING,
                 required=False
             ),
@@ -143,63 +230,6 @@ class ProductViewSet(viewsets.ModelViewSet):
                 description="Filter by product name (case-insensitive partial match)",
                 type=openapi.TYPE_STRING,
                 required=False
-            ),
-            # Dimension range filter parameters
-            openapi.Parameter(
-                'width_min',
-                openapi.IN_QUERY,
-                description="Minimum width value",
-                type=openapi.TYPE_NUMBER,
-                required=False
-            ),
-            openapi.Parameter(
-                'width_max',
-                openapi.IN_QUERY,
-                description="Maximum width value",
-                type=openapi.TYPE_NUMBER,
-                required=False
-            ),
-            openapi.Parameter(
-                'height_min',
-                openapi.IN_QUERY,
-                description="Minimum height value",
-                type=openapi.TYPE_NUMBER,
-                required=False
-            ),
-            openapi.Parameter(
-                'height_max',
-                openapi.IN_QUERY,
-                description="Maximum height value",
-                type=openapi.TYPE_NUMBER,
-                required=False
-            ),
-            openapi.Parameter(
-                'thickness_min',
-                openapi.IN_QUERY,
-                description="Minimum thickness value",
-                type=openapi.TYPE_NUMBER,
-                required=False
-            ),
-            openapi.Parameter(
-                'thickness_max',
-                openapi.IN_QUERY,
-                description="Maximum thickness value",
-                type=openapi.TYPE_NUMBER,
-                required=False
-            ),
-            openapi.Parameter(
-                'diameter_min',
-                openapi.IN_QUERY,
-                description="Minimum diameter value (in mm)",
-                type=openapi.TYPE_NUMBER,
-                required=False
-            ),
-            openapi.Parameter(
-                'diameter_max',
-                openapi.IN_QUERY,
-                description="Maximum diameter value (in mm)",
-                type=openapi.TYPE_NUMBER,
-                required=False
             )
         ],
         responses={
@@ -248,7 +278,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         notes = request.data.get('notes', '')
 
         try:
-            to_category = InventoryCategory.objects.get(pk=to_category_id)
+            to_category = inventory_categories.get_by_pk(to_category_id)
             transaction = InventoryTransaction.objects.create(
                 product=product,
                 quantity_change=0,
@@ -267,6 +297,42 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @swagger_auto_schema(
+        operation_description="Ranked search over product codes and names (Turkish-insensitive, prefix and fuzzy matching)",
+        manual_parameters=SEARCH_PARAMETERS,
+        tags=['Products']
+    )
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        term, limit = parse_search_params(request)
+        results = ranked_search(Product.objects.all(), 'product_code', 'product_name', term, limit).values(
+            'id', 'product_code', 'product_name', 'product_type', 'inventory_category',
+            'current_stock', 'match_rank', 'similarity'
+        )
+        return Response(list(results))
+
+    @swagger_auto_schema(
+        operation_description="Child segments of a dotted product code prefix with product counts, for tree browsing",
+        manual_parameters=[
+            openapi.Parameter('prefix', openapi.IN_QUERY, description="Code prefix, e.g. 03.1 (empty for the top level)", type=openapi.TYPE_STRING, required=False),
+        ],
+        tags=['Products']
+    )
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        return Response(code_children(request.query_params.get('prefix', '')))
+
+    @swagger_auto_schema(
+        operation_description="Ledger stock of the product at a point in time",
+        manual_parameters=STOCK_AT_PARAMETERS,
+        responses={200: STOCK_AT_RESPONSE},
+        tags=['Products']
+    )
+    @action(detail=True, methods=['get'], url_path='stock-at')
+    def stock_at(self, request, pk=None):
+        product = self.get_object()
+        return Response(stock_at(parse_stock_moment(request), product=product))
+
 class TechnicalDrawingViewSet(viewsets.ModelViewSet):
     queryset = TechnicalDrawing.objects.all().select_related('product', 'approved_by')
     serializer_class = TechnicalDrawingDetailSerializer
@@ -371,10 +437,99 @@ class TechnicalDrawingViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
+class DrawingUploadViewSet(viewsets.GenericViewSet):
+    """
+    Resumable chunked uploads of large technical drawings. The client PUTs
+    each part of the file to the presigned URL it is given, then completes
+    the upload to create the drawing. An interrupted upload is resumed by
+    retrieving it for URLs of the parts still missing.
+    """
+    queryset = DrawingUpload.objects.all()
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Start a chunked drawing upload; returns the part size and presigned URLs of the first parts",
+        request_body=DrawingUploadStartSerializer,
+        tags=['Technical Drawings']
+    )
+    def create(self, request):
+        serializer = DrawingUploadStartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = start_upload(request.user, **serializer.validated_data)
+        except UploadError as e:
+            raise ValidationError({'error': str(e)})
+        return Response(upload_state(upload), status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_description="Progress of a chunked upload with presigned URLs for the parts still missing",
+        tags=['Technical Drawings']
+    )
+    def retrieve(self, request, pk=None):
+        return Response(upload_state(self.get_object()))
+
+    @swagger_auto_schema(
+        operation_description="Abort a chunked upload and drop its stored parts",
+        tags=['Technical Drawings']
+    )
+    def destroy(self, request, pk=None):
+        return Response(upload_state(abort_upload(self.get_object())))
+
+    @swagger_auto_schema(
+        operation_description="Assemble the uploaded parts and create the technical drawing",
+        responses={201: TechnicalDrawingDetailSerializer()},
+        tags=['Technical Drawings']
+    )
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        try:
+            upload = complete_upload(self.get_object().pk, request.user)
+        except UploadError as e:
+            raise ValidationError({'error': str(e)})
+        return Response(
+            TechnicalDrawingDetailSerializer(upload.drawing, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED
+        )
+
 class InventoryTransactionViewSet(viewsets.ModelViewSet):
     queryset = InventoryTransaction.objects.all()
     serializer_class = InventoryTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = InventoryTransactionPagination
+
+    def filter_transactions(self, queryset):
+        transaction_type = self.request.query_params.get('transaction_type', None)
+        product_id = self.request.query_params.get('product', None)
+        material_id = self.request.query_params.get('material', None)
+
+        if transaction_type:
+            queryset = queryset.filter(transaction_type=transaction_type)
+        if product_id:
+            queryset = queryset.filter(product_id=product_id)
+        if material_id:
+            queryset = queryset.filter(material_id=material_id)
+        return queryset
+
+    def stream_ndjson(self, queryset):
+        """
+        Stream every matching transaction as newline-delimited JSON.
+
+        Rows are read with iterator(), which uses a server-side cursor on
+        PostgreSQL, so memory stays flat regardless of the table size.
+        """
+        rows = queryset.order_by('-transaction_date', '-id').values(
+            'id', 'product', 'material', 'quantity_change', 'transaction_type',
+            'transaction_date', 'performed_by', 'verified_by', 'notes',
+            'from_category', 'to_category'
+        ).iterator(chunk_size=2000)
+
+        def lines():
+            for row in rows:
+                yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="inventory_transactions.ndjson"'
+        return response
 
     @swagger_auto_schema(
         operation_description="List all inventory transactions",
@@ -399,26 +554,41 @@ class InventoryTransactionViewSet(viewsets.ModelViewSet):
                 description="Filter by material ID",
                 type=openapi.TYPE_INTEGER,
                 required=False
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Cursor from the previous page's next link",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Results per page (max 1000)",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                'stream',
+                openapi.IN_QUERY,
+                description="Set to 'ndjson' to stream all matching transactions as newline-delimited JSON",
+                type=openapi.TYPE_STRING,
+                required=False
             )
         ],
         responses={200: InventoryTransactionSerializer(many=True)},
         tags=['Inventory Transactions']
     )
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        transaction_type = request.query_params.get('transaction_type', None)
-        product_id = request.query_params.get('product', None)
-        material_id = request.query_params.get('material', None)
+        queryset = self.filter_transactions(self.get_queryset())
 
-        if transaction_type:
-            queryset = queryset.filter(transaction_type=transaction_type)
-        if product_id:
-            queryset = queryset.filter(product_id=product_id)
-        if material_id:
-            queryset = queryset.filter(material_id=material_id)
+        if request.query_params.get('stream') == 'ndjson':
+            return self.stream_ndjson(queryset)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @swagger_auto_schema(
         operation_description="Create a new inventory transaction",
@@ -435,7 +605,7 @@ class InventoryTransactionViewSet(viewsets.ModelViewSet):
         serializer.save(performed_by=request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class RawMaterialViewSet(viewsets.ModelViewSet):
+class RawMaterialViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = RawMaterial.objects.all()
     serializer_class = RawMaterialSerializer
     permission_classes = [IsAuthenticated]
@@ -453,7 +623,7 @@ class RawMaterialViewSet(viewsets.ModelViewSet):
             openapi.Parameter(
                 'material_code',
                 openapi.IN_QUERY,
-                description="Filter by material code (exact match)",
+                description="Filter by material code (case-insensitive partial match)",
                 type=openapi.TYPE_STRING,
                 required=False
             ),
@@ -463,6 +633,70 @@ class RawMaterialViewSet(viewsets.ModelViewSet):
                 description="Filter by material name (case-insensitive partial match)",
                 type=openapi.TYPE_STRING,
                 required=False
+            ),
+            openapi.Parameter(
+                'material_type',
+                openapi.IN_QUERY,
+                description="Filter by material type",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            # Dimension range filter parameters
+            openapi.Parameter(
+                'width_min',
+                openapi.IN_QUERY,
+                description="Minimum width value",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'width_max',
+                openapi.IN_QUERY,
+                description="Maximum width value",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'height_min',
+                openapi.IN_QUERY,
+                description="Minimum height value",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'height_max',
+                openapi.IN_QUERY,
+                description="Maximum height value",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'thickness_min',
+                openapi.IN_QUERY,
+                description="Minimum thickness value",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'thickness_max',
+                openapi.IN_QUERY,
+                description="Maximum thickness value",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'diameter_min',
+                openapi.IN_QUERY,
+                description="Minimum diameter value (in mm)",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            ),
+            openapi.Parameter(
+                'diameter_max',
+                openapi.IN_QUERY,
+                description="Maximum diameter value (in mm)",
+                type=openapi.TYPE_NUMBER,
+                required=False
             )
         ],
         responses={200: RawMaterialSerializer(many=True)},
@@ -479,9 +713,21 @@ class RawMaterialViewSet(viewsets.ModelViewSet):
         if category:
             queryset = queryset.filter(inventory_category__name=category)
         if material_code:
-            queryset = queryset.filter(material_code__icontains=material_code)
+            queryset = search_filter(queryset, 'material_code', material_code)
         if material_name:
-            queryset = queryset.filter(material_name__icontains=material_name)
+            queryset = search_filter(queryset, 'material_name', material_name)
+        if request.query_params.get('material_type'):
+            queryset = queryset.filter(material_type=request.query_params['material_type'])
+
+        # Apply dimension range filters
+        for field, param in DIMENSION_FILTERS:
+            for suffix, lookup in (('min', 'gte'), ('max', 'lte')):
+                value = request.query_params.get(f'{param}_{suffix}')
+                if value is not None:
+                    try:
+                        queryset = queryset.filter(**{f'{field}__{lookup}': float(value)})
+                    except ValueError:
+                        raise ValidationError({f'{param}_{suffix}': 'Must be a number.'})
 
         # Apply pagination
         page = self.paginate_queryset(queryset)
@@ -501,6 +747,41 @@ class RawMaterialViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        operation_description="Ranked search over raw material codes and names (Turkish-insensitive, prefix and fuzzy matching)",
+        manual_parameters=SEARCH_PARAMETERS,
+        tags=['Raw Materials']
+    )
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        term, limit = parse_search_params(request)
+        results = ranked_search(RawMaterial.objects.all(), 'material_code', 'material_name', term, limit).values(
+            'id', 'material_code', 'material_name', 'material_type', 'inventory_category',
+            'current_stock', 'match_rank', 'similarity'
+        )
+        return Response(list(results))
+
+    @swagger_auto_schema(
+        operation_description="In-stock bars or plates that can hold a part envelope, smallest waste first. "
+                              "Give diameter (and length) for round bars, thickness, width and height for plates.",
+        manual_parameters=BEST_FIT_PARAMETERS,
+        tags=['Raw Materials']
+    )
+    @action(detail=False, methods=['get'], url_path='best-fit')
+    def best_fit(self, request):
+        return Response(best_fit(**parse_best_fit_params(request)))
+
+    @swagger_auto_schema(
+        operation_description="Ledger stock of the raw material at a point in time",
+        manual_parameters=STOCK_AT_PARAMETERS,
+        responses={200: STOCK_AT_RESPONSE},
+        tags=['Raw Materials']
+    )
+    @action(detail=True, methods=['get'], url_path='stock-at')
+    def stock_at(self, request, pk=None):
+        material = self.get_object()
+        return Response(stock_at(parse_stock_moment(request), material=material))
+
 class MaterialTypeChoicesAPIView(APIView):
     """
     API view to get available material type choices.
@@ -514,7 +795,152 @@ class MaterialTypeChoicesAPIView(APIView):
             'choices': [{'value': value, 'display': display} for value, display in choices]
         })
 
-class ToolViewSet(viewsets.ModelViewSet):
+class StockReconciliationAPIView(APIView):
+    """
+    Compare current_stock of products and raw materials with the transaction
+    ledger; POST with repair=true writes the ledger balances back.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get_item_type(self, value):
+        if value and value not in ITEM_MODELS:
+            raise ValidationError({'item_type': f"Must be one of {', '.join(ITEM_MODELS)}."})
+        return value or None
+
+    @swagger_auto_schema(
+        operation_description="Report items whose current_stock differs from the ledger",
+        manual_parameters=[
+            openapi.Parameter(
+                'item_type',
+                openapi.IN_QUERY,
+                description="Limit to 'product' or 'material'",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
+        tags=['Stock Reconciliation']
+    )
+    def get(self, request, *args, **kwargs):
+        item_type = self.get_item_type(request.query_params.get('item_type'))
+        return Response(reconcile_stock(item_type=item_type))
+
+    @swagger_auto_schema(
+        operation_description="Reconcile and optionally repair current_stock from the ledger",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'repair': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                'item_type': openapi.Schema(type=openapi.TYPE_STRING)
+            }
+        ),
+        tags=['Stock Reconciliation']
+    )
+    def post(self, request, *args, **kwargs):
+        item_type = self.get_item_type(request.data.get('item_type'))
+        repair = str(request.data.get('repair', False)).lower() == 'true'
+        return Response(reconcile_stock(repair=repair, item_type=item_type))
+
+class StockReservationViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Stock reservations. Sales order items and released work orders reserve
+    automatically; manual reservations can be created and released here.
+    """
+    queryset = StockReservation.objects.select_related('product', 'material')
+    serializer_class = StockReservationSerializer
+    permission_classes = [IsAuthenticated]
+    filterset_fields = ['product', 'material', 'status', 'sales_order_item', 'work_order']
+    ordering = ['-created_at']
+
+    @swagger_auto_schema(
+        operation_description="Create a manual stock reservation",
+        request_body=StockReservationSerializer,
+        responses={201: StockReservationSerializer()},
+        tags=['Stock Reservations']
+    )
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        reservation = create_reservation(
+            product=data.get('product'),
+            material=data.get('material'),
+            quantity=data['quantity'],
+            user=request.user,
+            notes=data.get('notes')
+        )
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_description="Release an active reservation",
+        responses={200: StockReservationSerializer()},
+        tags=['Stock Reservations']
+    )
+    @action(detail=True, methods=['post'])
+    def release(self, request, pk=None):
+        reservation = self.get_object()
+        if reservation.status != ReservationStatus.ACTIVE:
+            return Response(
+                {'error': 'Only active reservations can be released'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        close_reservations(StockReservation.objects.filter(pk=reservation.pk))
+        reservation.refresh_from_db()
+        return Response(self.get_serializer(reservation).data)
+
+class AvailabilityAPIView(APIView):
+    """
+    On-hand, reserved and available stock for many products and raw materials
+    in one call. GET takes comma-separated ids; POST takes id lists for
+    requests too long for a query string.
+    """
+    permission_classes = [IsAuthenticated]
+    max_items = 1000
+
+    def parse_ids(self, value, name):
+        if isinstance(value, str):
+            value = [part for part in value.split(',') if part.strip()]
+        try:
+            ids = [int(item_id) for item_id in value or []]
+        except (TypeError, ValueError):
+            raise ValidationError({name: 'Must be a list of integer IDs.'})
+        if len(ids) > self.max_items:
+            raise ValidationError({name: f'At most {self.max_items} IDs per request.'})
+        return ids
+
+    def availability_response(self, products, materials):
+        return Response(availability(
+            product_ids=self.parse_ids(products, 'products'),
+            material_ids=self.parse_ids(materials, 'materials'),
+        ))
+
+    @swagger_auto_schema(
+        operation_description="Stock availability for comma-separated product and material IDs",
+        manual_parameters=[
+            openapi.Parameter('products', openapi.IN_QUERY, description="Product IDs, comma separated", type=openapi.TYPE_STRING),
+            openapi.Parameter('materials', openapi.IN_QUERY, description="Raw material IDs, comma separated", type=openapi.TYPE_STRING),
+        ],
+        tags=['Stock Reservations']
+    )
+    def get(self, request, *args, **kwargs):
+        return self.availability_response(
+            request.query_params.get('products'), request.query_params.get('materials')
+        )
+
+    @swagger_auto_schema(
+        operation_description="Stock availability for lists of product and material IDs",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'products': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                'materials': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+            }
+        ),
+        tags=['Stock Reservations']
+    )
+    def post(self, request, *args, **kwargs):
+        return self.availability_response(request.data.get('products'), request.data.get('materials'))
+
+class ToolViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Tool.objects.all()
     serializer_class = ToolSerializer
     lookup_field = 'stock_code'
@@ -533,7 +959,36 @@ class ToolViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(row=row, column=column)
         return queryset
 
-class HolderViewSet(viewsets.ModelViewSet):
+    @swagger_auto_schema(
+        operation_description="Nearest AVAILABLE substitutes of the same type and connection diameter, by geometry "
+                              "(diameter, length, radius, angle), nearest first",
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"Maximum substitutes (default {TOOL_SUBSTITUTE_DEFAULT_LIMIT}, max {TOOL_SUBSTITUTE_MAX_LIMIT})", type=openapi.TYPE_INTEGER, required=False),
+        ],
+        tags=['Tools']
+    )
+    @action(detail=True, methods=['get'])
+    def substitutes(self, request, stock_code=None):
+        tool = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', TOOL_SUBSTITUTE_DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        limit = min(max(limit, 1), TOOL_SUBSTITUTE_MAX_LIMIT)
+        # The index can be INDEX_MAX_AGE stale: over-fetch and keep the tools still AVAILABLE
+        matches = find_substitutes(tool, TOOL_SUBSTITUTE_MAX_LIMIT)
+        tools = Tool.objects.filter(status=ToolHolderStatus.AVAILABLE).in_bulk(
+            [stock_code for stock_code, _ in matches], field_name='stock_code'
+        )
+        results = []
+        for stock_code, distance in matches:
+            if stock_code in tools:
+                results.append({**self.get_serializer(tools[stock_code]).data, 'distance': distance})
+            if len(results) == limit:
+                break
+        return Response(results)
+
+class HolderViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Holder.objects.all()
     serializer_class = HolderSerializer
     lookup_field = 'stock_code'
@@ -552,12 +1007,55 @@ class HolderViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(row=row, column=column)
         return queryset
 
-class FixtureViewSet(viewsets.ModelViewSet):
+class CribLayoutViewSet(viewsets.ViewSet):
+    """
+    Tool crib tables: the tables with their counts, the dense position grid
+    of one table, and where a tool or holder is by stock code.
+    """
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'table_id'
+    lookup_value_regex = '[0-9a-fA-F-]{32,36}'
+
+    @swagger_auto_schema(
+        operation_description="Crib tables with tool and holder counts and grid extent",
+        tags=['Tool Crib']
+    )
+    def list(self, request):
+        return Response(crib_tables())
+
+    @swagger_auto_schema(
+        operation_description="Dense row/column grid of a crib table with the tools and holders in each position and their status",
+        tags=['Tool Crib']
+    )
+    def retrieve(self, request, table_id=None):
+        layout = crib_layout(table_id)
+        if layout is None:
+            raise NotFound('No tools or holders on this table')
+        return Response(layout)
+
+    @swagger_auto_schema(
+        operation_description="Crib table, row and column of a tool or holder",
+        manual_parameters=[
+            openapi.Parameter('stock_code', openapi.IN_QUERY, description="Tool or holder stock code", type=openapi.TYPE_STRING, required=True),
+        ],
+        tags=['Tool Crib']
+    )
+    @action(detail=False, methods=['get'])
+    def locate(self, request):
+        stock_code = request.query_params.get('stock_code', '').strip()
+        if not stock_code:
+            raise ValidationError({'stock_code': 'This parameter is required.'})
+        position = locate(stock_code)
+        if position is None:
+            raise NotFound(f'No tool or holder with stock code {stock_code}')
+        return Response(position)
+
+class FixtureViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Fixture.objects.all()
     serializer_class = FixtureSerializer
     permission_classes = [IsAuthenticated]
 
-class ControlGaugeViewSet(viewsets.ModelViewSet):
+class ControlGaugeViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = ControlGauge.objects.all()
     serializer_class = ControlGaugeSerializer
     permission_classes = [IsAuthenticated]
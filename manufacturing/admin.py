@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     ManufacturingProcess, Machine, ProductWorkflow, ProcessConfig,
     WorkOrder, SubWorkOrder, SubWorkOrderProcess, WorkOrderOutput,
-    BOM, BOMComponent
+    BOM, BOMComponent, ResourceReservation
 )
 
 @admin.register(ManufacturingProcess)
@@ -86,7 +86,7 @@ class SubWorkOrderAdmin(admin.ModelAdmin):
         'bom_component__product__product_code'
     ]
     inlines = [SubWorkOrderProcessInline, WorkOrderOutputInline]
-    readonly_fields = ['completion_percentage']
+    readonly_fields = ['completion_percentage', 'blanks_cut_at']
 
 @admin.register(WorkOrder)
 class WorkOrderAdmin(admin.ModelAdmin):
@@ -188,3 +188,11 @@ class BOMComponentAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         obj.modified_by = request.user
         super().save_model(request, obj, form, change)
+
+@admin.register(ResourceReservation)
+class ResourceReservationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tool', 'fixture', 'control_gauge', 'process', 'starts_at', 'ends_at', 'status']
+    list_filter = ['status']
+    search_fields = ['tool__stock_code', 'fixture__code', 'control_gauge__stock_code', 'notes']
+    raw_id_fields = ['tool', 'fixture', 'control_gauge', 'process']
+    ordering = ['-starts_at']
@@ -0,0 +1,300 @@
+"""
+Cutting plans for bar stock (one-dimensional cutting stock).
+
+Released sub work orders whose product has a blank_material need `quantity`
+blanks of blank_length_mm each. Blanks are packed into stock bars of the
+material's bar_length_mm with first-fit decreasing, then a local search tries
+to empty the least-filled bar by moving its blanks into the spare length of
+the others or by repacking it together with two other bars into those two. Fewer bars means less
+scrap and fewer bars to buy; the scrap that remains ends up concentrated in
+one offcut.
+
+Bar stock is counted per bar (piece units) or by length (mm, cm, m); a bar
+takes up bar_length_mm of length stock. Materials stocked in any other unit,
+such as kg, cannot be converted to bars: their plans are built but show no
+stock figures and are never applied.
+
+Applying a plan records one OUT InventoryTransaction per material for the
+bars consumed and stamps the sub work orders as cut, all in bulk.
+"""
+import math
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from erp_core.reference import units_of_measure
+from inventory.models import InventoryTransaction, RawMaterial
+from inventory.reservations import RESERVING_WORK_ORDER_STATUSES
+from .models import SubWorkOrder
+
+DEFAULT_KERF_MM = 3.0
+DEFAULT_BAR_LENGTH_MM = 6000.0
+# Upper bound on local search moves per material
+MAX_IMPROVEMENT_ROUNDS = 1000
+# Emptiest bars tried pairwise when repacking the least-filled bar away
+REPACK_CANDIDATES = 8
+# Unit codes of bar stock counted per bar, and of stock counted by length (mm per unit)
+PIECE_UNITS = {'PCS', 'PC', 'ADET', 'AD', 'EA'}
+LENGTH_UNITS_MM = {'MM': 1, 'CM': 10, 'M': 1000}
+
+
+class Bar:
+    __slots__ = ('capacity', 'pieces', 'load')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.pieces = []
+        self.load = 0.0
+
+    @property
+    def free(self):
+        return self.capacity - self.load
+
+    def add(self, piece):
+        self.pieces.append(piece)
+        self.load += piece[0]
+
+    def remove(self, piece):
+        self.pieces.remove(piece)
+        self.load -= piece[0]
+
+
+def first_fit_decreasing(pieces, capacity):
+    """Pack (length, sub_work_order_id) pieces into bars, longest first."""
+    bars = []
+    for piece in sorted(pieces, key=lambda piece: piece[0], reverse=True):
+        for bar in bars:
+            if bar.free >= piece[0]:
+                bar.add(piece)
+                break
+        else:
+            bar = Bar(capacity)
+            bar.add(piece)
+            bars.append(bar)
+    return bars
+
+
+def _redistribute(weakest, others):
+    """Move every piece of `weakest` into the others (best fit), or change nothing."""
+    free = [bar.free for bar in others]
+    placement = []
+    for piece in sorted(weakest.pieces, key=lambda piece: piece[0], reverse=True):
+        fitting = [i for i, space in enumerate(free) if space >= piece[0]]
+        if not fitting:
+            return False
+        target = min(fitting, key=lambda i: free[i])
+        free[target] -= piece[0]
+        placement.append((piece, target))
+    for piece, target in placement:
+        others[target].add(piece)
+    weakest.pieces, weakest.load = [], 0.0
+    return True
+
+
+def _fullest_subset(pieces, capacity):
+    """Indexes of the pieces that fill one bar the most (subset sum over whole millimetres)."""
+    best = {0: ()}
+    for index, piece in enumerate(pieces):
+        size = math.ceil(piece[0])
+        for total, chosen in list(best.items()):
+            if total + size <= capacity and total + size not in best:
+                best[total + size] = chosen + (index,)
+    return set(best[max(best)])
+
+
+def _refill(bar, rest, pieces, chosen):
+    bar.pieces, rest.pieces = [], []
+    bar.load = rest.load = 0.0
+    for index, piece in enumerate(pieces):
+        (bar if index in chosen else rest).add(piece)
+
+
+def _empty_into_two(weakest, others):
+    """
+    Repack the weakest bar together with two of the emptiest other bars into
+    those two bars, if their pieces fit.
+    """
+    candidates = sorted(others, key=lambda bar: bar.load)[:REPACK_CANDIDATES]
+    for i, first in enumerate(candidates):
+        for second in candidates[i + 1:]:
+            pieces = weakest.pieces + first.pieces + second.pieces
+            if sum(piece[0] for piece in pieces) > first.capacity + second.capacity:
+                continue
+            chosen = _fullest_subset(pieces, first.capacity)
+            if sum(piece[0] for index, piece in enumerate(pieces) if index not in chosen) <= second.capacity:
+                _refill(first, second, pieces, chosen)
+                weakest.pieces, weakest.load = [], 0.0
+                return True
+    return False
+
+
+def _shift_load(weakest, others):
+    """
+    Refill one other bar from its own and the weakest bar's pieces so it holds
+    as much as possible, leaving the rest in the weakest bar. Applies the
+    first such repack that moves any length out of the weakest bar.
+    """
+    for bar in others:
+        pieces = weakest.pieces + bar.pieces
+        chosen = _fullest_subset(pieces, bar.capacity)
+        if sum(pieces[index][0] for index in chosen) > bar.load + 1e-6:
+            _refill(bar, weakest, pieces, chosen)
+            return True
+    return False
+
+
+def improve(bars, max_rounds=MAX_IMPROVEMENT_ROUNDS):
+    """
+    Local search on the least-filled bar: move its pieces into the spare
+    length of the others, or repack it with two other bars into those two;
+    failing both, shift its length into a fuller bar and try again. Every
+    shift moves length out of the least-filled bar, so this ends.
+    """
+    for _ in range(max_rounds):
+        if len(bars) < 2:
+            break
+        bars.sort(key=lambda bar: bar.load)
+        weakest, others = bars[0], bars[1:]
+        if _redistribute(weakest, others) or _empty_into_two(weakest, others):
+            bars = others
+        elif not _shift_load(weakest, others):
+            break
+    return sorted(bars, key=lambda bar: bar.load, reverse=True)
+
+
+def stock_per_bar(material, bar_length):
+    """
+    Stock quantity, in the material's unit, that one bar takes up, or None
+    when the unit is neither a count nor a length.
+    """
+    unit_code = (units_of_measure.key_for(material.unit_id) or '').upper()
+    if unit_code in PIECE_UNITS:
+        return Decimal(1)
+    if unit_code in LENGTH_UNITS_MM:
+        return Decimal(str(bar_length)) / LENGTH_UNITS_MM[unit_code]
+    return None
+
+
+def pending_sub_work_orders(material_ids=None):
+    """Released sub work orders with bar blanks that have not been cut yet."""
+    sub_work_orders = SubWorkOrder.objects.filter(
+        status__in=RESERVING_WORK_ORDER_STATUSES,
+        blanks_cut_at__isnull=True,
+        bom_component__product__blank_material__isnull=False,
+        bom_component__product__blank_length_mm__gt=0,
+        quantity__gt=0,
+    )
+    if material_ids:
+        sub_work_orders = sub_work_orders.filter(bom_component__product__blank_material__in=material_ids)
+    return sub_work_orders
+
+
+def build_cutting_plans(sub_work_orders, kerf=DEFAULT_KERF_MM):
+    """
+    Cutting plan per bar material for the given sub work orders.
+
+    Returns:
+        list of plan dicts, one per material: the bars with their cuts and
+        offcut, bars taken from stock, bars to buy, scrap and yield, and the
+        sub work orders covered or skipped as longer than a bar
+    """
+    rows = sub_work_orders.values_list(
+        'id', 'quantity', 'bom_component__product__blank_material_id', 'bom_component__product__blank_length_mm'
+    )
+
+    demand = defaultdict(list)
+    for sub_work_order_id, quantity, material_id, blank_length in rows:
+        demand[material_id].append((sub_work_order_id, quantity, blank_length))
+
+    materials = RawMaterial.objects.in_bulk(list(demand))
+    plans = []
+    for material_id, requirements in demand.items():
+        material = materials[material_id]
+        capacity = material.bar_length_mm or DEFAULT_BAR_LENGTH_MM
+        pieces, oversized = [], []
+        for sub_work_order_id, quantity, blank_length in requirements:
+            if blank_length + kerf > capacity:
+                oversized.append(sub_work_order_id)
+                continue
+            pieces.extend([(blank_length + kerf, sub_work_order_id)] * quantity)
+
+        bars = improve(first_fit_decreasing(pieces, capacity))
+        per_bar = stock_per_bar(material, capacity)
+        in_stock = max(int(math.floor(material.available_stock / per_bar)), 0) if per_bar else None
+        used_length = sum(piece[0] - kerf for bar in bars for piece in bar.pieces)
+        scrap = sum(bar.capacity for bar in bars) - used_length
+        plans.append({
+            'material_id': material.id,
+            'material_code': material.material_code,
+            'bar_length_mm': capacity,
+            'kerf_mm': kerf,
+            'stock_unit': units_of_measure.key_for(material.unit_id),
+            'stock_per_bar': per_bar,
+            'blank_count': len(pieces),
+            'bar_count': len(bars),
+            'bars_from_stock': min(len(bars), in_stock) if per_bar else None,
+            'bars_to_buy': max(len(bars) - in_stock, 0) if per_bar else None,
+            'scrap_mm': round(scrap, 2),
+            'yield_percent': round(100 * used_length / (len(bars) * capacity), 2) if bars else None,
+            'sub_work_order_ids': sorted({piece[1] for piece in pieces}),
+            'oversized_sub_work_order_ids': oversized,
+            'bars': [{
+                'cuts': [{'sub_work_order_id': sub_work_order_id, 'length_mm': length - kerf}
+                         for length, sub_work_order_id in bar.pieces],
+                'offcut_mm': round(bar.free, 2),
+            } for bar in bars],
+        })
+    return plans
+
+
+def apply_cutting_plans(plans, user):
+    """
+    Consume the planned bars from stock and mark their sub work orders as cut.
+    Plans that need bars to be bought first, or whose stock unit cannot be
+    converted to bars, are left out.
+    """
+    applicable = [plan for plan in plans if plan['bar_count'] and plan['bars_to_buy'] == 0]
+    reference = f"CUT-{timezone.now():%Y%m%d%H%M%S}"
+    InventoryTransaction.objects.bulk_create([
+        InventoryTransaction(
+            material_id=plan['material_id'],
+            quantity_change=-plan['bar_count'] * plan['stock_per_bar'],
+            transaction_type='OUT',
+            performed_by=user,
+            reference_id=reference,
+            notes=f"Bar cutting for sub work orders {', '.join(map(str, plan['sub_work_order_ids']))}",
+        ) for plan in applicable
+    ])
+    # bulk_create skips InventoryTransaction.save, so move the stock here
+    for plan in applicable:
+        RawMaterial.objects.filter(pk=plan['material_id']).update(
+            current_stock=F('current_stock') - plan['bar_count'] * plan['stock_per_bar']
+        )
+    SubWorkOrder.objects.filter(
+        id__in=[sub_work_order_id for plan in applicable for sub_work_order_id in plan['sub_work_order_ids']]
+    ).update(blanks_cut_at=timezone.now())
+    return {
+        'reference_id': reference,
+        'applied_material_ids': [plan['material_id'] for plan in applicable],
+        'skipped_material_ids': [plan['material_id'] for plan in plans if plan not in applicable],
+    }
+
+
+def cut_blanks(user, kerf=DEFAULT_KERF_MM, material_ids=None):
+    """
+    Plan and apply the cuts for all pending sub work orders in one transaction.
+
+    The sub work orders are locked first, so concurrent runs never consume
+    bars for the same blanks twice.
+
+    Returns:
+        dict with the applied and skipped material ids and the plans
+    """
+    with transaction.atomic():
+        ids = list(pending_sub_work_orders(material_ids).select_for_update(of=('self',)).values_list('id', flat=True))
+        plans = build_cutting_plans(SubWorkOrder.objects.filter(id__in=ids), kerf)
+        result = apply_cutting_plans(plans, user)
+    return {**result, 'plans': plans}
@@ -0,0 +1,162 @@
+"""
+ZIP bundles of the current drawings of a work order's exploded BOM.
+
+The BOM is exploded in the database: a recursive query walks from the work
+order's BOM through each component product's active BOM, and the current
+TechnicalDrawing of every product reached is fetched in the same query.
+
+The archive is written on the fly while it streams to the client. The next
+PREFETCH drawings are downloaded in background threads while the current
+one is written, each into a spooled temporary file that moves to disk past
+SPOOL_SIZE, so memory stays bounded whatever the size of the drawings.
+"""
+import logging
+import posixpath
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db.models.expressions import RawSQL
+from django.utils.text import get_valid_filename
+
+from inventory.models import TechnicalDrawing
+from .models import BOM, BOMComponent
+
+logger = logging.getLogger(__name__)
+
+# Sub-assembly levels followed; also stops cycles in the BOM data
+MAX_DEPTH = 20
+PREFETCH = 4
+SPOOL_SIZE = 8 * 1024 * 1024
+READ_CHUNK = 1024 * 1024
+# Formats that are compressed already and are stored as they are
+STORED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg', '.webp', '.tif', '.tiff', '.zip', '.dwg'}
+
+
+def _exploded_products(bom_id):
+    bom_table = BOM._meta.db_table
+    component_table = BOMComponent._meta.db_table
+    sql = f"""
+        WITH RECURSIVE parts (product_id, bom_id, depth) AS (
+            SELECT product_id, id, 0 FROM {bom_table} WHERE id = %s
+            UNION
+            SELECT component.product_id, (
+                SELECT sub_bom.id FROM {bom_table} sub_bom
+                WHERE sub_bom.product_id = component.product_id AND sub_bom.is_active = %s
+                ORDER BY sub_bom.is_approved DESC, sub_bom.created_at DESC LIMIT 1
+            ), parts.depth + 1
+            FROM parts JOIN {component_table} component ON component.bom_id = parts.bom_id
+            WHERE parts.depth < %s
+        )
+        SELECT product_id FROM parts
+    """
+    return RawSQL(sql, (bom_id, True, MAX_DEPTH))
+
+
+def bundle_drawings(work_order):
+    """Current drawings of every product in the work order's exploded BOM."""
+    return TechnicalDrawing.objects.filter(
+        product_id__in=_exploded_products(work_order.bom_id), is_current=True
+    ).exclude(drawing_file__isnull=True).exclude(drawing_file='').select_related('product').order_by(
+        'product__product_code', 'version'
+    )
+
+
+def _entry_name(drawing, taken):
+    extension = posixpath.splitext(drawing.drawing_file.name)[1].lower()
+    stem = get_valid_filename(f"{drawing.product.product_code}_{drawing.drawing_code}_v{drawing.version}")
+    name, suffix = f"{stem}{extension}", 1
+    while name in taken:
+        suffix += 1
+        name = f"{stem}_{suffix}{extension}"
+    taken.add(name)
+    return name
+
+
+def _chunks(storage, name):
+    if hasattr(storage, 'bucket_name') and hasattr(storage, 'connection'):
+        # Stream the object body; opening it through the storage would
+        # first buffer the whole object in memory
+        client = storage.connection.meta.client
+        body = client.get_object(Bucket=storage.bucket_name, Key=storage._normalize_name(name))['Body']
+        yield from body.iter_chunks(READ_CHUNK)
+    else:
+        with storage.open(name, 'rb') as source:
+            yield from source.chunks(READ_CHUNK)
+
+
+def _fetch(drawing):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        for chunk in _chunks(drawing.drawing_file.storage, drawing.drawing_file.name):
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+class _Output:
+    """Write-only file the archive is written to, drained after each write."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stream_zip(drawings):
+    """
+    Yield a ZIP archive of the drawings piece by piece. Drawings that cannot
+    be read are left out and listed in MISSING.txt, as the response is
+    already under way by then.
+    """
+    drawings = list(drawings)
+    output = _Output()
+    taken, missing = set(), []
+    executor = ThreadPoolExecutor(max_workers=PREFETCH)
+    pending = [executor.submit(_fetch, drawing) for drawing in drawings[:PREFETCH]]
+    try:
+        with zipfile.ZipFile(output, 'w', allowZip64=True) as archive:
+            for index, drawing in enumerate(drawings):
+                future = pending.pop(0)
+                if index + PREFETCH < len(drawings):
+                    pending.append(executor.submit(_fetch, drawings[index + PREFETCH]))
+                try:
+                    source = future.result()
+                except Exception:
+                    logger.warning("Could not read drawing %s for the bundle", drawing.pk, exc_info=True)
+                    missing.append(drawing.drawing_file.name)
+                    continue
+
+                name = _entry_name(drawing, taken)
+                info = zipfile.ZipInfo(name, date_time=drawing.modified_at.timetuple()[:6])
+                stored = posixpath.splitext(name)[1] in STORED_EXTENSIONS
+                info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                with source, archive.open(info, 'w', force_zip64=True) as entry:
+                    while chunk := source.read(READ_CHUNK):
+                        entry.write(chunk)
+                        if output.buffer:
+                            yield output.drain()
+                yield output.drain()
+
+            if missing:
+                archive.writestr('MISSING.txt', '\n'.join(missing) + '\n')
+        yield output.drain()
+    finally:
+        # Also reached when the client disconnects mid-download
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in pending:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                future.result().close()
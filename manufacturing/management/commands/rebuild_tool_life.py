@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from manufacturing.tool_life import life_dashboard, rebuild_tool_life
+
+class Command(BaseCommand):
+    help = 'Recount tool usage (parts produced, cutting minutes) from work order outputs and completed processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', action='store_true',
+                            help='List the tools due for replacement afterwards')
+
+    def handle(self, *args, **options):
+        count = rebuild_tool_life()
+        self.stdout.write(self.style.SUCCESS(f"Recounted usage of {count} tools"))
+
+        if options['report']:
+            dashboard = life_dashboard(warning_only=True)
+            for row in dashboard['tools']:
+                self.stdout.write(
+                    f"{row['stock_code']:<30} {row['life_state']:<8} {row['life_used_percent']:>6}% "
+                    f"replace by {row['predicted_replacement_at'] or '-'}"
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"{dashboard['warning']} tools near their life limit, {dashboard['expired']} past it"
+            ))
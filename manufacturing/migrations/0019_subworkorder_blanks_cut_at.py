@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0018_remove_processconfig_stock_code_historicalbom_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subworkorder',
+            name='blanks_cut_at',
+            field=models.DateTimeField(blank=True, help_text='When the blanks for this sub work order were cut from bar stock', null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:35
+
+import django.contrib.postgres.constraints
+import django.db.models.deletion
+import django.utils.timezone
+import manufacturing.models
+from django.conf import settings
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_crib_position_indexes'),
+        ('manufacturing', '0019_subworkorder_blanks_cut_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.CreateModel(
+            name='ResourceReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('RELEASED', 'Released')], default='ACTIVE', max_length=20)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('control_gauge', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='inventory.controlgauge')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_created', to=settings.AUTH_USER_MODEL)),
+                ('fixture', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='inventory.fixture')),
+                ('modified_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(class)s_modified', to=settings.AUTH_USER_MODEL)),
+                ('process', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resource_reservations', to='manufacturing.subworkorderprocess')),
+                ('tool', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='inventory.tool')),
+            ],
+            options={
+                'ordering': ['starts_at'],
+                'indexes': [models.Index(fields=['process'], name='manufacturi_process_542040_idx'), models.Index(fields=['status', 'starts_at'], name='manufacturi_status_57ed6a_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('control_gauge__isnull', True), ('fixture__isnull', True), ('tool__isnull', False)), models.Q(('control_gauge__isnull', True), ('fixture__isnull', False), ('tool__isnull', True)), models.Q(('control_gauge__isnull', False), ('fixture__isnull', True), ('tool__isnull', True)), _connector='OR'), name='resource_reservation_one_resource'), models.CheckConstraint(condition=models.Q(('ends_at__isnull', True), ('ends_at__gt', models.F('starts_at')), _connector='OR'), name='resource_reservation_ends_after_start'), django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status', 'ACTIVE'), ('tool__isnull', False)), expressions=[('tool', '='), (manufacturing.models.TsTzRange('starts_at', 'ends_at'), '&&')], name='tool_reservation_no_overlap'), django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('fixture__isnull', False), ('status', 'ACTIVE')), expressions=[('fixture', '='), (manufacturing.models.TsTzRange('starts_at', 'ends_at'), '&&')], name='fixture_reservation_no_overlap'), django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('control_gauge__isnull', False), ('status', 'ACTIVE')), expressions=[('control_gauge', '='), (manufacturing.models.TsTzRange('starts_at', 'ends_at'), '&&')], name='control_gauge_reservation_no_overlap')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0020_resource_reservations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machine',
+            name='last_calibration_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='next_calibration_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['next_calibration_date'], name='manufacturi_next_ca_8c6243_idx'),
+        ),
+    ]
@@ -1,11 +1,14 @@
-from django.db import models
-from django.contrib.postgres.fields import ArrayField
+from django.db import models, transaction
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import ArrayField, DateTimeRangeField, RangeOperators
 from django.core.exceptions import ValidationError
 from erp_core.models import BaseModel, User, Customer, ProductType, ComponentType, MachineStatus, WorkOrderStatus
+from erp_core.reference import inventory_categories
 from sales.models import SalesOrderItem
 from datetime import datetime, timedelta
 from django.db.models import Q
 from django.db.models.query import QuerySet
+from model_utils import FieldTracker
 from model_utils.managers import InheritanceManager
 from django.utils import timezone
 import uuid # Ensure uuid is imported if not already present
@@ -67,11 +70,15 @@ class Machine(BaseModel):
     last_maintenance_date = models.DateField(null=True, blank=True)
     next_maintenance_date = models.DateField(null=True, blank=True)
     maintenance_notes = models.TextField(blank=True, null=True)
+    # Kept from the latest quality_control.CalibrationRecord of the machine
+    last_calibration_date = models.DateField(null=True, blank=True, editable=False)
+    next_calibration_date = models.DateField(null=True, blank=True, editable=False)
 
     class Meta:
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['machine_type']),
+            models.Index(fields=['next_calibration_date']),
         ]
 
     def __str__(self):
@@ -864,6 +871,10 @@ class SubWorkOrder(BaseModel):
         blank=True,
         related_name='assigned_sub_work_orders'
     )
+    blanks_cut_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="When the blanks for this sub work order were cut from bar stock"
+    )
 
     class Meta:
         indexes = [
@@ -941,12 +952,12 @@ class SubWorkOrder(BaseModel):
             if component.material.product_type == ProductType.SEMI:
                 # For Semi or Single products using process components the finished goods
                 # (raw processed items) should go to the 'PROSES' category.
-                if self.target_category.name != 'PROSES':
+                if inventory_categories.key_for(self.target_category_id) != 'PROSES':
                     raise ValidationError("Processed Semi/Single products must target Proses category")
             elif component.material.product_type == ProductType.MONTAGED:
                 # For Montaged product BOMs the product components (usually Semi sub–assemblies)
                 # should target the 'MAMUL' category.
-                if self.target_category.name != 'MAMUL':
+                if inventory_categories.key_for(self.target_category_id) != 'MAMUL':
                     raise ValidationError("Montaged product components must target Mamul category")
 
     def save(self, *args, **kwargs):
@@ -1031,26 +1042,43 @@ class SubWorkOrderProcess(models.Model):
         Returns:
             bool: True if status was updated, False otherwise
         """
-        old_status = self.status
-        self.status = new_status
+        from .resources import (
+            claim_process_resources, release_process_resources, ResourceConflict, conflict_message
+        )
+        from .tool_life import cutting_minutes, record_cutting_minutes
+
         now = timezone.now()
-        
-        # Update timestamps based on status
-        if new_status == 'SETUP' and old_status == 'PENDING':
-            self.start_time = now
-            if user:
-                self.operator = user
-        elif new_status == 'RUNNING' and old_status == 'SETUP':
-            # Calculate setup time
-            if self.start_time:
-                self.setup_time_minutes = int((now - self.start_time).total_seconds() / 60)
-        elif new_status == 'COMPLETED':
-            self.end_time = now
-            # Calculate actual duration
-            if self.start_time:
-                self.actual_duration_minutes = int((now - self.start_time).total_seconds() / 60)
-                
-        self.save()
+        with transaction.atomic():
+            # Hold the configured tool, fixture and gauge while the process runs
+            if new_status == 'SETUP' and self.status == 'PENDING':
+                try:
+                    claim_process_resources(self, now, user)
+                except ResourceConflict as e:
+                    raise ValidationError(conflict_message(e.conflicts))
+            elif new_status in ('COMPLETED', 'FAILED'):
+                release_process_resources(self, now)
+
+            old_status = self.status
+            self.status = new_status
+
+            # Update timestamps based on status
+            if new_status == 'SETUP' and old_status == 'PENDING':
+                self.start_time = now
+                if user:
+                    self.operator = user
+            elif new_status == 'RUNNING' and old_status == 'SETUP':
+                # Calculate setup time
+                if self.start_time:
+                    self.setup_time_minutes = int((now - self.start_time).total_seconds() / 60)
+            elif new_status == 'COMPLETED':
+                self.end_time = now
+                # Calculate actual duration
+                if self.start_time:
+                    self.actual_duration_minutes = int((now - self.start_time).total_seconds() / 60)
+                if old_status != 'COMPLETED' and self.process_config_id:
+                    record_cutting_minutes(self.process_config.tool_id, cutting_minutes(self), now)
+
+            self.save()
         
         # Update sub work order completion percentage
         self._update_sub_work_order_completion()
@@ -1078,6 +1106,68 @@ class SubWorkOrderProcess(models.Model):
     def __str__(self):
         return f"Process {self.sequence_order} for {self.sub_work_order}"
 
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+class ResourceReservationStatus(models.TextChoices):
+    ACTIVE = 'ACTIVE', 'Active'
+    RELEASED = 'RELEASED', 'Released'
+
+class ResourceReservation(BaseModel):
+    """
+    A tool, fixture or control gauge held for a time interval, usually by a
+    sub work order process. An empty end means held until released.
+
+    Exclusion constraints keep the active intervals of one physical resource
+    from overlapping, whoever writes them.
+    """
+    tool = models.ForeignKey('inventory.Tool', on_delete=models.PROTECT, null=True, blank=True, related_name='reservations')
+    fixture = models.ForeignKey('inventory.Fixture', on_delete=models.PROTECT, null=True, blank=True, related_name='reservations')
+    control_gauge = models.ForeignKey('inventory.ControlGauge', on_delete=models.PROTECT, null=True, blank=True, related_name='reservations')
+    process = models.ForeignKey(
+        SubWorkOrderProcess, on_delete=models.CASCADE, null=True, blank=True, related_name='resource_reservations'
+    )
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=ResourceReservationStatus.choices, default=ResourceReservationStatus.ACTIVE)
+    notes = models.TextField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['starts_at']
+        indexes = [
+            models.Index(fields=['process']),
+            models.Index(fields=['status', 'starts_at']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(tool__isnull=False, fixture__isnull=True, control_gauge__isnull=True) |
+                    models.Q(tool__isnull=True, fixture__isnull=False, control_gauge__isnull=True) |
+                    models.Q(tool__isnull=True, fixture__isnull=True, control_gauge__isnull=False)
+                ),
+                name='resource_reservation_one_resource',
+            ),
+            models.CheckConstraint(
+                condition=models.Q(ends_at__isnull=True) | models.Q(ends_at__gt=models.F('starts_at')),
+                name='resource_reservation_ends_after_start',
+            ),
+        ] + [
+            ExclusionConstraint(
+                name=f'{field}_reservation_no_overlap',
+                expressions=[
+                    (field, RangeOperators.EQUAL),
+                    (TsTzRange('starts_at', 'ends_at'), RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(status=ResourceReservationStatus.ACTIVE, **{f'{field}__isnull': False}),
+            )
+            for field in ('tool', 'fixture', 'control_gauge')
+        ]
+
+    def __str__(self):
+        resource = self.tool or self.fixture or self.control_gauge
+        return f"{resource} {self.starts_at:%Y-%m-%d %H:%M} - {self.ends_at or 'open'}"
+
 class WorkOrderOutput(BaseModel):
     """
     Records the output of work orders and manages inventory categorization.
@@ -1098,6 +1188,7 @@ class WorkOrderOutput(BaseModel):
     inspection_required = models.BooleanField(default=False, help_text="Whether quality inspection is required")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_outputs')
     production_date = models.DateField(default=timezone.now)
+    tracker = FieldTracker(fields=['quantity', 'sub_work_order'])
 
     class Meta:
         indexes = [
@@ -1136,11 +1227,11 @@ class WorkOrderOutput(BaseModel):
         if self.status == 'GOOD':
             # Target category validation will be handled in the model's clean method
             pass
-        elif self.status == 'REWORK' and self.target_category.name != 'KARANTINA':
+        elif self.status == 'REWORK' and inventory_categories.key_for(self.target_category_id) != 'KARANTINA':
             raise ValidationError("Items needing rework must go to Karantina")
-        elif self.status == 'SCRAP' and self.target_category.name != 'HURDA':
+        elif self.status == 'SCRAP' and inventory_categories.key_for(self.target_category_id) != 'HURDA':
             raise ValidationError("Scrap items must go to Hurda")
-        elif self.status == 'QUARANTINE' and self.target_category.name != 'KARANTINA':
+        elif self.status == 'QUARANTINE' and inventory_categories.key_for(self.target_category_id) != 'KARANTINA':
             raise ValidationError("Quarantined items must go to Karantina category")
 
     def save(self, *args, **kwargs):
@@ -0,0 +1,183 @@
+"""
+Time-interval reservations of tools, fixtures and control gauges.
+
+The database enforces that active reservations of one resource never
+overlap (ResourceReservation's exclusion constraints). find_conflicts()
+checks a whole batch of requested intervals before writing: one query per
+resource kind fetches the active reservations of the requested resources
+inside the batch's time window, then a sweep over each resource's intervals
+sorted by start reports every overlap, against existing reservations and
+within the batch itself.
+
+A request is a dict with 'resource' (one of RESOURCE_FIELDS),
+'resource_id', 'starts_at', 'ends_at' (None for open-ended) and optionally
+'process_id'.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ResourceReservation, ResourceReservationStatus, SubWorkOrderProcess
+
+RESOURCE_FIELDS = ('tool', 'fixture', 'control_gauge')
+_END_OF_TIME = datetime.max.replace(tzinfo=dt_timezone.utc)
+
+
+class ResourceConflict(Exception):
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f"{len(conflicts)} resource reservation conflict(s)")
+
+
+def _end(value):
+    return value or _END_OF_TIME
+
+
+def _existing(field, resource_ids, window_start, window_end):
+    reservations = ResourceReservation.objects.filter(
+        Q(ends_at__isnull=True) | Q(ends_at__gt=window_start),
+        status=ResourceReservationStatus.ACTIVE,
+        **{f'{field}__in': resource_ids},
+    )
+    if window_end is not None:
+        reservations = reservations.filter(starts_at__lt=window_end)
+    return reservations.values_list('id', f'{field}_id', 'starts_at', 'ends_at')
+
+
+def find_conflicts(requests):
+    """
+    Overlaps of the requested intervals with active reservations and with
+    each other.
+
+    Returns:
+        list of dicts: the index of the conflicting request, its resource,
+        and the reservation id or request index it collides with
+    """
+    by_field = defaultdict(list)
+    for index, request in enumerate(requests):
+        by_field[request['resource']].append(index)
+
+    conflicts = []
+    for field, indexes in by_field.items():
+        intervals = defaultdict(list)
+        for index in indexes:
+            request = requests[index]
+            intervals[request['resource_id']].append(
+                (request['starts_at'], _end(request['ends_at']), 'request', index)
+            )
+        window_start = min(requests[index]['starts_at'] for index in indexes)
+        ends = [requests[index]['ends_at'] for index in indexes]
+        window_end = None if None in ends else max(ends)
+        for reservation_id, resource_id, starts_at, ends_at in _existing(
+            field, list(intervals), window_start, window_end
+        ):
+            intervals[resource_id].append((starts_at, _end(ends_at), 'reservation', reservation_id))
+
+        for resource_id, entries in intervals.items():
+            entries.sort(key=lambda entry: (entry[0], entry[1]))
+            # Entries still open at the current start; only they can overlap it
+            open_entries = []
+            for entry in entries:
+                open_entries = [other for other in open_entries if other[1] > entry[0]]
+                for other in open_entries:
+                    if 'request' not in (entry[2], other[2]):
+                        continue
+                    request, blocker = (entry, other) if entry[2] == 'request' else (other, entry)
+                    conflicts.append({
+                        'request': request[3],
+                        'resource': field,
+                        'resource_id': resource_id,
+                        'starts_at': request[0],
+                        'ends_at': None if request[1] == _END_OF_TIME else request[1],
+                        f'conflicting_{blocker[2]}': blocker[3],
+                    })
+                open_entries.append(entry)
+    return conflicts
+
+
+def reserve_resources(requests, user=None, notes=None):
+    """
+    Create reservations for all requests, or none of them.
+
+    Raises:
+        ResourceConflict: with the conflicts if any interval collides
+    """
+    conflicts = find_conflicts(requests)
+    if conflicts:
+        raise ResourceConflict(conflicts)
+    reservations = [
+        ResourceReservation(
+            **{f"{request['resource']}_id": request['resource_id']},
+            process_id=request.get('process_id'),
+            starts_at=request['starts_at'],
+            ends_at=request['ends_at'],
+            notes=notes,
+            created_by=user,
+            modified_by=user,
+        ) for request in requests
+    ]
+    try:
+        with transaction.atomic():
+            return ResourceReservation.objects.bulk_create(reservations, batch_size=1000)
+    except IntegrityError:
+        # Another writer took an interval after the check
+        raise ResourceConflict(find_conflicts(requests))
+
+
+def process_requests(windows):
+    """
+    Reservation requests for the tool, fixture and control gauge of each
+    process configuration, from (process_id, starts_at, ends_at) windows.
+    """
+    windows = list(windows)
+    resources = {
+        row[0]: row[1:] for row in SubWorkOrderProcess.objects.filter(
+            id__in=[process_id for process_id, _, _ in windows]
+        ).values_list('id', 'process_config__tool_id', 'process_config__fixture_id', 'process_config__control_gauge_id')
+    }
+    requests = []
+    for process_id, starts_at, ends_at in windows:
+        for field, resource_id in zip(RESOURCE_FIELDS, resources.get(process_id, ())):
+            if resource_id:
+                requests.append({
+                    'resource': field, 'resource_id': resource_id,
+                    'starts_at': starts_at, 'ends_at': ends_at, 'process_id': process_id,
+                })
+    return requests
+
+
+def claim_process_resources(process, starts_at=None, user=None):
+    """Hold the process's resources from its start until it is released."""
+    requests = process_requests([(process.pk, starts_at or timezone.now(), None)])
+    return reserve_resources(requests, user) if requests else []
+
+
+def release_reservations(reservations, at=None):
+    """
+    End active reservations at `at`; reservations that would only have
+    started later are released altogether.
+    """
+    at = at or timezone.now()
+    reservations = reservations.filter(status=ResourceReservationStatus.ACTIVE)
+    with transaction.atomic():
+        released = reservations.filter(starts_at__gte=at).update(
+            status=ResourceReservationStatus.RELEASED, modified_at=at
+        )
+        trimmed = reservations.filter(Q(ends_at__isnull=True) | Q(ends_at__gt=at)).update(ends_at=at, modified_at=at)
+    return released + trimmed
+
+
+def release_process_resources(process, at=None):
+    """Give the process's resources back from `at` on."""
+    return release_reservations(ResourceReservation.objects.filter(process=process), at)
+
+
+def conflict_message(conflicts):
+    conflict = conflicts[0]
+    resource = conflict['resource'].replace('_', ' ')
+    if 'conflicting_reservation' in conflict:
+        return f"The {resource} is already reserved (reservation {conflict['conflicting_reservation']})"
+    return f"The {resource} is requested twice for overlapping times"
@@ -3,7 +3,7 @@ from .models import (
     WorkOrder, BOM, Machine, ManufacturingProcess,
     SubWorkOrder, BOMComponent, WorkOrderOutput,
     SubWorkOrderProcess, WorkOrderStatusChange,
-    ProcessConfig, ProductWorkflow
+    ProcessConfig, ProductWorkflow, ResourceReservation
 )
 from inventory.serializers import InventoryCategorySerializer, ProductSerializer, RawMaterialSerializer
 from django.db import transaction
@@ -347,8 +347,9 @@ class SubWorkOrderSerializer(serializers.ModelSerializer):
             'quantity', 'planned_start', 'planned_end', 'actual_start',
             'actual_end', 'status', 'output_quantity', 'scrap_quantity',
             'target_category', 'notes', 'completion_percentage', 'assigned_to',
-            'processes', 'created_at', 'updated_at'
+            'blanks_cut_at', 'processes', 'created_at', 'updated_at'
         ]
+        read_only_fields = ['blanks_cut_at']
 
     def get_bom_component_details(self, obj):
         component = obj.bom_component
@@ -584,4 +585,33 @@ class WorkflowWithConfigsSerializer(serializers.ModelSerializer):
         for config_data in process_configs_data:
             ProcessConfig.objects.create(workflow=workflow, **config_data)
 
-        return workflow
\ No newline at end of file
+        return workflow
+class ResourceReservationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ResourceReservation
+        fields = [
+            'id', 'tool', 'fixture', 'control_gauge', 'process',
+            'starts_at', 'ends_at', 'status', 'notes', 'created_at'
+        ]
+        read_only_fields = ['status', 'created_at']
+
+    def validate(self, data):
+        resources = [field for field in ('tool', 'fixture', 'control_gauge') if data.get(field)]
+        if len(resources) != 1:
+            raise serializers.ValidationError(
+                "Exactly one of tool, fixture or control gauge must be specified"
+            )
+        if data.get('ends_at') and data['ends_at'] <= data['starts_at']:
+            raise serializers.ValidationError("ends_at must be after starts_at")
+        data['resource'] = resources[0]
+        return data
+
+class ProcessWindowSerializer(serializers.Serializer):
+    process = serializers.PrimaryKeyRelatedField(queryset=SubWorkOrderProcess.objects.all())
+    starts_at = serializers.DateTimeField()
+    ends_at = serializers.DateTimeField(required=False, allow_null=True)
+
+    def validate(self, data):
+        if data.get('ends_at') and data['ends_at'] <= data['starts_at']:
+            raise serializers.ValidationError("ends_at must be after starts_at")
+        return data
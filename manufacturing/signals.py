@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from .models import WorkOrderOutput, Machine, WorkOrder, SubWorkOrderProcess, WorkOrderStatusChange
 from inventory.models import InventoryTransaction
+from inventory.reservations import sync_work_order_reservations
+from .tool_life import process_tool_ids, record_parts
 
 @receiver(post_save, sender=WorkOrderOutput)
 def update_inventory_on_output(sender, instance, created, **kwargs):
@@ -36,6 +38,28 @@ def update_inventory_on_output(sender, instance, created, **kwargs):
             to_category=instance.target_category
         ) 
 
+@receiver(post_save, sender=WorkOrderOutput)
+def record_tool_wear_on_output(sender, instance, created, **kwargs):
+    """Count the produced parts, or the change in them, against the tools of the sub work order's processes"""
+    if created:
+        record_parts(process_tool_ids(instance.sub_work_order_id), instance.quantity)
+        return
+    previous_quantity = instance.tracker.previous('quantity')
+    if instance.tracker.has_changed('sub_work_order'):
+        previous_sub_work_order = instance.tracker.previous('sub_work_order')
+        record_parts(process_tool_ids(previous_sub_work_order), -previous_quantity, recorded_at=instance.created_at)
+        record_parts(process_tool_ids(instance.sub_work_order_id), instance.quantity)
+    elif instance.tracker.has_changed('quantity'):
+        record_parts(
+            process_tool_ids(instance.sub_work_order_id), instance.quantity - previous_quantity,
+            recorded_at=instance.created_at
+        )
+
+@receiver(post_delete, sender=WorkOrderOutput)
+def release_tool_wear_on_delete(sender, instance, **kwargs):
+    """Take a deleted output's parts back from the tools it was counted against"""
+    record_parts(process_tool_ids(instance.sub_work_order_id), -instance.quantity, recorded_at=instance.created_at)
+
 @receiver(pre_save, sender=Machine)
 def update_maintenance_schedule(sender, instance, **kwargs):
     """Update next maintenance date when last maintenance date changes."""
@@ -85,4 +109,9 @@ def update_work_order_completion(sender, instance, **kwargs):
             if total_sub_orders > 0:
                 parent_completion = (completed_sub_orders / total_sub_orders) * 100
                 parent_work_order.completion_percentage = parent_completion
-                parent_work_order.save()
\ No newline at end of file
+                parent_work_order.save()
+
+@receiver(post_save, sender=WorkOrder)
+def reserve_work_order_components(sender, instance, **kwargs):
+    """Reserve BOM component stock while the work order is released"""
+    sync_work_order_reservations(instance, user=instance.modified_by)
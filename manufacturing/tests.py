@@ -1,3 +1,406 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import uuid
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory.models import (
+    InventoryCategory, InventoryTransaction, Product, RawMaterial, TechnicalDrawing, Tool, UnitOfMeasure,
+)
+from sales.models import Customer, SalesOrder, SalesOrderItem
+from . import cutting
+from .drawing_bundle import bundle_drawings
+from .models import (
+    BOM, BOMComponent, ProcessConfig, ResourceReservation, SubWorkOrder, SubWorkOrderProcess, WorkOrder,
+    WorkOrderOutput,
+)
+from .resources import ResourceConflict, find_conflicts, release_reservations, reserve_resources
+from .tool_life import life_dashboard, record_parts, replace_tool
+
+User = get_user_model()
+
+
+def create_tool(stock_code, **fields):
+    return Tool.objects.create(**{
+        'stock_code': stock_code, 'supplier_name': 'Supplier', 'product_code': stock_code,
+        'unit_price_tl': 1, 'unit_price_euro': 1, 'unit_price_usd': 1,
+        'tool_insert_code': '-', 'tool_material': 'CARBIDE', 'tool_diameter': 10, 'tool_length': 50,
+        'tool_width': 0, 'tool_height': 0, 'tool_angle': 0, 'tool_radius': 0, 'tool_connection_diameter': 10,
+        'tool_type': 'MILL', 'row': 1, 'column': 1, 'table_id': uuid.uuid4(), 'quantity': 1,
+        **fields,
+    })
+
+
+class FirstFitDecreasingTest(TestCase):
+    def test_packs_longest_pieces_first(self):
+        """Test that pieces go longest first into the first bar with room"""
+        pieces = [(300, 1), (700, 2), (500, 3), (500, 4)]
+        bars = cutting.first_fit_decreasing(pieces, 1000)
+
+        self.assertEqual([[piece[0] for piece in bar.pieces] for bar in bars], [[700, 300], [500, 500]])
+        self.assertEqual([bar.free for bar in bars], [0, 0])
+
+    def test_improve_empties_the_least_filled_bar(self):
+        """Test that the local search saves a bar first fit decreasing wastes"""
+        pieces = [(450, 1), (450, 2), (350, 3), (350, 4), (200, 5), (200, 6)]
+        bars = cutting.first_fit_decreasing(pieces, 1000)
+        self.assertEqual(len(bars), 3)
+
+        bars = cutting.improve(bars)
+        self.assertEqual(len(bars), 2)
+        self.assertEqual(sorted(piece for bar in bars for piece in bar.pieces), sorted(pieces))
+        self.assertTrue(all(bar.load <= bar.capacity for bar in bars))
+
+
+class CuttingPlanTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='adminpass', email='admin@example.com')
+        self.client.force_authenticate(user=self.user)
+
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.pieces = UnitOfMeasure.objects.create(unit_code='PCS', unit_name='Pieces')
+        self.metres = UnitOfMeasure.objects.create(unit_code='M', unit_name='Metre')
+        self.kilograms = UnitOfMeasure.objects.create(unit_code='KG', unit_name='Kilogram')
+        self.material = RawMaterial.objects.create(
+            material_code='BAR-01', material_name='Bar', unit=self.pieces, current_stock=10, bar_length_mm=1000
+        )
+
+        montaged = Product.objects.create(
+            product_code='P-001', product_name='Assembly', product_type='MONTAGED', inventory_category=category
+        )
+        self.blank = Product.objects.create(
+            product_code='P-002', product_name='Shaft', product_type='SEMI', inventory_category=category,
+            blank_material=self.material, blank_length_mm=497,
+        )
+        customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        order = SalesOrder.objects.create(order_number='SO-001', customer=customer)
+        order_item = SalesOrderItem.objects.create(sales_order=order, product=montaged, ordered_quantity=1)
+        bom = BOM.objects.create(product=montaged)
+        component = BOMComponent.objects.create(bom=bom, sequence_order=1, product=self.blank)
+        work_order = WorkOrder.objects.create(
+            order_number='WO-001', sales_order_item=order_item, bom=bom, quantity=1,
+            planned_start=date(2025, 1, 1), planned_end=date(2025, 1, 31),
+        )
+        self.sub_work_order = SubWorkOrder.objects.create(
+            parent_work_order=work_order, bom_component=component, quantity=4, status='IN_PROGRESS',
+            planned_start=date(2025, 1, 1), planned_end=date(2025, 1, 31),
+        )
+
+    def set_stock(self, unit, current_stock):
+        RawMaterial.objects.filter(pk=self.material.pk).update(unit=unit, current_stock=current_stock)
+
+    def test_plan_counts_bars_of_piece_stock(self):
+        """Test that the plan packs two blanks per bar and takes the bars from stock"""
+        response = self.client.get(reverse('manufacturing:sub-work-order-cutting-plan'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        plan, = response.data
+        self.assertEqual(plan['bar_count'], 2)
+        self.assertEqual(plan['bars_from_stock'], 2)
+        self.assertEqual(plan['bars_to_buy'], 0)
+        self.assertEqual(plan['scrap_mm'], 12)
+        self.assertEqual(plan['sub_work_order_ids'], [self.sub_work_order.id])
+
+    def test_plan_converts_length_stock_to_bars(self):
+        """Test that stock held in metres counts as whole bars of bar_length_mm"""
+        self.set_stock(self.metres, Decimal('1.5'))
+
+        plan, = cutting.build_cutting_plans(cutting.pending_sub_work_orders())
+        self.assertEqual(plan['stock_per_bar'], Decimal(1))
+        self.assertEqual(plan['bars_from_stock'], 1)
+        self.assertEqual(plan['bars_to_buy'], 1)
+
+    def test_cut_blanks_consumes_length_stock(self):
+        """Test that cutting from stock held in metres takes off the bars' length"""
+        self.set_stock(self.metres, Decimal('5.00'))
+
+        response = self.client.post(reverse('manufacturing:sub-work-order-cut-blanks'), {'materials': [self.material.id]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied_material_ids'], [self.material.id])
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.current_stock, Decimal('3.00'))
+        self.assertEqual(InventoryTransaction.objects.get(material=self.material).quantity_change, Decimal('-2.00'))
+        self.sub_work_order.refresh_from_db()
+        self.assertIsNotNone(self.sub_work_order.blanks_cut_at)
+
+    def test_cut_blanks_skips_stock_in_other_units(self):
+        """Test that stock held by weight is never consumed as bars"""
+        self.set_stock(self.kilograms, Decimal('500.00'))
+
+        response = self.client.post(reverse('manufacturing:sub-work-order-cut-blanks'), {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['skipped_material_ids'], [self.material.id])
+        plan, = response.data['plans']
+        self.assertIsNone(plan['bars_from_stock'])
+        self.assertIsNone(plan['bars_to_buy'])
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.current_stock, Decimal('500.00'))
+        self.assertFalse(InventoryTransaction.objects.exists())
+
+    def test_cut_blanks_rejects_bad_materials(self):
+        """Test that materials other than ids return 400"""
+        url = reverse('manufacturing:sub-work-order-cut-blanks')
+
+        self.assertEqual(self.client.post(url, {'materials': {'id': 1}}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'materials': ['x']}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'materials': f'{self.material.id},'}, format='json').status_code, status.HTTP_200_OK)
+
+
+class ResourceConflictTest(TestCase):
+    def setUp(self):
+        self.start = datetime(2025, 3, 3, 8, 0, tzinfo=dt_timezone.utc)
+        table_id = uuid.uuid4()
+        self.tool_a, self.tool_b = [
+            Tool.objects.create(
+                stock_code=code, supplier_name='Supplier', product_code=code,
+                unit_price_tl=1, unit_price_euro=1, unit_price_usd=1,
+                tool_insert_code='-', tool_material='CARBIDE', tool_diameter=10, tool_length=50,
+                tool_width=0, tool_height=0, tool_angle=0, tool_radius=0, tool_connection_diameter=10,
+                tool_type='MILL', row=1, column=column, table_id=table_id, quantity=1,
+            ) for column, code in enumerate(['T-A', 'T-B'])
+        ]
+        self.reservation = ResourceReservation.objects.create(
+            tool=self.tool_a, starts_at=self.at(2), ends_at=self.at(4)
+        )
+        ResourceReservation.objects.create(
+            tool=self.tool_b, starts_at=self.at(0), ends_at=None, status='RELEASED'
+        )
+
+    def at(self, hours):
+        return self.start + timedelta(hours=hours)
+
+    def request(self, tool, starts, ends):
+        return {'resource': 'tool', 'resource_id': tool.id, 'starts_at': self.at(starts),
+                'ends_at': None if ends is None else self.at(ends)}
+
+    def test_overlaps_with_reservations_and_within_the_batch(self):
+        """Test that the sweep reports reservation and in-batch overlaps but not touching intervals"""
+        conflicts = find_conflicts([
+            self.request(self.tool_a, 3, 5),
+            self.request(self.tool_a, 4, 6),
+            self.request(self.tool_a, 0, 2),
+            self.request(self.tool_b, 1, None),
+            self.request(self.tool_b, 7, 8),
+        ])
+        found = sorted((conflict['request'], conflict.get('conflicting_reservation'), conflict.get('conflicting_request'))
+                       for conflict in conflicts)
+        self.assertEqual(found, [(0, self.reservation.id, None), (1, None, 0), (4, None, 3)])
+
+    def test_reserve_is_all_or_nothing(self):
+        """Test that one conflict keeps the whole batch from being reserved"""
+        with self.assertRaises(ResourceConflict) as raised:
+            reserve_resources([self.request(self.tool_b, 0, 1), self.request(self.tool_a, 1, 3)])
+        self.assertEqual(raised.exception.conflicts[0]['request'], 1)
+        self.assertEqual(ResourceReservation.objects.filter(status='ACTIVE').count(), 1)
+
+        reserve_resources([self.request(self.tool_b, 0, 1), self.request(self.tool_a, 4, 5)])
+        self.assertEqual(ResourceReservation.objects.filter(status='ACTIVE').count(), 3)
+
+    def test_release_trims_and_drops_future_reservations(self):
+        """Test that releasing ends running reservations and cancels ones not yet started"""
+        future = ResourceReservation.objects.create(tool=self.tool_b, starts_at=self.at(6), ends_at=None)
+        self.assertEqual(release_reservations(ResourceReservation.objects.all(), at=self.at(3)), 2)
+
+        self.reservation.refresh_from_db()
+        future.refresh_from_db()
+        self.assertEqual((self.reservation.status, self.reservation.ends_at), ('ACTIVE', self.at(3)))
+        self.assertEqual(future.status, 'RELEASED')
+        self.assertEqual(find_conflicts([self.request(self.tool_a, 3, 4)]), [])
+
+
+class ToolLifeTest(TestCase):
+    def setUp(self):
+        self.category = InventoryCategory.objects.create(name='MAMUL')
+        self.tool = create_tool('T-1', life_limit_parts=100)
+        self.other_tool = create_tool('T-2', life_limit_parts=1000)
+
+        product = Product.objects.create(
+            product_code='P-001', product_name='Assembly', product_type='MONTAGED', inventory_category=self.category
+        )
+        customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        order = SalesOrder.objects.create(order_number='SO-001', customer=customer)
+        order_item = SalesOrderItem.objects.create(sales_order=order, product=product, ordered_quantity=1)
+        bom = BOM.objects.create(product=product)
+        component = BOMComponent.objects.create(bom=bom, sequence_order=1, product=product)
+        work_order = WorkOrder.objects.create(
+            order_number='WO-001', sales_order_item=order_item, bom=bom, quantity=1,
+            planned_start=date(2025, 1, 1), planned_end=date(2025, 1, 31),
+        )
+        self.sub_work_order, self.other_sub_work_order = [
+            SubWorkOrder.objects.create(
+                parent_work_order=work_order, bom_component=component, quantity=100, status='IN_PROGRESS',
+                planned_start=date(2025, 1, 1), planned_end=date(2025, 1, 31),
+            ) for _ in range(2)
+        ]
+        for sub_work_order, tools in [(self.sub_work_order, [self.tool, self.tool]), (self.other_sub_work_order, [self.other_tool])]:
+            for sequence, tool in enumerate(tools, start=1):
+                SubWorkOrderProcess.objects.create(
+                    sub_work_order=sub_work_order, sequence_order=sequence,
+                    process_config=ProcessConfig.objects.create(tool=tool, sequence_order=sequence),
+                )
+        # bulk_create skips the created-output receivers, so the counts start at zero
+        self.output, = WorkOrderOutput.objects.bulk_create([WorkOrderOutput(
+            sub_work_order=self.sub_work_order, quantity=10, status='GOOD', target_category=self.category,
+        )])
+        self.output = WorkOrderOutput.objects.get(pk=self.output.pk)
+
+    def parts(self, tool):
+        tool.refresh_from_db()
+        return tool.parts_produced
+
+    def test_output_changes_apply_the_difference(self):
+        """Test that editing an output counts only the change in quantity, once per process"""
+        self.output.quantity = 15
+        self.output.save()
+        self.assertEqual(self.parts(self.tool), 10)
+
+        self.output.quantity = 12
+        self.output.save()
+        self.assertEqual(self.parts(self.tool), 4)
+
+    def test_moving_an_output_moves_its_wear(self):
+        """Test that an output moved to another sub work order counts against that one's tools"""
+        record_parts([self.tool.id, self.tool.id], 10)
+        self.output.sub_work_order = self.other_sub_work_order
+        self.output.save()
+        self.assertEqual(self.parts(self.tool), 0)
+        self.assertEqual(self.parts(self.other_tool), 10)
+
+    def test_deleting_an_output_takes_its_parts_back(self):
+        """Test that a deleted output is subtracted, but not from a cutting edge started after it"""
+        record_parts([self.tool.id, self.tool.id, self.other_tool.id], 10)
+        self.output.delete()
+        self.assertEqual(self.parts(self.tool), 0)
+
+        output = WorkOrderOutput.objects.bulk_create([WorkOrderOutput(
+            sub_work_order=self.other_sub_work_order, quantity=10, status='GOOD', target_category=self.category,
+        )])[0]
+        replace_tool(self.other_tool, at=timezone.now() + timedelta(seconds=1))
+        record_parts([self.other_tool.id], 3)
+        WorkOrderOutput.objects.get(pk=output.pk).delete()
+        self.assertEqual(self.parts(self.other_tool), 3)
+
+    def test_dashboard_predicts_replacement_from_usage_rate(self):
+        """Test that the replacement date extrapolates the parts rate since the edge started"""
+        Tool.objects.filter(pk=self.tool.pk).update(life_started_at=timezone.now() - timedelta(days=10), parts_produced=50)
+        Tool.objects.filter(pk=self.other_tool.pk).update(life_started_at=timezone.now() - timedelta(days=10), parts_produced=950)
+
+        dashboard = life_dashboard()
+        self.assertEqual((dashboard['ok'], dashboard['warning'], dashboard['expired']), (1, 1, 0))
+        worn, fresh = dashboard['tools']
+        self.assertEqual((worn['stock_code'], worn['life_state'], worn['remaining_parts']), ('T-2', 'WARNING', 50))
+        self.assertAlmostEqual(
+            (fresh['predicted_replacement_at'] - timezone.now()).total_seconds() / 86400, 10, places=2
+        )
+
+
+class DrawingBundleTest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_superuser(username='admin', password='adminpass', email='admin@example.com')
+        self.client.force_authenticate(user=self.user)
+
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.products = {
+            code: Product.objects.create(
+                product_code=code, product_name=code, product_type='SINGLE', inventory_category=category
+            ) for code in ['P-TOP', 'P-SUB', 'P-LEAF', 'P-DEEP', 'P-NONE', 'P-OTHER']
+        }
+        top_bom = BOM.objects.create(product=self.products['P-TOP'])
+        sub_bom = BOM.objects.create(product=self.products['P-SUB'])
+        deep_bom = BOM.objects.create(product=self.products['P-DEEP'])
+        BOM.objects.create(product=self.products['P-SUB'], version='0.9', is_active=False)
+        for sequence, (bom, code) in enumerate([
+            (top_bom, 'P-SUB'), (top_bom, 'P-LEAF'), (sub_bom, 'P-DEEP'), (sub_bom, 'P-NONE'),
+            # A cycle back to the top assembly
+            (deep_bom, 'P-TOP'),
+        ], start=1):
+            BOMComponent.objects.create(bom=bom, sequence_order=sequence, product=self.products[code])
+
+        self.drawings = {
+            code: self.create_drawing(code, '1', f'%PDF-1.4 {code}'.encode())
+            for code in ['P-TOP', 'P-SUB', 'P-LEAF', 'P-OTHER']
+        }
+        self.drawings['P-DEEP'] = self.create_drawing('P-DEEP', '1', b'0\nSECTION\n' * 1000, extension='.dxf')
+        self.create_drawing('P-LEAF', '0', b'%PDF-1.4 superseded', is_current=False)
+
+        customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        order = SalesOrder.objects.create(order_number='SO-001', customer=customer)
+        order_item = SalesOrderItem.objects.create(sales_order=order, product=self.products['P-TOP'], ordered_quantity=1)
+        self.work_order = WorkOrder.objects.create(
+            order_number='WO-001', sales_order_item=order_item, bom=top_bom, quantity=1,
+            planned_start=date(2025, 1, 1), planned_end=date(2025, 1, 31),
+        )
+        self.url = reverse('manufacturing:work-order-drawing-bundle', args=[self.work_order.pk])
+
+    def create_drawing(self, code, version, content, extension='.pdf', is_current=True):
+        return TechnicalDrawing.objects.create(
+            product=self.products[code], version=version, drawing_code=f'D-{code}', is_current=is_current,
+            effective_date=date(2025, 1, 1), created_by=self.user,
+            drawing_file=ContentFile(content, name=f'drawing{extension}'),
+        )
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_bundle_follows_sub_assemblies(self):
+        """Test that the bundle has the current drawing of every product reached through active BOMs"""
+        drawings = list(bundle_drawings(self.work_order))
+
+        self.assertEqual(
+            [(drawing.product.product_code, drawing.version) for drawing in drawings],
+            [('P-DEEP', '1'), ('P-LEAF', '1'), ('P-SUB', '1'), ('P-TOP', '1')],
+        )
+
+    def test_download_streams_zip_of_drawings(self):
+        """Test that the archive holds every drawing, storing PDFs and compressing other formats"""
+        archive = self.download()
+
+        self.assertIsNone(archive.testzip())
+        entries = {info.filename: info for info in archive.infolist()}
+        self.assertEqual(sorted(entries), [
+            'P-DEEP_D-P-DEEP_v1.dxf', 'P-LEAF_D-P-LEAF_v1.pdf', 'P-SUB_D-P-SUB_v1.pdf', 'P-TOP_D-P-TOP_v1.pdf',
+        ])
+        self.assertEqual(entries['P-TOP_D-P-TOP_v1.pdf'].compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(entries['P-DEEP_D-P-DEEP_v1.dxf'].compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.read('P-SUB_D-P-SUB_v1.pdf'), b'%PDF-1.4 P-SUB')
+        self.assertEqual(archive.read('P-DEEP_D-P-DEEP_v1.dxf'), b'0\nSECTION\n' * 1000)
+
+    def test_unreadable_drawing_is_listed_as_missing(self):
+        """Test that a drawing missing from storage is left out and named in MISSING.txt"""
+        missing = self.drawings['P-LEAF'].drawing_file.name
+        default_storage.delete(missing)
+
+        with self.assertLogs('manufacturing.drawing_bundle', 'WARNING'):
+            archive = self.download()
+        self.assertNotIn('P-LEAF_D-P-LEAF_v1.pdf', archive.namelist())
+        self.assertIn('P-SUB_D-P-SUB_v1.pdf', archive.namelist())
+        self.assertEqual(archive.read('MISSING.txt').decode(), f'{missing}\n')
+
+    def test_no_drawings_is_not_found(self):
+        """Test that a work order without drawings is answered with 404"""
+        TechnicalDrawing.objects.update(is_current=False)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
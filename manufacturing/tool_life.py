@@ -0,0 +1,191 @@
+"""
+Tool life tracking from production.
+
+Every part recorded as WorkOrderOutput wears the tools of its sub work
+order's processes (through ProcessConfig.tool), and every completed process
+adds its cutting time, the run time after setup, to its tool. Both land on
+the Tool row as F() increments, so concurrent outputs never lose counts and
+the dashboard reads one row per tool instead of aggregating outputs.
+
+Replacement is predicted from the average usage rate since the cutting edge
+was last replaced (life_started_at), against whichever of the part and
+minute limits runs out first.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
+
+from inventory.models import Tool
+from .models import SubWorkOrderProcess
+
+# Share of the life limit used from which a tool is flagged
+WARNING_RATIO = 0.8
+# Predicted replacement within this many days also flags a tool
+WARNING_DAYS = 7
+# Usage rates are averaged over at least this many days, so a fresh edge
+# with its first parts does not extrapolate to an imminent replacement
+MIN_RATE_DAYS = 1.0
+
+ROW_FIELDS = (
+    'id', 'stock_code', 'tool_type', 'status', 'parts_produced', 'cutting_minutes',
+    'life_limit_parts', 'life_limit_minutes', 'life_started_at', 'last_used_at', 'created_at',
+)
+
+
+def process_tool_ids(sub_work_order_id):
+    """Tool of each process of a sub work order; a tool used twice is listed twice."""
+    return list(SubWorkOrderProcess.objects.filter(
+        sub_work_order_id=sub_work_order_id, process_config__tool__isnull=False
+    ).values_list('process_config__tool_id', flat=True))
+
+
+def record_parts(tool_ids, quantity, at=None, recorded_at=None):
+    """
+    Add `quantity` parts to each tool, once per process that used it. A
+    negative quantity takes parts back, only from tools whose cutting edge
+    was already in use when the parts were recorded at `recorded_at`.
+    """
+    if not quantity:
+        return
+    at = at or timezone.now()
+    by_uses = {}
+    for tool_id, uses in Counter(tool_ids).items():
+        by_uses.setdefault(uses, []).append(tool_id)
+    for uses, ids in by_uses.items():
+        tools = Tool.objects.filter(pk__in=ids)
+        if quantity > 0:
+            tools.update(parts_produced=F('parts_produced') + quantity * uses, last_used_at=at)
+            continue
+        if recorded_at is not None:
+            tools = tools.filter(Q(life_started_at__isnull=True) | Q(life_started_at__lte=recorded_at))
+        tools.update(parts_produced=Greatest(F('parts_produced') + quantity * uses, Value(0)))
+
+
+def record_cutting_minutes(tool_id, minutes, at=None):
+    if tool_id and minutes > 0:
+        Tool.objects.filter(pk=tool_id).update(
+            cutting_minutes=F('cutting_minutes') + minutes, last_used_at=at or timezone.now()
+        )
+
+
+def cutting_minutes(process):
+    """Run time of a completed process, without its setup."""
+    return max((process.actual_duration_minutes or 0) - (process.setup_time_minutes or 0), 0)
+
+
+def replace_tool(tool, at=None):
+    """Start a new cutting edge: usage counts restart from zero."""
+    at = at or timezone.now()
+    Tool.objects.filter(pk=tool.pk).update(parts_produced=0, cutting_minutes=0, life_started_at=at)
+    tool.parts_produced = tool.cutting_minutes = 0
+    tool.life_started_at = at
+
+
+def _ratio(used, limit):
+    return Case(
+        When(**{f'{limit}__gt': 0}, then=Cast(used, FloatField()) / Cast(limit, FloatField())),
+        default=Value(0.0), output_field=FloatField(),
+    )
+
+
+def _tracked_tools():
+    return Tool.objects.filter(
+        Q(life_limit_parts__gt=0) | Q(life_limit_minutes__gt=0)
+    ).annotate(
+        life_used=Greatest(_ratio('parts_produced', 'life_limit_parts'), _ratio('cutting_minutes', 'life_limit_minutes')),
+    )
+
+
+def _life_row(row, now):
+    """Remaining life and predicted replacement date of one tool's counters."""
+    started = row['life_started_at'] or row['created_at']
+    elapsed_days = max((now - started).total_seconds() / 86400, MIN_RATE_DAYS)
+    days_left = None
+    for used, limit in (('parts_produced', 'life_limit_parts'), ('cutting_minutes', 'life_limit_minutes')):
+        if not row[limit] or not row[used]:
+            continue
+        rate = row[used] / elapsed_days
+        remaining = max(row[limit] - row[used], 0) / rate
+        days_left = remaining if days_left is None else min(days_left, remaining)
+
+    life_used = row['life_used']
+    if life_used >= 1:
+        state = 'EXPIRED'
+    elif life_used >= WARNING_RATIO or (days_left is not None and days_left <= WARNING_DAYS):
+        state = 'WARNING'
+    else:
+        state = 'OK'
+    return {
+        **row,
+        'life_used_percent': round(100 * life_used, 1),
+        'remaining_parts': max(row['life_limit_parts'] - row['parts_produced'], 0) if row['life_limit_parts'] else None,
+        'remaining_minutes': max(row['life_limit_minutes'] - row['cutting_minutes'], 0) if row['life_limit_minutes'] else None,
+        'predicted_replacement_at': now + timedelta(days=days_left) if days_left is not None else None,
+        'life_state': state,
+    }
+
+
+def tool_life(tool):
+    """Life state of one tool, or None if it has no life limit."""
+    row = _tracked_tools().filter(pk=tool.pk).values(*ROW_FIELDS, 'life_used').first()
+    return _life_row(row, timezone.now()) if row else None
+
+
+def life_dashboard(warning_only=False):
+    """
+    Life state of every tool with a life limit, most worn first.
+
+    Returns:
+        dict with counts per life state and the tool rows
+    """
+    now = timezone.now()
+    rows = [
+        _life_row(row, now)
+        for row in _tracked_tools().order_by('-life_used', 'stock_code').values(*ROW_FIELDS, 'life_used')
+    ]
+    counts = Counter(row['life_state'] for row in rows)
+    if warning_only:
+        rows = [row for row in rows if row['life_state'] != 'OK']
+    return {
+        'tracked_tools': sum(counts.values()),
+        'ok': counts['OK'],
+        'warning': counts['WARNING'],
+        'expired': counts['EXPIRED'],
+        'tools': rows,
+    }
+
+
+def rebuild_tool_life():
+    """
+    Recount every tool's usage since its life started from the outputs and
+    completed processes on record. For backfilling and repairing counters;
+    day to day they are maintained incrementally.
+    """
+    since_output = Q(process_config__tool__life_started_at__isnull=True) | Q(
+        sub_work_order__outputs__created_at__gte=F('process_config__tool__life_started_at')
+    )
+    parts = dict(SubWorkOrderProcess.objects.filter(process_config__tool__isnull=False).values(
+        'process_config__tool'
+    ).annotate(
+        parts=Sum('sub_work_order__outputs__quantity', filter=since_output)
+    ).order_by().values_list('process_config__tool', 'parts'))
+
+    minutes = dict(SubWorkOrderProcess.objects.filter(
+        Q(process_config__tool__life_started_at__isnull=True) | Q(end_time__gte=F('process_config__tool__life_started_at')),
+        process_config__tool__isnull=False, status='COMPLETED', actual_duration_minutes__isnull=False,
+    ).values('process_config__tool').annotate(
+        minutes=Sum(F('actual_duration_minutes') - Coalesce('setup_time_minutes', 0))
+    ).order_by().values_list('process_config__tool', 'minutes'))
+
+    tools = []
+    for tool in Tool.objects.only('id', 'parts_produced', 'cutting_minutes').iterator(chunk_size=2000):
+        tool.parts_produced = parts.get(tool.id) or 0
+        tool.cutting_minutes = max(minutes.get(tool.id) or 0, 0)
+        tools.append(tool)
+    with transaction.atomic():
+        Tool.objects.bulk_update(tools, ['parts_produced', 'cutting_minutes'], batch_size=1000)
+    return len(tools)
@@ -14,6 +14,8 @@ router.register(r'work-orders', views.WorkOrderViewSet, basename='work-order')
 router.register(r'sub-work-orders', views.SubWorkOrderViewSet, basename='sub-work-order')
 router.register(r'sub-work-order-processes', views.SubWorkOrderProcessViewSet, basename='sub-work-order-process')
 router.register(r'work-order-outputs', views.WorkOrderOutputViewSet, basename='work-order-output')
+router.register(r'tool-life', views.ToolLifeViewSet, basename='tool-life')
+router.register(r'resource-reservations', views.ResourceReservationViewSet, basename='resource-reservation')
 
 urlpatterns = [
     path('', include(router.urls)),
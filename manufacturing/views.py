@@ -1,4 +1,5 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -6,19 +7,28 @@ from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from erp_core.throttling import CustomScopedRateThrottle
-from erp_core.models import WorkOrderStatus, MachineStatus
+from erp_core.models import WorkOrderStatus, MachineStatus, ProductType
+from erp_core.reference import inventory_categories
+from erp_core.response_cache import CachedResponseMixin
 from django.db import transaction
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework import serializers
 from django.utils import timezone
 from django.db.models import Q
 from django.core.exceptions import ValidationError as DjangoValidationError
 
+from inventory.models import Tool
+from . import cutting
+from .drawing_bundle import bundle_drawings, stream_zip
+from .tool_life import life_dashboard, tool_life, replace_tool
+from .resources import (
+    ResourceConflict, find_conflicts, reserve_resources, process_requests, release_reservations
+)
 from .models import (
     WorkOrder, Machine, ManufacturingProcess, ProductWorkflow,
     SubWorkOrder, WorkOrderOutput, SubWorkOrderProcess,
     WorkOrderStatusChange, ProcessConfig, WorkOrderStatusTransition,
-    BOM, BOMComponent
+    BOM, BOMComponent, ResourceReservation
 )
 from .serializers import (
     WorkOrderSerializer, MachineSerializer, ManufacturingProcessSerializer,
@@ -27,10 +37,11 @@ from .serializers import (
     SubWorkOrderProcessCreateUpdateSerializer, WorkOrderOutputCreateUpdateSerializer,
     WorkOrderStatusChangeSerializer, ProcessConfigSerializer, ProductWorkflowSerializer,
     WorkflowWithConfigsSerializer, BOMSerializer, BOMWithComponentsSerializer,
-    BOMComponentCreateUpdateSerializer, BOMComponentSerializer
+    BOMComponentCreateUpdateSerializer, BOMComponentSerializer,
+    ResourceReservationSerializer, ProcessWindowSerializer
 )
 
-class ProductWorkflowViewSet(viewsets.ModelViewSet):
+class ProductWorkflowViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['product', 'status']
@@ -98,7 +109,7 @@ class ProductWorkflowViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-class ProcessConfigViewSet(viewsets.ModelViewSet):
+class ProcessConfigViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = ProcessConfigSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -154,7 +165,7 @@ class ProcessConfigViewSet(viewsets.ModelViewSet):
         except Exception as e:
             raise ValidationError(detail=str(e))
 
-class ManufacturingProcessViewSet(viewsets.ModelViewSet):
+class ManufacturingProcessViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = ManufacturingProcess.objects.all()
     serializer_class = ManufacturingProcessSerializer
     permission_classes = [IsAuthenticated]
@@ -169,7 +180,7 @@ class ManufacturingProcessViewSet(viewsets.ModelViewSet):
             )
         return super().handle_exception(exc)
 
-class MachineViewSet(viewsets.ModelViewSet):
+class MachineViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Machine.objects.all()
     serializer_class = MachineSerializer
     permission_classes = [IsAuthenticated]
@@ -277,6 +288,23 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
         status_changes = work_order.status_changes.all().order_by('-changed_at')
         serializer = WorkOrderStatusChangeSerializer(status_changes, many=True)
         return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='drawing-bundle')
+    def drawing_bundle(self, request, pk=None):
+        """
+        Download the current drawings of every product in the work order's
+        exploded BOM as one ZIP archive, streamed as it is built.
+        """
+        work_order = self.get_object()
+        drawings = list(bundle_drawings(work_order))
+        if not drawings:
+            return Response(
+                {'error': 'No drawings found for the products of this work order'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        response = StreamingHttpResponse(stream_zip(drawings), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{work_order.order_number}_drawings.zip"'
+        return response
     
     @action(detail=True, methods=['post'])
     def assign(self, request, pk=None):
@@ -401,7 +429,7 @@ class BOMViewSet(viewsets.ModelViewSet):
             )
         return super().handle_exception(exc)
 
-class BOMComponentViewSet(viewsets.ModelViewSet):
+class BOMComponentViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter]
     filterset_fields = ['bom']
@@ -512,6 +540,40 @@ class SubWorkOrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    def get_cutting_params(self, params):
+        materials = params.get('materials', '')
+        if isinstance(materials, str):
+            materials = materials.split(',')
+        try:
+            kerf = float(params.get('kerf', cutting.DEFAULT_KERF_MM))
+            if not isinstance(materials, (list, tuple)):
+                raise TypeError
+            material_ids = [int(value) for value in materials if str(value).strip()]
+        except (TypeError, ValueError):
+            raise ValidationError('kerf must be a number and materials a list or comma separated list of ids')
+        if kerf < 0:
+            raise ValidationError('kerf must not be negative')
+        return kerf, material_ids
+
+    @action(detail=False, methods=['get'], url_path='cutting-plan')
+    def cutting_plan(self, request):
+        """
+        Bar cutting plans for released sub work orders whose blanks are not cut yet,
+        per material: bars used, bars to buy, scrap and the cuts on every bar.
+        Optional kerf (mm) and materials (comma separated raw material ids).
+        """
+        kerf, material_ids = self.get_cutting_params(request.query_params)
+        return Response(cutting.build_cutting_plans(cutting.pending_sub_work_orders(material_ids), kerf))
+
+    @action(detail=False, methods=['post'], url_path='cut-blanks')
+    def cut_blanks(self, request):
+        """
+        Apply the current cutting plans: consume the bars from stock and mark the
+        sub work orders as cut. Materials that need bars to be bought are skipped.
+        """
+        kerf, material_ids = self.get_cutting_params(request.data)
+        return Response(cutting.cut_blanks(request.user, kerf, material_ids))
+
     def handle_exception(self, exc):
         if isinstance(exc, ValidationError):
             return Response(
@@ -556,6 +618,11 @@ class SubWorkOrderProcessViewSet(viewsets.ModelViewSet):
         try:
             process.update_status(new_status, request.user)
             return Response(self.get_serializer(process).data)
+        except DjangoValidationError as e:
+            return Response(
+                {'error': ' '.join(e.messages)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except ValidationError as e:
             return Response(
                 {'error': str(e)},
@@ -570,6 +637,118 @@ class SubWorkOrderProcessViewSet(viewsets.ModelViewSet):
             )
         return super().handle_exception(exc)
 
+class ResourceReservationViewSet(viewsets.ModelViewSet):
+    """
+    Time-interval reservations of tools, fixtures and control gauges.
+
+    Reservations are created through the conflict check only, so they cannot
+    be edited in place; release one instead and reserve again.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ResourceReservationSerializer
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['tool', 'fixture', 'control_gauge', 'process', 'status']
+    ordering_fields = ['starts_at', 'ends_at', 'created_at']
+    ordering = ['starts_at']
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        return ResourceReservation.objects.all()
+
+    @staticmethod
+    def _as_request(data):
+        return {
+            'resource': data['resource'],
+            'resource_id': data[data['resource']].pk,
+            'starts_at': data['starts_at'],
+            'ends_at': data.get('ends_at'),
+            'process_id': data['process'].pk if data.get('process') else None,
+        }
+
+    def _batch_requests(self, request):
+        """Requests from explicit `reservations` and from `processes` windows."""
+        reservations = ResourceReservationSerializer(data=request.data.get('reservations', []), many=True)
+        reservations.is_valid(raise_exception=True)
+        windows = ProcessWindowSerializer(data=request.data.get('processes', []), many=True)
+        windows.is_valid(raise_exception=True)
+        requests = [self._as_request(data) for data in reservations.validated_data]
+        requests += process_requests(
+            (window['process'].pk, window['starts_at'], window.get('ends_at'))
+            for window in windows.validated_data
+        )
+        if not requests:
+            raise ValidationError('Provide reservations or processes to reserve')
+        return requests
+
+    def _reserve(self, requests, many):
+        try:
+            reservations = reserve_resources(requests, self.request.user, self.request.data.get('notes'))
+        except ResourceConflict as e:
+            return Response(
+                {'error': str(e), 'conflicts': e.conflicts},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        data = ResourceReservationSerializer(reservations, many=True).data
+        return Response(data if many else data[0], status=status.HTTP_201_CREATED)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._reserve([self._as_request(serializer.validated_data)], many=False)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Reserve a batch at once, all or nothing. Accepts `reservations` (as for
+        create) and `processes` ({process, starts_at, ends_at}) windows, which
+        reserve the tool, fixture and control gauge of each process config.
+        """
+        return self._reserve(self._batch_requests(request), many=True)
+
+    @action(detail=False, methods=['post'])
+    def conflicts(self, request):
+        """Check a batch like `bulk` without reserving anything."""
+        requests = self._batch_requests(request)
+        return Response({'request_count': len(requests), 'conflicts': find_conflicts(requests)})
+
+    @action(detail=True, methods=['post'])
+    def release(self, request, pk=None):
+        """Give the resource back now."""
+        reservation = self.get_object()
+        release_reservations(ResourceReservation.objects.filter(pk=reservation.pk))
+        reservation.refresh_from_db()
+        return Response(self.get_serializer(reservation).data)
+
+class ToolLifeViewSet(viewsets.ViewSet):
+    """
+    Tool wear from production: usage against the life limits of each tool,
+    predicted replacement dates and the tools due for replacement.
+    """
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'stock_code'
+
+    def list(self, request):
+        """Every tool with a life limit, most worn first; ?warning_only=true for the flagged ones."""
+        warning_only = request.query_params.get('warning_only', '').lower() in ('1', 'true')
+        return Response(life_dashboard(warning_only))
+
+    def retrieve(self, request, stock_code=None):
+        life = tool_life(get_object_or_404(Tool, stock_code=stock_code))
+        if life is None:
+            raise NotFound('This tool has no life limit')
+        return Response(life)
+
+    @action(detail=True, methods=['post'])
+    def replace(self, request, stock_code=None):
+        """Record a new cutting edge: usage counts restart from zero."""
+        tool = get_object_or_404(Tool, stock_code=stock_code)
+        replace_tool(tool)
+        return Response({
+            'stock_code': tool.stock_code,
+            'life_started_at': tool.life_started_at,
+            'life': tool_life(tool),
+        })
+
 class WorkOrderOutputViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter]
@@ -613,14 +792,14 @@ class WorkOrderOutputViewSet(viewsets.ModelViewSet):
         from inventory.models import InventoryCategory
         try:
             if new_status == 'GOOD':
-                if self.bom_component.material.product_type in [ProductType.SEMI, ProductType.SINGLE]:
-                    target_category = InventoryCategory.objects.get(name='PROSES')
+                if output.sub_work_order.bom_component.product.product_type in [ProductType.SEMI, ProductType.SINGLE]:
+                    target_category = inventory_categories.get('PROSES')
                 else:
-                    target_category = InventoryCategory.objects.get(name='MAMUL')
+                    target_category = inventory_categories.get('MAMUL')
             elif new_status == 'REWORK':
-                target_category = InventoryCategory.objects.get(name='KARANTINA')
+                target_category = inventory_categories.get('KARANTINA')
             elif new_status == 'SCRAP':
-                target_category = InventoryCategory.objects.get(name='HURDA')
+                target_category = inventory_categories.get('HURDA')
                 
             output.status = new_status
             output.target_category = target_category
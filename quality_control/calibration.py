@@ -0,0 +1,153 @@
+"""
+Calibration schedule for control gauges and machines.
+
+Gauges carry their due date in ControlGauge.upcoming_calibration_date and
+machines in Machine.next_calibration_date, which is kept from the latest
+CalibrationRecord. Both are indexed, so the due list for a horizon is one
+range scan per kind (due date up to today + horizon), overdue entries first.
+
+Due gauges and machines are cross-referenced with ProcessConfig.control_gauge
+and SubWorkOrderProcess.machine to list the active workflows and the open
+work orders they hold up. flag_overdue() takes overdue gauges and machines
+out of use with one bulk UPDATE per kind; run it daily through the
+run_calibration_schedule command.
+"""
+from datetime import timedelta
+
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from erp_core.models import MachineStatus, WorkOrderStatus
+from inventory.models import ControlGauge
+from manufacturing.models import Machine, ProcessConfig, SubWorkOrderProcess, WorkflowStatus
+from .models import CalibrationRecord
+
+DEFAULT_HORIZON_DAYS = 30
+# Scrapped and lost gauges are never calibrated again
+GAUGE_RETIRED_STATUSES = ('HURDA', 'KAYIP')
+# Gauges in these statuses are taken out of use once overdue
+GAUGE_USABLE_STATUSES = ('UYGUN', 'KULLANILMIYOR')
+GAUGE_CALIBRATION_STATUS = 'KALIBRASYONDA'
+OPEN_PROCESS_STATUSES = ('PENDING', 'SETUP', 'RUNNING', 'PAUSED')
+
+
+def sync_machine_calibration(machine_ids=None):
+    """Copy the dates of each machine's latest calibration record to the machine."""
+    latest = CalibrationRecord.objects.filter(machine=OuterRef('pk')).order_by('-calibration_date', '-id')
+    machines = Machine.objects.all() if machine_ids is None else Machine.objects.filter(pk__in=machine_ids)
+    return machines.update(
+        last_calibration_date=Subquery(latest.values('calibration_date')[:1]),
+        next_calibration_date=Subquery(latest.values('next_calibration_date')[:1]),
+    )
+
+
+def _with_due(rows, due_field, today):
+    for row in rows:
+        row['days_until_due'] = (row[due_field] - today).days
+        row['overdue'] = row['days_until_due'] < 0
+    return rows
+
+
+def due_gauges(horizon_days=DEFAULT_HORIZON_DAYS, today=None):
+    """Gauges due for calibration within the horizon, including overdue ones."""
+    today = today or timezone.localdate()
+    rows = ControlGauge.objects.filter(
+        upcoming_calibration_date__lte=today + timedelta(days=horizon_days)
+    ).exclude(status__in=GAUGE_RETIRED_STATUSES).order_by('upcoming_calibration_date', 'stock_code').values(
+        'id', 'stock_code', 'stock_name', 'status', 'current_location',
+        'calibration_date', 'upcoming_calibration_date',
+    )
+    return _with_due(list(rows), 'upcoming_calibration_date', today)
+
+
+def due_machines(horizon_days=DEFAULT_HORIZON_DAYS, today=None):
+    """Machines due for calibration within the horizon, including overdue ones."""
+    today = today or timezone.localdate()
+    rows = Machine.objects.filter(
+        next_calibration_date__lte=today + timedelta(days=horizon_days)
+    ).exclude(status=MachineStatus.RETIRED).order_by('next_calibration_date', 'machine_code').values(
+        'id', 'machine_code', 'machine_type', 'status', 'last_calibration_date', 'next_calibration_date',
+    )
+    return _with_due(list(rows), 'next_calibration_date', today)
+
+
+def affected_workflows(gauge_ids):
+    """Process configs of active workflows that need one of the gauges."""
+    return list(ProcessConfig.objects.filter(
+        control_gauge__in=gauge_ids, workflow__status=WorkflowStatus.ACTIVE
+    ).order_by('workflow', 'sequence_order').values(
+        'id', 'control_gauge', 'control_gauge__stock_code', 'workflow',
+        'workflow__product__product_code', 'workflow__version', 'process__process_code', 'sequence_order',
+    ))
+
+
+def affected_work_orders(gauge_ids, machine_ids):
+    """Open work orders with unfinished processes on one of the gauges or machines."""
+    processes = SubWorkOrderProcess.objects.filter(
+        Q(process_config__control_gauge__in=gauge_ids) | Q(machine__in=machine_ids),
+        status__in=OPEN_PROCESS_STATUSES,
+    ).exclude(
+        sub_work_order__parent_work_order__status=WorkOrderStatus.COMPLETED
+    ).values_list(
+        'sub_work_order__parent_work_order', 'sub_work_order__parent_work_order__order_number',
+        'sub_work_order__parent_work_order__status', 'sub_work_order__parent_work_order__planned_start',
+        'process_config__control_gauge', 'process_config__control_gauge__stock_code',
+        'machine', 'machine__machine_code',
+    )
+
+    gauge_ids, machine_ids = set(gauge_ids), set(machine_ids)
+    work_orders = {}
+    for work_order_id, order_number, status, planned_start, gauge_id, gauge_code, machine_id, machine_code in processes:
+        work_order = work_orders.setdefault(work_order_id, {
+            'id': work_order_id, 'order_number': order_number, 'status': status,
+            'planned_start': planned_start, 'gauges': set(), 'machines': set(),
+        })
+        if gauge_id in gauge_ids:
+            work_order['gauges'].add(gauge_code)
+        if machine_id in machine_ids:
+            work_order['machines'].add(machine_code)
+    for work_order in work_orders.values():
+        work_order['gauges'] = sorted(work_order['gauges'])
+        work_order['machines'] = sorted(work_order['machines'])
+    return sorted(work_orders.values(), key=lambda work_order: (work_order['planned_start'], work_order['order_number']))
+
+
+def calibration_schedule(horizon_days=DEFAULT_HORIZON_DAYS, today=None):
+    """
+    Gauges and machines due within the horizon with the active workflows and
+    open work orders that depend on them.
+    """
+    today = today or timezone.localdate()
+    gauges = due_gauges(horizon_days, today)
+    machines = due_machines(horizon_days, today)
+    gauge_ids = [gauge['id'] for gauge in gauges]
+    return {
+        'as_of': today,
+        'horizon_days': horizon_days,
+        'overdue_gauges': sum(gauge['overdue'] for gauge in gauges),
+        'overdue_machines': sum(machine['overdue'] for machine in machines),
+        'gauges': gauges,
+        'machines': machines,
+        'affected_workflows': affected_workflows(gauge_ids),
+        'affected_work_orders': affected_work_orders(gauge_ids, [machine['id'] for machine in machines]),
+    }
+
+
+def flag_overdue(today=None):
+    """
+    Take overdue gauges (to KALIBRASYONDA) and idle overdue machines (to
+    MAINTENANCE) out of use. Machines in use are left running and stay on
+    the due list.
+
+    Returns:
+        dict with the number of gauges and machines flagged
+    """
+    today = today or timezone.localdate()
+    now = timezone.now()
+    gauges = ControlGauge.objects.filter(
+        upcoming_calibration_date__lt=today, status__in=GAUGE_USABLE_STATUSES
+    ).update(status=GAUGE_CALIBRATION_STATUS, modified_at=now)
+    machines = Machine.objects.filter(
+        next_calibration_date__lt=today, status=MachineStatus.AVAILABLE
+    ).update(status=MachineStatus.MAINTENANCE, modified_at=now)
+    return {'gauges': gauges, 'machines': machines}
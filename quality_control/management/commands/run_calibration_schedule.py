@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from quality_control.calibration import DEFAULT_HORIZON_DAYS, calibration_schedule, flag_overdue
+
+class Command(BaseCommand):
+    help = ('Report control gauges and machines due for calibration with the workflows and work orders '
+            'they affect; with --flag, take overdue ones out of use. Meant to run daily from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON_DAYS,
+                            help=f'Days ahead to report (default {DEFAULT_HORIZON_DAYS})')
+        parser.add_argument('--flag', action='store_true',
+                            help='Set overdue gauges to KALIBRASYONDA and idle overdue machines to MAINTENANCE')
+
+    def handle(self, *args, **options):
+        if options['flag']:
+            flagged = flag_overdue()
+            self.stdout.write(self.style.WARNING(
+                f"Flagged {flagged['gauges']} gauges and {flagged['machines']} machines as overdue"
+            ))
+
+        schedule = calibration_schedule(options['horizon'])
+        for gauge in schedule['gauges']:
+            self.stdout.write(
+                f"gauge   {gauge['stock_code']:<30} due {gauge['upcoming_calibration_date']} "
+                f"({gauge['days_until_due']:+d} days) {gauge['status']}"
+            )
+        for machine in schedule['machines']:
+            self.stdout.write(
+                f"machine {machine['machine_code']:<30} due {machine['next_calibration_date']} "
+                f"({machine['days_until_due']:+d} days) {machine['status']}"
+            )
+        for work_order in schedule['affected_work_orders']:
+            self.stdout.write(
+                f"work order {work_order['order_number']} ({work_order['status']}) waits on "
+                f"{', '.join(work_order['gauges'] + work_order['machines'])}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(schedule['gauges'])} gauges ({schedule['overdue_gauges']} overdue) and "
+            f"{len(schedule['machines'])} machines ({schedule['overdue_machines']} overdue) due within "
+            f"{schedule['horizon_days']} days; {len(schedule['affected_workflows'])} active workflow steps and "
+            f"{len(schedule['affected_work_orders'])} open work orders affected"
+        ))
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:46
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_machine_calibration_dates(apps, schema_editor):
+    Machine = apps.get_model('manufacturing', 'Machine')
+    CalibrationRecord = apps.get_model('quality_control', 'CalibrationRecord')
+    latest = CalibrationRecord.objects.filter(machine=OuterRef('pk')).order_by('-calibration_date', '-id')
+    Machine.objects.update(
+        last_calibration_date=Subquery(latest.values('calibration_date')[:1]),
+        next_calibration_date=Subquery(latest.values('next_calibration_date')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0021_machine_calibration_dates'),
+        ('quality_control', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_machine_calibration_dates, migrations.RunPython.noop),
+    ]
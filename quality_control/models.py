@@ -1,4 +1,6 @@
 from django.db import models
+from model_utils import FieldTracker
+from erp_core.blobs import storing
 from erp_core.models import BaseModel, User
 from manufacturing.models import Machine, BOM, WorkOrder
 
@@ -18,6 +20,11 @@ class QualityDocument(BaseModel):
     related_product = models.ForeignKey('inventory.Product', on_delete=models.SET_NULL, null=True, blank=True)
     file = models.FileField(upload_to='quality_documents/')
     approved_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name='approved_documents')
+    tracker = FieldTracker(fields=['file'])
+
+    def save(self, *args, **kwargs):
+        with storing(self, 'file'):
+            super().save(*args, **kwargs)
 
 class QualityChecklist(BaseModel):
     name = models.CharField(max_length=200)
@@ -1,8 +1,22 @@
 from django.core.exceptions import ValidationError
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from erp_core.blobs import release
+from .models import CalibrationRecord, QualityDocument
+from .calibration import sync_machine_calibration
 
 @receiver(pre_save, sender=CalibrationRecord)
 def validate_calibration_dates(sender, instance, **kwargs):
     if instance.next_calibration_date <= instance.calibration_date:
-        raise ValidationError("Next calibration date must be after calibration date") 
\ No newline at end of file
+        raise ValidationError("Next calibration date must be after calibration date")
+
+@receiver(post_save, sender=CalibrationRecord)
+@receiver(post_delete, sender=CalibrationRecord)
+def update_machine_calibration(sender, instance, **kwargs):
+    """Carry the machine's latest calibration dates over to the machine"""
+    sync_machine_calibration([instance.machine_id])
+
+@receiver(post_delete, sender=QualityDocument)
+def release_document_file(sender, instance, **kwargs):
+    """The document no longer points at its file's blob"""
+    release(instance.file.name)
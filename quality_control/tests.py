@@ -1,3 +1,81 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from inventory.models import ControlGauge, InventoryCategory, Product
+from manufacturing.models import Machine, MachineType, ProcessConfig, ProductWorkflow
+from .calibration import calibration_schedule, flag_overdue
+from .models import CalibrationRecord
+
+User = get_user_model()
+
+
+class CalibrationScheduleTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.today = date(2025, 6, 15)
+        self.gauges = {
+            code: ControlGauge.objects.create(
+                stock_code=code, stock_name=code, status=gauge_status,
+                upcoming_calibration_date=self.today + timedelta(days=days),
+            ) for code, days, gauge_status in [
+                ('G-OVERDUE', -2, 'UYGUN'),
+                ('G-SOON', 10, 'UYGUN'),
+                ('G-LATER', 100, 'UYGUN'),
+                ('G-SCRAPPED', -100, 'HURDA'),
+            ]
+        }
+        self.machine = Machine.objects.create(machine_code='M-01', machine_type=MachineType.CNC_TORNA)
+        for calibrated_days_ago, next_due in [(400, -35), (370, -5)]:
+            CalibrationRecord.objects.create(
+                machine=self.machine, calibrated_by=self.user,
+                calibration_date=self.today - timedelta(days=calibrated_days_ago),
+                next_calibration_date=self.today + timedelta(days=next_due),
+                certificate_url='https://example.com/certificate.pdf', parameters={},
+            )
+
+    def test_machine_dates_follow_latest_record(self):
+        """Test that calibration records keep the machine's due date from the latest one"""
+        self.machine.refresh_from_db()
+        self.assertEqual(self.machine.last_calibration_date, self.today - timedelta(days=370))
+        self.assertEqual(self.machine.next_calibration_date, self.today - timedelta(days=5))
+
+    def test_due_lists_within_horizon_overdue_first(self):
+        """Test that the due lists cover the horizon, put overdue first and skip retired gauges"""
+        schedule = calibration_schedule(30, today=self.today)
+
+        self.assertEqual([gauge['stock_code'] for gauge in schedule['gauges']], ['G-OVERDUE', 'G-SOON'])
+        self.assertEqual([gauge['days_until_due'] for gauge in schedule['gauges']], [-2, 10])
+        self.assertEqual(schedule['overdue_gauges'], 1)
+        self.assertEqual([machine['machine_code'] for machine in schedule['machines']], ['M-01'])
+        self.assertEqual(schedule['overdue_machines'], 1)
+
+    def test_affected_workflows_need_a_due_gauge(self):
+        """Test that only active workflows using a due gauge are listed"""
+        category = InventoryCategory.objects.create(name='MAMUL')
+        product = Product.objects.create(
+            product_code='P-001', product_name='Product 1', product_type='SINGLE', inventory_category=category
+        )
+        active = ProductWorkflow.objects.create(product=product, version='1.0', status='ACTIVE', created_by=self.user)
+        draft = ProductWorkflow.objects.create(product=product, version='2.0', created_by=self.user)
+        for workflow in (active, draft):
+            ProcessConfig.objects.create(workflow=workflow, control_gauge=self.gauges['G-SOON'])
+        ProcessConfig.objects.create(workflow=active, control_gauge=self.gauges['G-LATER'], sequence_order=2)
+
+        workflows = calibration_schedule(30, today=self.today)['affected_workflows']
+        self.assertEqual([(row['workflow'], row['control_gauge__stock_code']) for row in workflows], [(active.id, 'G-SOON')])
+
+    def test_flag_overdue_takes_gauges_and_idle_machines_out_of_use(self):
+        """Test that overdue usable gauges and available machines are flagged and nothing else"""
+        self.assertEqual(flag_overdue(today=self.today), {'gauges': 1, 'machines': 1})
+
+        statuses = dict(ControlGauge.objects.values_list('stock_code', 'status'))
+        self.assertEqual(statuses, {
+            'G-OVERDUE': 'KALIBRASYONDA', 'G-SOON': 'UYGUN', 'G-LATER': 'UYGUN', 'G-SCRAPPED': 'HURDA',
+        })
+        self.machine.refresh_from_db()
+        self.assertEqual(self.machine.status, 'MAINTENANCE')
+        self.assertEqual(flag_overdue(today=self.today), {'gauges': 0, 'machines': 0})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SalesOrder, SalesOrderItem, Shipping
+from .models import SalesOrder, SalesOrderItem, Shipping, DemandForecast, OverdueBacklogSnapshot, CustomerBacklogSummary
 
 class SalesOrderItemInline(admin.TabularInline):
     model = SalesOrderItem
@@ -20,3 +20,21 @@ class ShippingAdmin(admin.ModelAdmin):
     list_display = ['shipping_no', 'order', 'shipping_date', 'quantity', 'package_number']
     list_filter = ['shipping_date']
     search_fields = ['shipping_no', 'order__order_number']
+
+@admin.register(DemandForecast)
+class DemandForecastAdmin(admin.ModelAdmin):
+    list_display = ['product', 'model', 'period_start', 'forecast_quantity', 'mean_absolute_error', 'generated_at']
+    list_filter = ['model', 'period_start']
+    search_fields = ['product__product_code', 'product__product_name']
+
+@admin.register(OverdueBacklogSnapshot)
+class OverdueBacklogSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['snapshot_date', 'customer', 'bucket', 'item_count', 'open_quantity']
+    list_filter = ['snapshot_date', 'bucket']
+    search_fields = ['customer__code', 'customer__name']
+
+@admin.register(CustomerBacklogSummary)
+class CustomerBacklogSummaryAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'month', 'open_quantity', 'overdue_quantity', 'fill_rate', 'refreshed_at']
+    list_filter = ['month']
+    search_fields = ['customer__code', 'customer__name']
@@ -0,0 +1,116 @@
+"""
+Maintained per-customer backlog and fulfillment summary.
+
+CustomerBacklogSummary is rebuilt from SalesOrderItem with one grouped query
+per refresh. Item, order and shipment changes queue the affected customers and
+only those are rebuilt when the transaction commits; the scheduled
+refresh_customer_backlog command rebuilds everything so overdue quantities
+follow the calendar.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import F, Q, Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import SalesOrder, SalesOrderItem, CustomerBacklogSummary
+
+_dirty = threading.local()
+
+SUMMARY_FIELDS = [
+    'item_count', 'ordered_quantity', 'fulfilled_quantity', 'open_quantity',
+    'overdue_quantity', 'fill_rate', 'refreshed_at',
+]
+
+
+def backlog_rows(customer_ids=None, as_of=None):
+    """Grouped backlog figures per (customer, month) in one query."""
+    as_of = as_of or timezone.now().date()
+    unfulfilled = Q(fulfilled_quantity__lt=F('ordered_quantity'))
+    open_quantity = F('ordered_quantity') - F('fulfilled_quantity')
+
+    queryset = SalesOrderItem.objects.annotate(
+        month=TruncMonth(Coalesce('deadline_date', 'receiving_date'))
+    ).filter(month__isnull=False)
+    if customer_ids is not None:
+        queryset = queryset.filter(sales_order__customer_id__in=customer_ids)
+
+    return queryset.values(
+        'month', customer_id=F('sales_order__customer_id')
+    ).annotate(
+        item_count=Count('id'),
+        ordered=Coalesce(Sum('ordered_quantity'), Value(0)),
+        fulfilled=Coalesce(Sum('fulfilled_quantity'), Value(0)),
+        open=Coalesce(Sum(open_quantity, filter=unfulfilled), Value(0)),
+        overdue=Coalesce(Sum(open_quantity, filter=unfulfilled & Q(deadline_date__lt=as_of)), Value(0)),
+    ).order_by()
+
+
+def refresh_customer_backlog(customer_ids=None, as_of=None):
+    """
+    Rebuild summary rows for the given customers, or for everyone when
+    customer_ids is None. The swap happens in one transaction so readers see
+    either the old or the new rows. Rows are upserted on (customer, month),
+    in key order, so concurrent refreshes of one customer wait for each other
+    instead of failing on the unique constraint; months no longer present
+    are those the upsert did not touch.
+
+    Returns:
+        Number of summary rows written
+    """
+    refreshed_at = timezone.now()
+    summaries = [
+        CustomerBacklogSummary(
+            customer_id=row['customer_id'],
+            month=row['month'],
+            item_count=row['item_count'],
+            ordered_quantity=row['ordered'],
+            fulfilled_quantity=row['fulfilled'],
+            open_quantity=row['open'],
+            overdue_quantity=row['overdue'],
+            fill_rate=row['fulfilled'] / row['ordered'] if row['ordered'] else 0,
+            refreshed_at=refreshed_at,
+        )
+        for row in backlog_rows(customer_ids, as_of).order_by('customer_id', 'month')
+    ]
+
+    with transaction.atomic():
+        CustomerBacklogSummary.objects.bulk_create(
+            summaries, batch_size=1000, update_conflicts=True,
+            unique_fields=['customer', 'month'], update_fields=SUMMARY_FIELDS,
+        )
+        stale = CustomerBacklogSummary.objects.filter(refreshed_at__lt=refreshed_at)
+        if customer_ids is not None:
+            stale = stale.filter(customer_id__in=customer_ids)
+        stale.delete()
+    return len(summaries)
+
+
+def _flush_dirty_backlog():
+    order_ids = getattr(_dirty, 'order_ids', None) or set()
+    customer_ids = getattr(_dirty, 'customer_ids', None) or set()
+    if not order_ids and not customer_ids:
+        return
+    _dirty.order_ids = set()
+    _dirty.customer_ids = set()
+    customer_ids |= set(
+        SalesOrder.objects.filter(pk__in=order_ids).values_list('customer_id', flat=True)
+    )
+    refresh_customer_backlog(customer_ids)
+
+
+def mark_backlog_dirty(order_id=None, customer_id=None):
+    """
+    Queue the customer of an order (or a customer directly) for a backlog
+    refresh when the current transaction commits.
+    """
+    if not hasattr(_dirty, 'order_ids'):
+        _dirty.order_ids = set()
+        _dirty.customer_ids = set()
+    if order_id is not None:
+        _dirty.order_ids.add(order_id)
+    if customer_id is not None:
+        _dirty.customer_ids.add(customer_id)
+    # Registered on every call so a rolled back savepoint cannot drop the flush
+    transaction.on_commit(_flush_dirty_backlog)
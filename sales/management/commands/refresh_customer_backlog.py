@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from sales.backlog import refresh_customer_backlog
+
+class Command(BaseCommand):
+    help = 'Rebuild the customer backlog summary (run daily so overdue quantities follow the calendar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer', type=int, action='append', dest='customers',
+                            help='Only rebuild these customer IDs (repeatable)')
+
+    def handle(self, *args, **options):
+        count = refresh_customer_backlog(customer_ids=options['customers'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} customer backlog rows"))
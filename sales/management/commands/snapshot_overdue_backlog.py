@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from dateutil.parser import parse
+from sales.overdue import snapshot_overdue_backlog, DEFAULT_AT_RISK_DAYS
+
+class Command(BaseCommand):
+    help = 'Snapshot the overdue and at-risk sales backlog per customer (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=str, default=None, help='Snapshot date (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--at-risk-days', type=int, default=DEFAULT_AT_RISK_DAYS,
+                            help='Items due within this many days count as at risk')
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['date']:
+            try:
+                as_of = parse(options['date']).date()
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+
+        count = snapshot_overdue_backlog(as_of=as_of, at_risk_days=options['at_risk_days'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} overdue backlog snapshot rows"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_historicaltechnicaldrawing_and_more'),
+        ('sales', '0014_alter_salesorder_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('SES', 'Simple Exponential Smoothing'), ('SEASONAL', 'Seasonal Exponential Smoothing')], max_length=20)),
+                ('period_start', models.DateField(help_text='Monday of the forecast week')),
+                ('forecast_quantity', models.FloatField()),
+                ('mean_absolute_error', models.FloatField(blank=True, help_text='In-sample one-step-ahead MAE', null=True)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demand_forecasts', to='inventory.product')),
+            ],
+            options={
+                'ordering': ['product', 'model', 'period_start'],
+                'indexes': [models.Index(fields=['period_start', 'model'], name='sales_deman_period__cd0990_idx')],
+                'unique_together': {('product', 'model', 'period_start')},
+            },
+        ),
+    ]
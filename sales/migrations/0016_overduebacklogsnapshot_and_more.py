@@ -0,0 +1,52 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp_core', '0004_alter_userprofile_options'),
+        ('inventory', '0007_historicaltechnicaldrawing_and_more'),
+        ('sales', '0015_demandforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueBacklogSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('bucket', models.CharField(choices=[('AT_RISK', 'Due soon'), ('LATE_1_7', '1-7 days late'), ('LATE_8_30', '8-30 days late'), ('LATE_31_90', '31-90 days late'), ('LATE_90_PLUS', 'Over 90 days late')], max_length=20)),
+                ('item_count', models.IntegerField(default=0)),
+                ('open_quantity', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-snapshot_date', 'customer', 'bucket'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='salesorderitem',
+            index=models.Index(condition=models.Q(('fulfilled_quantity__lt', models.F('ordered_quantity'))), fields=['deadline_date', 'sales_order'], name='sales_item_open_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesorderitem',
+            index=models.Index(condition=models.Q(('fulfilled_quantity__lt', models.F('ordered_quantity'))), fields=['kapsam_deadline_date', 'sales_order'], name='sales_item_open_kapsam_idx'),
+        ),
+        migrations.AddField(
+            model_name='overduebacklogsnapshot',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overdue_snapshots', to='erp_core.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='overduebacklogsnapshot',
+            index=models.Index(fields=['customer', 'snapshot_date'], name='sales_overd_custome_c5d397_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='overduebacklogsnapshot',
+            unique_together={('snapshot_date', 'customer', 'bucket')},
+        ),
+    ]
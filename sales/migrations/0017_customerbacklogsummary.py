@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erp_core', '0004_alter_userprofile_options'),
+        ('sales', '0016_overduebacklogsnapshot_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerBacklogSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the deadline month')),
+                ('item_count', models.IntegerField(default=0)),
+                ('ordered_quantity', models.IntegerField(default=0)),
+                ('fulfilled_quantity', models.IntegerField(default=0)),
+                ('open_quantity', models.IntegerField(default=0)),
+                ('overdue_quantity', models.IntegerField(default=0)),
+                ('fill_rate', models.FloatField(default=0, help_text='Fulfilled / ordered quantity')),
+                ('refreshed_at', models.DateTimeField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backlog_summaries', to='erp_core.customer')),
+            ],
+            options={
+                'ordering': ['customer', 'month'],
+                'indexes': [models.Index(fields=['month', 'customer'], name='sales_custo_month_02fca5_idx')],
+                'unique_together': {('customer', 'month')},
+            },
+        ),
+    ]
@@ -4,11 +4,15 @@ from erp_core.models import BaseModel, User, Customer
 from inventory.models import Product
 from model_utils import FieldTracker
 import uuid
-from django.db.models import Sum, F
+from django.db.models import Sum, Count, F, Q, Exists, OuterRef, Case, When, Value
 from django.utils import timezone
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db import connection
+from django.db import connection, transaction
+import threading
+
+# Orders whose status must be recomputed when the current transaction commits
+_dirty_orders = threading.local()
 
 class SalesOrder(BaseModel):
     STATUS_CHOICES = [
@@ -24,7 +28,7 @@ class SalesOrder(BaseModel):
         choices=STATUS_CHOICES,
         default='OPEN'
     )
-    tracker = FieldTracker(fields=['status'])
+    tracker = FieldTracker(fields=['status', 'customer'])
     
     def __str__(self):
         return f"{self.order_number} - {self.customer.name}"
@@ -42,25 +46,17 @@ class SalesOrder(BaseModel):
         super().clean()
 
     def update_order_status(self):
-        """Update order status based on items fulfillment"""
-        all_items = self.items.all()
-        if not all_items.exists():
-            return
-        
-        # Check if all items are fully fulfilled
-        all_fulfilled = True
-        for item in all_items:
-            if item.fulfilled_quantity < item.ordered_quantity:
-                all_fulfilled = False
-                break
-        
-        # Update status if needed
-        if all_fulfilled and self.status != 'CLOSED':
-            self.status = 'CLOSED'
-            self.save(update_fields=['status'])
-        elif not all_fulfilled and self.status == 'CLOSED':
-            self.status = 'OPEN'
-            self.save(update_fields=['status'])
+        """
+        Update order status based on items fulfillment.
+
+        Recomputed now through recompute_order_statuses, so the instance holds
+        the new status, and taken out of the orders recomputed at commit.
+        Callers updating several orders mark them dirty and recompute them
+        together instead.
+        """
+        recompute_order_statuses([self.pk])
+        self.refresh_from_db(fields=['status'])
+        return self.status
 
 class SalesOrderItem(models.Model):
     sales_order = models.ForeignKey(SalesOrder, on_delete=models.CASCADE, related_name='items')
@@ -71,6 +67,21 @@ class SalesOrderItem(models.Model):
     deadline_date = models.DateField(null=True, blank=True, help_text="Deadline date for the order item")
     kapsam_deadline_date = models.DateField(null=True, blank=True, help_text="Deadline date for kapsam for the order item")
 
+    class Meta:
+        indexes = [
+            # Partial indexes over unfulfilled items back the overdue scanner
+            models.Index(
+                fields=['deadline_date', 'sales_order'],
+                name='sales_item_open_deadline_idx',
+                condition=Q(fulfilled_quantity__lt=F('ordered_quantity')),
+            ),
+            models.Index(
+                fields=['kapsam_deadline_date', 'sales_order'],
+                name='sales_item_open_kapsam_idx',
+                condition=Q(fulfilled_quantity__lt=F('ordered_quantity')),
+            ),
+        ]
+
     def clean(self):
         if self.fulfilled_quantity > self.ordered_quantity:
             raise ValidationError("Fulfilled quantity cannot exceed ordered quantity")
@@ -93,11 +104,8 @@ class SalesOrderItem(models.Model):
         )['total'] or 0
         if self.fulfilled_quantity != total_shipped:
             self.fulfilled_quantity = total_shipped
-            # Indicate update is coming from the shipping process
-            self._update_from_shipment = True
+            # The post_save signal marks the parent order for status recomputation
             self.save(update_fields=['fulfilled_quantity'])
-            delattr(self, '_update_from_shipment')
-            self.sales_order.update_order_status()
 
     def is_fully_fulfilled(self):
         """Check if the item is fully fulfilled"""
@@ -144,6 +152,138 @@ class Shipping(BaseModel):
         is_new = self._state.adding
         super().save(*args, **kwargs)
 
+class DemandForecast(models.Model):
+    """
+    Weekly demand forecast per product, produced in batch by
+    sales.forecasting.run_demand_forecast and read by MRP and the dashboard.
+    """
+    MODEL_CHOICES = [
+        ('SES', 'Simple Exponential Smoothing'),
+        ('SEASONAL', 'Seasonal Exponential Smoothing'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='demand_forecasts')
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    period_start = models.DateField(help_text="Monday of the forecast week")
+    forecast_quantity = models.FloatField()
+    mean_absolute_error = models.FloatField(null=True, blank=True, help_text="In-sample one-step-ahead MAE")
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['product', 'model', 'period_start']
+        unique_together = [['product', 'model', 'period_start']]
+        indexes = [
+            models.Index(fields=['period_start', 'model']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.product_code} - {self.model} - {self.period_start}: {self.forecast_quantity:.1f}"
+
+class OverdueBacklogSnapshot(models.Model):
+    """
+    Daily per-customer snapshot of overdue and at-risk order items,
+    written by the snapshot_overdue_backlog management command.
+    """
+    BUCKET_CHOICES = [
+        ('AT_RISK', 'Due soon'),
+        ('LATE_1_7', '1-7 days late'),
+        ('LATE_8_30', '8-30 days late'),
+        ('LATE_31_90', '31-90 days late'),
+        ('LATE_90_PLUS', 'Over 90 days late'),
+    ]
+
+    snapshot_date = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='overdue_snapshots')
+    bucket = models.CharField(max_length=20, choices=BUCKET_CHOICES)
+    item_count = models.IntegerField(default=0)
+    open_quantity = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-snapshot_date', 'customer', 'bucket']
+        unique_together = [['snapshot_date', 'customer', 'bucket']]
+        indexes = [
+            models.Index(fields=['customer', 'snapshot_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.snapshot_date} - {self.customer.code} - {self.bucket}: {self.open_quantity}"
+
+class CustomerBacklogSummary(models.Model):
+    """
+    Maintained per-customer, per-month backlog and fulfillment figures.
+
+    Rows are rebuilt by sales.backlog from SalesOrderItem; the month is the
+    item's deadline month, falling back to its receiving month.
+    """
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='backlog_summaries')
+    month = models.DateField(help_text="First day of the deadline month")
+    item_count = models.IntegerField(default=0)
+    ordered_quantity = models.IntegerField(default=0)
+    fulfilled_quantity = models.IntegerField(default=0)
+    open_quantity = models.IntegerField(default=0)
+    overdue_quantity = models.IntegerField(default=0)
+    fill_rate = models.FloatField(default=0, help_text="Fulfilled / ordered quantity")
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['customer', 'month']
+        unique_together = ['customer', 'month']
+        indexes = [
+            models.Index(fields=['month', 'customer']),
+        ]
+
+    def __str__(self):
+        return f"{self.customer} - {self.month:%Y-%m}"
+
+def recompute_order_statuses(order_ids):
+    """
+    Recompute OPEN/CLOSED status for the given orders with a single UPDATE ... WHERE.
+
+    An order with items is CLOSED when every item is fully fulfilled and goes back
+    to OPEN from CLOSED otherwise; only rows whose status actually changes are written.
+    Returns the number of orders updated.
+    """
+    if not order_ids:
+        return 0
+    # Recomputed now, so the commit-time flush need not do it again
+    getattr(_dirty_orders, 'ids', set()).difference_update(order_ids)
+
+    has_items = SalesOrderItem.objects.filter(sales_order=OuterRef('pk'))
+    has_unfulfilled = has_items.filter(fulfilled_quantity__lt=F('ordered_quantity'))
+
+    return SalesOrder.objects.filter(
+        Exists(has_items),
+        Q(~Exists(has_unfulfilled), ~Q(status='CLOSED')) | Q(Exists(has_unfulfilled), status='CLOSED'),
+        pk__in=order_ids,
+    ).update(
+        status=Case(
+            When(Exists(has_unfulfilled), then=Value('OPEN')),
+            default=Value('CLOSED'),
+        )
+    )
+
+def _flush_dirty_orders():
+    order_ids = getattr(_dirty_orders, 'ids', None)
+    if order_ids:
+        _dirty_orders.ids = set()
+        recompute_order_statuses(order_ids)
+
+def mark_order_dirty(order_id):
+    """
+    Queue an order for status recomputation when the current transaction commits.
+
+    All orders marked during a transaction are recomputed together at commit;
+    outside a transaction the recomputation runs immediately.
+    """
+    if order_id is None:
+        return
+    if not hasattr(_dirty_orders, 'ids'):
+        _dirty_orders.ids = set()
+    _dirty_orders.ids.add(order_id)
+    # Registered on every call so a rolled back savepoint cannot drop the flush
+    transaction.on_commit(_flush_dirty_orders)
+
 @receiver(post_delete, sender=Shipping)
 def update_on_shipment_delete(sender, instance, **kwargs):
     """Update fulfilled quantity and order status when a shipment is deleted"""
@@ -163,29 +303,9 @@ def update_on_shipment_delete(sender, instance, **kwargs):
         # Refresh the order item from the database
         instance.order_item.refresh_from_db()
         
-        # Check if all items in the order are fully fulfilled
-        all_items_fulfilled = True
-        for item in instance.order.items.all():
-            item.refresh_from_db()  # Ensure we have the latest data
-            if item.fulfilled_quantity < item.ordered_quantity:
-                all_items_fulfilled = False
-                break
-        
-        # Update order status if needed
-        if all_items_fulfilled and instance.order.status != 'CLOSED':
-            instance.order.status = 'CLOSED'
-            instance.order.save(update_fields=['status'])
-        elif not all_items_fulfilled and instance.order.status == 'CLOSED':
-            instance.order.status = 'OPEN'
-            instance.order.save(update_fields=['status'])
+        mark_order_dirty(instance.order_id)
 
 @receiver(post_save, sender=SalesOrderItem)
 def check_order_status_on_item_change(sender, instance, **kwargs):
     """Check and update order status when an order item changes"""
-    # Skip if this update is from a shipment process
-    # as the update_fulfilled_quantity method already updates the order status
-    if hasattr(instance, '_update_from_shipment') and instance._update_from_shipment:
-        return
-        
-    if instance.sales_order:
-        instance.sales_order.update_order_status()
+    mark_order_dirty(instance.sales_order_id)
@@ -0,0 +1,113 @@
+"""
+Overdue and at-risk scanning of unfulfilled sales order items.
+
+Deadlines live on SalesOrderItem.deadline_date and kapsam_deadline_date. Both
+are covered by partial indexes restricted to unfulfilled items, and every
+query here filters on the same predicate so the planner can use them.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q, F, Count, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import SalesOrderItem, OverdueBacklogSnapshot
+
+DEFAULT_AT_RISK_DAYS = 7
+
+DEADLINE_FIELDS = {
+    'deadline': 'deadline_date',
+    'kapsam': 'kapsam_deadline_date',
+}
+
+# (bucket, min days late, max days late); None means unbounded.
+# AT_RISK covers items that are not late yet but due within the at-risk window.
+LATENESS_BUCKETS = [
+    ('AT_RISK', None, 0),
+    ('LATE_1_7', 1, 7),
+    ('LATE_8_30', 8, 30),
+    ('LATE_31_90', 31, 90),
+    ('LATE_90_PLUS', 91, None),
+]
+
+
+def unfulfilled_items():
+    """Items with open quantity; matches the partial index predicate."""
+    return SalesOrderItem.objects.filter(fulfilled_quantity__lt=F('ordered_quantity'))
+
+
+def _bucket_filter(deadline_field, as_of, min_days_late, max_days_late, at_risk_days):
+    """Translate a days-late range into a deadline date range."""
+    if min_days_late is None:
+        min_days_late = -(at_risk_days - 1)
+    conditions = {f'{deadline_field}__lte': as_of - timedelta(days=min_days_late)}
+    if max_days_late is not None:
+        conditions[f'{deadline_field}__gte'] = as_of - timedelta(days=max_days_late)
+    return Q(**conditions)
+
+
+def scan_items(as_of=None, at_risk_days=DEFAULT_AT_RISK_DAYS, deadline_field='deadline_date'):
+    """
+    Unfulfilled items that are overdue or due within the at-risk window,
+    most overdue first.
+    """
+    as_of = as_of or timezone.now().date()
+    return unfulfilled_items().filter(
+        **{f'{deadline_field}__lt': as_of + timedelta(days=at_risk_days)}
+    ).select_related(
+        'sales_order', 'sales_order__customer', 'product'
+    ).order_by(deadline_field, 'id')
+
+
+def lateness_by_customer(as_of=None, at_risk_days=DEFAULT_AT_RISK_DAYS, deadline_field='deadline_date'):
+    """
+    Lateness buckets per customer in one grouped query.
+
+    Each row has the customer id, code and name plus '<bucket>_items' and
+    '<bucket>_quantity' (open quantity) for every bucket in LATENESS_BUCKETS.
+    """
+    as_of = as_of or timezone.now().date()
+    open_quantity = F('ordered_quantity') - F('fulfilled_quantity')
+
+    annotations = {}
+    for bucket, min_days_late, max_days_late in LATENESS_BUCKETS:
+        condition = _bucket_filter(deadline_field, as_of, min_days_late, max_days_late, at_risk_days)
+        annotations[f'{bucket.lower()}_items'] = Count('id', filter=condition)
+        annotations[f'{bucket.lower()}_quantity'] = Coalesce(Sum(open_quantity, filter=condition), Value(0))
+
+    return unfulfilled_items().filter(
+        **{f'{deadline_field}__lt': as_of + timedelta(days=at_risk_days)}
+    ).values(
+        customer_id=F('sales_order__customer_id'),
+        customer_code=F('sales_order__customer__code'),
+        customer_name=F('sales_order__customer__name'),
+    ).annotate(**annotations).order_by('customer_code')
+
+
+def snapshot_overdue_backlog(as_of=None, at_risk_days=DEFAULT_AT_RISK_DAYS):
+    """
+    Store today's lateness buckets per customer. Re-running for the same date
+    replaces that day's snapshot.
+
+    Returns:
+        Number of snapshot rows written
+    """
+    as_of = as_of or timezone.now().date()
+    snapshots = []
+    for row in lateness_by_customer(as_of, at_risk_days):
+        for bucket, _, _ in LATENESS_BUCKETS:
+            item_count = row[f'{bucket.lower()}_items']
+            if item_count:
+                snapshots.append(OverdueBacklogSnapshot(
+                    snapshot_date=as_of,
+                    customer_id=row['customer_id'],
+                    bucket=bucket,
+                    item_count=item_count,
+                    open_quantity=row[f'{bucket.lower()}_quantity'],
+                ))
+
+    with transaction.atomic():
+        OverdueBacklogSnapshot.objects.filter(snapshot_date=as_of).delete()
+        OverdueBacklogSnapshot.objects.bulk_create(snapshots)
+    return len(snapshots)
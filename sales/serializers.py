@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import SalesOrder, SalesOrderItem, Shipping
+from .models import (
+    SalesOrder, SalesOrderItem, Shipping, DemandForecast, OverdueBacklogSnapshot,
+    CustomerBacklogSummary, mark_order_dirty, recompute_order_statuses
+)
 from inventory.serializers import ProductSerializer
 from inventory.models import Product, InventoryTransaction
 from erp_core.models import Customer
@@ -292,23 +295,11 @@ class ShippingSerializer(serializers.ModelSerializer):
             # Create the shipping record
             shipping = Shipping.objects.create(**validated_data)
             
-            # Update the fulfilled quantity on the order item
-            all_shipments = Shipping.objects.filter(order_item=order_item)
-            total_shipped = all_shipments.aggregate(total=Sum('quantity'))['total'] or 0
-            SalesOrderItem.objects.filter(id=order_item.id).update(fulfilled_quantity=total_shipped)
-            
+            # Update the fulfilled quantity on the order item; saving the item
+            # also moves the shipped quantity out of its stock reservation
             order_item.refresh_from_db()
-            order.refresh_from_db()
-            
-            # Fix the field name from 'quantity' to 'ordered_quantity'
-            if all([item.fulfilled_quantity >= item.ordered_quantity for item in order.items.all()]):
-                if order.status != 'CLOSED':
-                    order.status = 'CLOSED'
-                    order.save(update_fields=['status'])
-            else:
-                if order.status == 'CLOSED':
-                    order.status = 'OPEN'
-                    order.save(update_fields=['status'])
+            order_item.update_fulfilled_quantity()
+            order.update_order_status()
             
             shipping = Shipping.objects.select_related('order', 'order_item').prefetch_related('order_item__product').get(id=shipping.id)
             return shipping
@@ -536,6 +527,7 @@ class BatchOrderShipmentUpdateSerializer(serializers.Serializer):
     @transaction.atomic
     def update(self, instance, validated_data):
         updated_shipments = []
+        orders = {}
         for shipment_data in validated_data['shipments']:
             shipping = shipment_data['shipping']
             
@@ -551,9 +543,78 @@ class BatchOrderShipmentUpdateSerializer(serializers.Serializer):
             shipping.order_item.update_fulfilled_quantity()
             shipping.order_item.save()
             
-            # Update order status
-            shipping.order.update_order_status()
+            # Order statuses are recomputed together once every shipment is saved
+            mark_order_dirty(shipping.order_id)
+            shipping.order = orders.setdefault(shipping.order_id, shipping.order)
             
             updated_shipments.append(shipping)
 
-        return updated_shipments
\ No newline at end of file
+        recompute_order_statuses(list(orders))
+        for order in orders.values():
+            order.refresh_from_db(fields=['status'])
+        return updated_shipments
+
+
+class DemandForecastSerializer(serializers.ModelSerializer):
+    product_code = serializers.CharField(source='product.product_code', read_only=True)
+    product_name = serializers.CharField(source='product.product_name', read_only=True)
+    model_display = serializers.CharField(source='get_model_display', read_only=True)
+
+    class Meta:
+        model = DemandForecast
+        fields = [
+            'id', 'product', 'product_code', 'product_name', 'model', 'model_display',
+            'period_start', 'forecast_quantity', 'mean_absolute_error', 'generated_at'
+        ]
+        read_only_fields = fields
+
+
+class OverdueItemSerializer(serializers.ModelSerializer):
+    """Flat representation of an unfulfilled item for the overdue scanner."""
+    order_id = serializers.IntegerField(source='sales_order.id', read_only=True)
+    order_number = serializers.CharField(source='sales_order.order_number', read_only=True)
+    customer_code = serializers.CharField(source='sales_order.customer.code', read_only=True)
+    customer_name = serializers.CharField(source='sales_order.customer.name', read_only=True)
+    product_code = serializers.CharField(source='product.product_code', read_only=True)
+    product_name = serializers.CharField(source='product.product_name', read_only=True)
+    open_quantity = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SalesOrderItem
+        fields = [
+            'id', 'order_id', 'order_number', 'customer_code', 'customer_name',
+            'product', 'product_code', 'product_name', 'ordered_quantity',
+            'fulfilled_quantity', 'open_quantity', 'deadline_date', 'kapsam_deadline_date'
+        ]
+        read_only_fields = fields
+
+    def get_open_quantity(self, obj):
+        return obj.ordered_quantity - obj.fulfilled_quantity
+
+
+class OverdueBacklogSnapshotSerializer(serializers.ModelSerializer):
+    customer_code = serializers.CharField(source='customer.code', read_only=True)
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+    bucket_display = serializers.CharField(source='get_bucket_display', read_only=True)
+
+    class Meta:
+        model = OverdueBacklogSnapshot
+        fields = [
+            'id', 'snapshot_date', 'customer', 'customer_code', 'customer_name',
+            'bucket', 'bucket_display', 'item_count', 'open_quantity'
+        ]
+        read_only_fields = fields
+
+
+class CustomerBacklogSummarySerializer(serializers.ModelSerializer):
+    customer_code = serializers.CharField(source='customer.code', read_only=True)
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+
+    class Meta:
+        model = CustomerBacklogSummary
+        fields = [
+            'id', 'customer', 'customer_code', 'customer_name', 'month', 'item_count',
+            'ordered_quantity', 'fulfilled_quantity', 'open_quantity', 'overdue_quantity',
+            'fill_rate', 'refreshed_at'
+        ]
+        read_only_fields = fields
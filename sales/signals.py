@@ -1,8 +1,10 @@
 from django.db import transaction
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import SalesOrder, Shipping
+from .models import SalesOrder, SalesOrderItem, Shipping
+from .backlog import mark_backlog_dirty
 from inventory.models import InventoryTransaction
+from inventory.reservations import sync_sales_item_reservation
 from django.core.exceptions import ValidationError
 
 @receiver(post_save, sender=Shipping)
@@ -44,6 +46,42 @@ def handle_shipment_deletion(sender, instance, **kwargs):
             reference_id=f"SHIP-{instance.shipping_no}",
             transaction_type='OUT'
         ).delete()
-        
-        # Update fulfilled quantity
-        instance.order_item.update_fulfilled_quantity() 
\ No newline at end of file
+        # Fulfilled quantity and order status are updated by the post_delete
+        # handler once the shipment row is gone
+
+@receiver(post_save, sender=SalesOrderItem)
+@receiver(post_delete, sender=SalesOrderItem)
+def refresh_backlog_on_item_change(sender, instance, **kwargs):
+    """Rebuild the customer's backlog summary once the transaction commits"""
+    mark_backlog_dirty(order_id=instance.sales_order_id)
+
+@receiver(post_save, sender=Shipping)
+@receiver(post_delete, sender=Shipping)
+def refresh_backlog_on_shipment_change(sender, instance, **kwargs):
+    """Shipment deletes update fulfilled quantities without saving the item"""
+    mark_backlog_dirty(order_id=instance.order_id)
+
+@receiver(post_save, sender=SalesOrder)
+def refresh_backlog_on_customer_change(sender, instance, created, **kwargs):
+    """Move the order's items between customer summaries when its customer changes"""
+    if not created and instance.tracker.has_changed('customer'):
+        mark_backlog_dirty(customer_id=instance.tracker.previous('customer'))
+        mark_backlog_dirty(customer_id=instance.customer_id)
+
+@receiver(post_delete, sender=SalesOrder)
+def refresh_backlog_on_order_delete(sender, instance, **kwargs):
+    """Drop the deleted order's items from the customer's summary"""
+    mark_backlog_dirty(customer_id=instance.customer_id)
+
+@receiver(post_save, sender=SalesOrderItem)
+def reserve_open_item_quantity(sender, instance, **kwargs):
+    """Keep the item's stock reservation equal to its open quantity"""
+    sync_sales_item_reservation(instance)
+
+@receiver(post_delete, sender=Shipping)
+def reserve_after_shipment_delete(sender, instance, **kwargs):
+    """Shipment deletes reopen item quantity without saving the item"""
+    if instance.order_item_id:
+        item = SalesOrderItem.objects.filter(pk=instance.order_item_id).first()
+        if item:
+            sync_sales_item_reservation(item)
@@ -1,12 +1,25 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from erp_core.models import Customer
-from inventory.models import Product
-from .models import SalesOrder, SalesOrderItem
+from inventory.models import Product, InventoryCategory
+from .models import (
+    SalesOrder, SalesOrderItem, Shipping, OverdueBacklogSnapshot, CustomerBacklogSummary,
+    recompute_order_statuses, mark_order_dirty
+)
+from .backlog import refresh_customer_backlog
+from .overdue import lateness_by_customer, scan_items, snapshot_overdue_backlog
+from datetime import date
 import json
+import numpy as np
+from .forecasting import (
+    weekly_demand_matrix, simple_exponential_smoothing,
+    seasonal_exponential_smoothing
+)
 
 User = get_user_model()
 
@@ -368,3 +381,397 @@ class BatchCreateSalesOrderItemsTest(APITestCase):
         
         # Check that no items were created
         self.assertEqual(SalesOrderItem.objects.count(), 0)
+
+
+class DemandForecastingTest(TestCase):
+    def test_weekly_demand_matrix_buckets_by_monday_week(self):
+        """Test that demand is summed per product and Monday-based week"""
+        product_ids = np.array([1, 1, 2, 1])
+        demand_dates = np.array(
+            ['2025-01-06', '2025-01-12', '2025-01-07', '2025-01-13'],  # Mon, Sun, Tue, Mon
+            dtype='datetime64[D]'
+        )
+        quantities = np.array([5.0, 3.0, 7.0, 2.0])
+        first_week = int((np.datetime64('2025-01-06').astype(np.int64) + 3) // 7)
+
+        products, matrix = weekly_demand_matrix(
+            product_ids, demand_dates, quantities, first_week, first_week + 1
+        )
+
+        self.assertEqual(list(products), [1, 2])
+        self.assertEqual(matrix.tolist(), [[8.0, 2.0], [7.0, 0.0]])
+
+    def test_simple_exponential_smoothing_constant_series(self):
+        """Test that a constant series smooths to its value with zero error"""
+        matrix = np.full((3, 10), 4.0)
+        level, mae = simple_exponential_smoothing(matrix, alpha=0.5)
+        np.testing.assert_allclose(level, 4.0)
+        np.testing.assert_allclose(mae, 0.0)
+
+    def test_seasonal_smoothing_requires_two_seasons(self):
+        """Test that seasonal smoothing is skipped for short histories"""
+        self.assertIsNone(seasonal_exponential_smoothing(np.ones((2, 7)), season_length=4))
+
+    def test_seasonal_smoothing_recovers_pattern(self):
+        """Test that a repeating pattern is captured by the seasonal indices"""
+        pattern = np.array([1.0, 5.0, 1.0, 5.0])
+        matrix = np.tile(pattern, 3)[None, :]
+        level, seasonal, mae = seasonal_exponential_smoothing(matrix, season_length=4)
+        np.testing.assert_allclose(level + seasonal[0], pattern)
+        np.testing.assert_allclose(mae, 0.0)
+
+
+class OrderStatusRecomputationTest(TestCase):
+    def setUp(self):
+        category = InventoryCategory.objects.create(name='MAMUL')
+        customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category
+        )
+        self.open_order = SalesOrder.objects.create(order_number='SO-OPEN', customer=customer)
+        self.closed_order = SalesOrder.objects.create(order_number='SO-CLOSED', customer=customer, status='CLOSED')
+        self.empty_order = SalesOrder.objects.create(order_number='SO-EMPTY', customer=customer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fulfilled_item = SalesOrderItem.objects.create(
+                sales_order=self.open_order, product=product, ordered_quantity=5, fulfilled_quantity=5
+            )
+            self.pending_item = SalesOrderItem.objects.create(
+                sales_order=self.closed_order, product=product, ordered_quantity=5, fulfilled_quantity=2
+            )
+
+    def test_item_changes_recompute_at_commit(self):
+        """Test that item saves mark orders dirty and statuses flip at commit"""
+        self.open_order.refresh_from_db()
+        self.closed_order.refresh_from_db()
+        self.assertEqual(self.open_order.status, 'CLOSED')
+        self.assertEqual(self.closed_order.status, 'OPEN')
+
+    def test_recompute_is_single_update(self):
+        """Test that all dirty orders are recomputed with one statement"""
+        SalesOrder.objects.filter(pk=self.open_order.pk).update(status='OPEN')
+        SalesOrderItem.objects.filter(pk=self.pending_item.pk).update(fulfilled_quantity=5)
+        order_ids = [self.open_order.pk, self.closed_order.pk, self.empty_order.pk]
+
+        with self.assertNumQueries(1):
+            updated = recompute_order_statuses(order_ids)
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(
+            dict(SalesOrder.objects.filter(pk__in=order_ids).values_list('order_number', 'status')),
+            {'SO-OPEN': 'CLOSED', 'SO-CLOSED': 'CLOSED', 'SO-EMPTY': 'OPEN'}
+        )
+
+    def test_marking_is_deferred_until_commit(self):
+        """Test that marking an order dirty does not touch it before commit"""
+        SalesOrder.objects.filter(pk=self.open_order.pk).update(status='OPEN')
+        with self.captureOnCommitCallbacks() as callbacks:
+            mark_order_dirty(self.open_order.pk)
+            mark_order_dirty(self.open_order.pk)
+            self.open_order.refresh_from_db()
+            self.assertEqual(self.open_order.status, 'OPEN')
+
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        self.open_order.refresh_from_db()
+        self.assertEqual(self.open_order.status, 'CLOSED')
+
+
+class OverdueScannerTest(TestCase):
+    def setUp(self):
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category
+        )
+        order = SalesOrder.objects.create(order_number='SO-001', customer=self.customer)
+        self.as_of = date(2024, 6, 30)
+        for deadline, ordered, fulfilled in [
+            (date(2024, 7, 3), 10, 4),    # at risk
+            (date(2024, 6, 25), 5, 0),    # 5 days late
+            (date(2024, 5, 1), 8, 2),     # 60 days late
+            (date(2024, 5, 1), 3, 3),     # late but fulfilled
+            (date(2024, 8, 1), 7, 0),     # not due yet
+        ]:
+            SalesOrderItem.objects.create(
+                sales_order=order, product=product, deadline_date=deadline,
+                ordered_quantity=ordered, fulfilled_quantity=fulfilled
+            )
+
+    def test_lateness_buckets(self):
+        """Test that open quantities land in the right lateness buckets"""
+        rows = list(lateness_by_customer(self.as_of))
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row['customer_code'], 'CUST01')
+        self.assertEqual((row['at_risk_items'], row['at_risk_quantity']), (1, 6))
+        self.assertEqual((row['late_1_7_items'], row['late_1_7_quantity']), (1, 5))
+        self.assertEqual((row['late_8_30_items'], row['late_8_30_quantity']), (0, 0))
+        self.assertEqual((row['late_31_90_items'], row['late_31_90_quantity']), (1, 6))
+
+    def test_scan_items_orders_most_overdue_first(self):
+        """Test that the item scan skips fulfilled and not-yet-due items"""
+        deadlines = list(scan_items(self.as_of).values_list('deadline_date', flat=True))
+        self.assertEqual(deadlines, [date(2024, 5, 1), date(2024, 6, 25), date(2024, 7, 3)])
+
+    def test_overdue_items_rejects_bad_customer(self):
+        """Test that a non-integer customer filter is a 400, not a server error"""
+        user = get_user_model().objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = reverse('sales:order-overdue-items')
+        response = client.get(url, {'customer': 'abc', 'as_of': '2024-06-30'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('customer', response.data)
+
+        response = client.get(url, {'customer': self.customer.id, 'as_of': '2024-06-30'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+
+    def test_snapshot_replaces_same_day(self):
+        """Test that re-running a snapshot for the same date replaces it"""
+        self.assertEqual(snapshot_overdue_backlog(self.as_of), 3)
+        self.assertEqual(snapshot_overdue_backlog(self.as_of), 3)
+        self.assertEqual(
+            dict(OverdueBacklogSnapshot.objects.values_list('bucket', 'open_quantity')),
+            {'AT_RISK': 6, 'LATE_1_7': 5, 'LATE_31_90': 6}
+        )
+
+
+class CompactSalesOrderListTest(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = InventoryCategory.objects.create(name='MAMUL')
+        customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        products = [
+            Product.objects.create(
+                product_code=f'P-00{i}', product_name=f'Product {i}',
+                product_type='MONTAGED', inventory_category=category
+            )
+            for i in range(3)
+        ]
+        for n in range(5):
+            order = SalesOrder.objects.create(order_number=f'SO-00{n}', customer=customer)
+            for product in products:
+                SalesOrderItem.objects.create(sales_order=order, product=product, ordered_quantity=10)
+
+    def test_compact_list_query_count_is_constant(self):
+        """Test that the compact list projects columns without per-item queries"""
+        url = reverse('sales:order-list')
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'view': 'compact'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 5)
+        order = response.data[0]
+        self.assertEqual(order['customer_code'], 'CUST01')
+        self.assertEqual(len(order['items']), 3)
+        self.assertEqual(order['items'][0]['product_code'], 'P-000')
+        self.assertNotIn('product_details', order['items'][0])
+
+
+class CustomerBacklogTest(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = InventoryCategory.objects.create(name='MAMUL')
+        self.customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        self.product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category
+        )
+        self.order = SalesOrder.objects.create(order_number='SO-001', customer=self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            SalesOrderItem.objects.create(
+                sales_order=self.order, product=self.product, deadline_date=date(2024, 5, 10),
+                ordered_quantity=10, fulfilled_quantity=4
+            )
+            SalesOrderItem.objects.create(
+                sales_order=self.order, product=self.product, deadline_date=date(2024, 5, 20),
+                ordered_quantity=10, fulfilled_quantity=10
+            )
+
+    def test_item_changes_refresh_summary(self):
+        """Test that item saves rebuild the customer's summary at commit"""
+        summary = CustomerBacklogSummary.objects.get(customer=self.customer)
+        self.assertEqual(summary.month, date(2024, 5, 1))
+        self.assertEqual(summary.item_count, 2)
+        self.assertEqual(summary.open_quantity, 6)
+        self.assertEqual(summary.overdue_quantity, 6)
+        self.assertAlmostEqual(summary.fill_rate, 0.7)
+
+    def test_overdue_follows_reference_date(self):
+        """Test that only items past their deadline count as overdue"""
+        refresh_customer_backlog(as_of=date(2024, 5, 1))
+        summary = CustomerBacklogSummary.objects.get(customer=self.customer)
+        self.assertEqual(summary.open_quantity, 6)
+        self.assertEqual(summary.overdue_quantity, 0)
+
+    def test_refresh_upserts_and_drops_vanished_months(self):
+        """Test that a refresh updates rows in place and removes months with no items"""
+        summary = CustomerBacklogSummary.objects.get(customer=self.customer)
+        CustomerBacklogSummary.objects.create(
+            customer=self.customer, month=date(2024, 1, 1), refreshed_at=summary.refreshed_at
+        )
+        self.assertEqual(refresh_customer_backlog([self.customer.id]), 1)
+        self.assertEqual(refresh_customer_backlog([self.customer.id]), 1)
+
+        rows = CustomerBacklogSummary.objects.filter(customer=self.customer)
+        self.assertEqual(list(rows.values_list('id', 'month')), [(summary.id, date(2024, 5, 1))])
+
+    def test_order_delete_clears_summary(self):
+        """Test that deleting the last order removes the customer's rows"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        self.assertFalse(CustomerBacklogSummary.objects.filter(customer=self.customer).exists())
+
+    def test_csv_export(self):
+        """Test that the export returns the filtered rows as CSV"""
+        url = reverse('sales:customer-backlog-export')
+        response = self.client.get(url, {'customer_code': 'CUST01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1], 'CUST01,Test Customer,2024-05,2,20,14,6,6,0.7000')
+
+
+class SalesItemReservationTest(TestCase):
+    def setUp(self):
+        category = InventoryCategory.objects.create(name='MAMUL')
+        customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        self.product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category,
+            current_stock=20
+        )
+        order = SalesOrder.objects.create(order_number='SO-001', customer=customer)
+        self.item = SalesOrderItem.objects.create(sales_order=order, product=self.product, ordered_quantity=8)
+
+    def test_open_quantity_is_reserved(self):
+        """Test that reserved and available stock follow the item's open quantity"""
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.reserved_stock, self.product.available_stock), (8, 12))
+
+        self.item.fulfilled_quantity = 3
+        self.item.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.reserved_stock, self.product.available_stock), (5, 15))
+
+    def test_shipment_releases_shipped_quantity(self):
+        """Test that shipping moves quantity out of both the reservation and the stock"""
+        user = get_user_model().objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = reverse('sales:create-shipment', kwargs={'order_id': self.item.sales_order_id})
+        response = client.post(url, {
+            'shipping_no': 'SH-001', 'shipping_date': '2024-06-01',
+            'order': self.item.sales_order_id, 'order_item': self.item.id, 'quantity': 3
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.current_stock, self.product.reserved_stock, self.product.available_stock), (17, 5, 12)
+        )
+
+    def test_fulfilled_item_consumes_reservation(self):
+        """Test that a fully fulfilled item releases its reserved stock"""
+        self.item.fulfilled_quantity = 8
+        self.item.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 0)
+        self.assertEqual(
+            list(self.item.reservations.values_list('status', flat=True)), ['CONSUMED']
+        )
+
+
+class OrderStatusResponseTest(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = InventoryCategory.objects.create(name='MAMUL')
+        customer = Customer.objects.create(code='CUST01', name='Test Customer')
+        self.product = Product.objects.create(
+            product_code='P-001',
+            product_name='Product 1',
+            product_type='MONTAGED',
+            inventory_category=category,
+            current_stock=20
+        )
+        self.order = SalesOrder.objects.create(order_number='SO-001', customer=customer)
+        self.item = SalesOrderItem.objects.create(sales_order=self.order, product=self.product, ordered_quantity=5)
+
+    def test_shipment_closes_order_immediately(self):
+        """Test that a shipment completing the order closes it within the request"""
+        url = reverse('sales:create-shipment', kwargs={'order_id': self.order.id})
+        response = self.client.post(url, {
+            'shipping_no': 'SH-001', 'shipping_date': '2024-06-01',
+            'order': self.order.id, 'order_item': self.item.id, 'quantity': 5
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'CLOSED')
+
+    def test_put_response_carries_new_status(self):
+        """Test that the order update response shows the recomputed status"""
+        SalesOrderItem.objects.filter(pk=self.item.pk).update(fulfilled_quantity=5)
+        self.order.update_order_status()
+        self.assertEqual(self.order.status, 'CLOSED')
+
+        url = reverse('sales:order-detail', kwargs={'pk': self.order.id})
+        response = self.client.put(url, {
+            'order_number': 'SO-001', 'customer': self.order.customer_id,
+            'items': [{'product': self.product.id, 'ordered_quantity': 3}]
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'OPEN')
+
+    def test_batch_shipment_edit_recomputes_order_once(self):
+        """Test that a batch shipment edit closes the order with one status recomputation"""
+        second_item = SalesOrderItem.objects.create(sales_order=self.order, product=self.product, ordered_quantity=5)
+        for shipping_no, item in [('SH-001', self.item), ('SH-002', second_item)]:
+            Shipping.objects.create(
+                shipping_no=shipping_no, shipping_date=date(2024, 6, 1), order=self.order, order_item=item, quantity=1,
+                created_by=self.user,
+            )
+
+        url = reverse('sales:order-shipments-batch-update', kwargs={'order_pk': self.order.id})
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {'shipments': [
+                {'shipping_no': shipping_no, 'quantity': '5', 'shipping_date': '2024-06-02'}
+                for shipping_no in ['SH-001', 'SH-002']
+            ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'CLOSED')
+        recomputes = [query for query in queries if query['sql'].startswith('UPDATE "sales_salesorder" SET "status"')]
+        self.assertEqual(len(recomputes), 1)
@@ -6,6 +6,9 @@ from . import views
 # Create main router
 router = DefaultRouter()
 router.register(r'orders', views.SalesOrderViewSet, basename='order')
+router.register(r'forecasts', views.DemandForecastViewSet, basename='forecast')
+router.register(r'overdue-snapshots', views.OverdueBacklogSnapshotViewSet, basename='overdue-snapshot')
+router.register(r'customer-backlog', views.CustomerBacklogViewSet, basename='customer-backlog')
 
 # Create nested router for order items and shipments
 orders_router = routers.NestedDefaultRouter(router, r'orders', lookup='order')
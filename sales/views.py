@@ -1,3 +1,6 @@
+import csv
+
+from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
@@ -9,15 +12,25 @@ from django_filters import rest_framework as filters
 from django.utils import timezone
 from django.db import models, transaction
 from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from dateutil.parser import parse as parse_date
 
-from .models import SalesOrder, SalesOrderItem, Shipping
+from .models import (
+    SalesOrder, SalesOrderItem, Shipping, DemandForecast, OverdueBacklogSnapshot,
+    CustomerBacklogSummary
+)
+from .overdue import (
+    scan_items, lateness_by_customer, DEADLINE_FIELDS, DEFAULT_AT_RISK_DAYS
+)
 from .serializers import (
     SalesOrderSerializer, SalesOrderItemSerializer,
     ShippingSerializer, BatchSalesOrderItemUpdateSerializer,
     BatchSalesOrderItemCreateSerializer, BatchShippingUpdateSerializer,
-    BatchOrderShipmentUpdateSerializer
+    BatchOrderShipmentUpdateSerializer, DemandForecastSerializer,
+    OverdueItemSerializer, OverdueBacklogSnapshotSerializer, CustomerBacklogSummarySerializer
 )
 from erp_core.permissions import IsAdminUser, HasDepartmentPermission
+from erp_core.response_cache import CachedResponseMixin
 
 # Create your views here.
 
@@ -31,6 +44,67 @@ class SalesOrderFilter(filters.FilterSet):
         model = SalesOrder
         fields = ['created_at_from', 'created_at_to', 'status', 'customer']
 
+class DemandForecastFilter(filters.FilterSet):
+    period_start_from = filters.DateFilter(field_name='period_start', lookup_expr='gte')
+    period_start_to = filters.DateFilter(field_name='period_start', lookup_expr='lte')
+    product_code = filters.CharFilter(field_name='product__product_code')
+
+    class Meta:
+        model = DemandForecast
+        fields = ['product', 'product_code', 'model', 'period_start_from', 'period_start_to']
+
+class OverdueBacklogSnapshotFilter(filters.FilterSet):
+    snapshot_date_from = filters.DateFilter(field_name='snapshot_date', lookup_expr='gte')
+    snapshot_date_to = filters.DateFilter(field_name='snapshot_date', lookup_expr='lte')
+
+    class Meta:
+        model = OverdueBacklogSnapshot
+        fields = ['customer', 'bucket', 'snapshot_date', 'snapshot_date_from', 'snapshot_date_to']
+
+class CustomerBacklogFilter(filters.FilterSet):
+    customer_code = filters.CharFilter(field_name='customer__code')
+    month_from = filters.DateFilter(field_name='month', lookup_expr='gte')
+    month_to = filters.DateFilter(field_name='month', lookup_expr='lte')
+    has_overdue = filters.BooleanFilter(method='filter_has_overdue')
+
+    class Meta:
+        model = CustomerBacklogSummary
+        fields = ['customer', 'customer_code', 'month', 'month_from', 'month_to', 'has_overdue']
+
+    def filter_has_overdue(self, queryset, name, value):
+        if value:
+            return queryset.filter(overdue_quantity__gt=0)
+        return queryset.filter(overdue_quantity=0)
+
+class ReportPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+def parse_overdue_params(request):
+    """Read as_of, at_risk_days and deadline query parameters for the overdue scanner."""
+    params = request.query_params
+    try:
+        as_of = parse_date(params['as_of']).date() if params.get('as_of') else timezone.now().date()
+    except (ValueError, OverflowError):
+        raise ValidationError({'as_of': 'Invalid date. Use YYYY-MM-DD.'})
+    try:
+        at_risk_days = int(params.get('at_risk_days', DEFAULT_AT_RISK_DAYS))
+    except ValueError:
+        raise ValidationError({'at_risk_days': 'Must be an integer.'})
+    if at_risk_days < 0:
+        raise ValidationError({'at_risk_days': 'Must not be negative.'})
+    deadline = params.get('deadline', 'deadline')
+    if deadline not in DEADLINE_FIELDS:
+        raise ValidationError({'deadline': f"Must be one of {', '.join(DEADLINE_FIELDS)}."})
+    return as_of, at_risk_days, DEADLINE_FIELDS[deadline]
+
+OVERDUE_PARAMETERS = [
+    openapi.Parameter('as_of', openapi.IN_QUERY, description="Reference date (default today)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+    openapi.Parameter('at_risk_days', openapi.IN_QUERY, description="Items due within this many days count as at risk", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('deadline', openapi.IN_QUERY, description="Deadline to scan: 'deadline' or 'kapsam'", type=openapi.TYPE_STRING),
+]
+
 class SalesOrderViewSet(viewsets.ModelViewSet):
     queryset = SalesOrder.objects.prefetch_related('items').all().select_related(
         'customer', 'approved_by'
@@ -55,13 +129,52 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
                 item.full_clean()
 
     @swagger_auto_schema(
-        operation_description="List all sales orders",
+        operation_description="List all sales orders. Pass view=compact for order, item and product code/name columns only",
+        manual_parameters=[
+            openapi.Parameter('view', openapi.IN_QUERY, description="'compact' for the lightweight representation", type=openapi.TYPE_STRING),
+        ],
         responses={200: SalesOrderSerializer(many=True)},
         tags=['Sales Orders']
     )
     def list(self, request, *args, **kwargs):
+        if request.query_params.get('view') == 'compact':
+            return self.list_compact(request)
         return super().list(request, *args, **kwargs)
 
+    def list_compact(self, request):
+        """
+        Orders and their items as flat column projections: one query for the
+        orders and one for all of their items, without product details.
+        """
+        orders = self.filter_queryset(self.get_queryset()).values(
+            'id', 'order_number', 'customer', 'status', 'created_at',
+            customer_code=models.F('customer__code'),
+            customer_name=models.F('customer__name'),
+        )
+        page = self.paginate_queryset(orders)
+        orders = list(page if page is not None else orders)
+
+        status_labels = dict(SalesOrder.STATUS_CHOICES)
+        items_by_order = {}
+        for order in orders:
+            order['status_display'] = status_labels.get(order['status'], order['status'])
+            order['items'] = items_by_order.setdefault(order['id'], [])
+
+        items = SalesOrderItem.objects.filter(
+            sales_order_id__in=list(items_by_order)
+        ).values(
+            'id', 'sales_order_id', 'product', 'ordered_quantity', 'fulfilled_quantity',
+            'receiving_date', 'deadline_date', 'kapsam_deadline_date',
+            product_code=models.F('product__product_code'),
+            product_name=models.F('product__product_name'),
+        ).order_by('id')
+        for item in items:
+            items_by_order[item.pop('sales_order_id')].append(item)
+
+        if page is not None:
+            return self.get_paginated_response(orders)
+        return Response(orders)
+
     @swagger_auto_schema(
         operation_description="Create a new sales order",
         request_body=SalesOrderSerializer,
@@ -125,14 +238,42 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(sales_order)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        operation_description="Overdue and at-risk open quantity per customer, bucketed by lateness",
+        manual_parameters=OVERDUE_PARAMETERS,
+        tags=['Sales Orders']
+    )
     @action(detail=False, methods=['get'])
     def overdue(self, request):
-        overdue_orders = self.get_queryset().filter(
-            deadline_date__lt=timezone.now().date(),
-            status__in=['PENDING', 'APPROVED']
-        )
-        serializer = self.get_serializer(overdue_orders, many=True)
-        return Response(serializer.data)
+        as_of, at_risk_days, deadline_field = parse_overdue_params(request)
+        rows = lateness_by_customer(as_of, at_risk_days, deadline_field)
+        paginator = ReportPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(page)
+
+    @swagger_auto_schema(
+        operation_description="Overdue and at-risk order items, most overdue first",
+        manual_parameters=OVERDUE_PARAMETERS + [
+            openapi.Parameter('customer', openapi.IN_QUERY, description="Filter by customer ID", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: OverdueItemSerializer(many=True)},
+        tags=['Sales Orders']
+    )
+    @action(detail=False, methods=['get'], url_path='overdue-items')
+    def overdue_items(self, request):
+        as_of, at_risk_days, deadline_field = parse_overdue_params(request)
+        items = scan_items(as_of, at_risk_days, deadline_field)
+        customer_id = request.query_params.get('customer')
+        if customer_id:
+            try:
+                customer_id = int(customer_id)
+            except ValueError:
+                raise ValidationError({'customer': 'Must be an integer.'})
+            items = items.filter(sales_order__customer_id=customer_id)
+        paginator = ReportPagination()
+        page = paginator.paginate_queryset(items, request, view=self)
+        serializer = OverdueItemSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class SalesOrderItemViewSet(viewsets.ModelViewSet):
     queryset = SalesOrderItem.objects.all()
@@ -461,15 +602,14 @@ class ShippingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Perform the deletion
-        shipping.delete()
-        
-        # Update the order item's fulfilled quantity
-        shipping.order_item.update_fulfilled_quantity()
-        shipping.order_item.save()
-        
-        # Update the order status
-        shipping.order.update_order_status()
+        with transaction.atomic():
+            # Perform the deletion
+            shipping.delete()
+            
+            # Update the order item's fulfilled quantity; the delete and the
+            # item save mark the order for one status recomputation at commit
+            shipping.order_item.update_fulfilled_quantity()
+            shipping.order_item.save()
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -504,3 +644,79 @@ class UpdateShipmentStatusView(generics.UpdateAPIView):
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
         return Response(serializer.data)
+
+class DemandForecastViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only access to the weekly demand forecasts written by the
+    run_demand_forecast management command.
+    """
+    queryset = DemandForecast.objects.select_related('product')
+    serializer_class = DemandForecastSerializer
+    permission_classes = [IsAuthenticated]
+    filterset_class = DemandForecastFilter
+    ordering_fields = ['period_start', 'forecast_quantity']
+    ordering = ['product', 'model', 'period_start']
+
+    @swagger_auto_schema(
+        operation_description="List weekly demand forecasts per product and model",
+        responses={200: DemandForecastSerializer(many=True)},
+        tags=['Demand Forecasts']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+class OverdueBacklogSnapshotViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Daily overdue backlog snapshots written by the snapshot_overdue_backlog
+    management command.
+    """
+    queryset = OverdueBacklogSnapshot.objects.select_related('customer')
+    serializer_class = OverdueBacklogSnapshotSerializer
+    permission_classes = [IsAuthenticated]
+    filterset_class = OverdueBacklogSnapshotFilter
+    pagination_class = ReportPagination
+    ordering = ['-snapshot_date', 'customer', 'bucket']
+
+class CustomerBacklogViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Per-customer monthly backlog: open and overdue quantity and fill rate,
+    read from the maintained CustomerBacklogSummary table.
+    """
+    queryset = CustomerBacklogSummary.objects.select_related('customer')
+    serializer_class = CustomerBacklogSummarySerializer
+    permission_classes = [IsAuthenticated]
+    filterset_class = CustomerBacklogFilter
+    pagination_class = ReportPagination
+    search_fields = ['customer__code', 'customer__name']
+    ordering_fields = ['month', 'open_quantity', 'overdue_quantity', 'fill_rate']
+    ordering = ['customer__code', 'month']
+
+    @swagger_auto_schema(
+        operation_description="List customer backlog by month",
+        tags=['Customer Backlog']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Export the filtered customer backlog as CSV",
+        tags=['Customer Backlog']
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        columns = [
+            'customer__code', 'customer__name', 'month', 'item_count', 'ordered_quantity',
+            'fulfilled_quantity', 'open_quantity', 'overdue_quantity', 'fill_rate'
+        ]
+        rows = self.filter_queryset(self.get_queryset()).values_list(*columns)
+
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="customer_backlog.csv"'
+        writer = csv.writer(response)
+        writer.writerow([
+            'Customer Code', 'Customer Name', 'Month', 'Items', 'Ordered',
+            'Fulfilled', 'Open', 'Overdue', 'Fill Rate'
+        ])
+        for row in rows.iterator(chunk_size=2000):
+            writer.writerow(row[:2] + (row[2].strftime('%Y-%m'),) + row[3:8] + (f'{row[8]:.4f}',))
+        return response